@@ -0,0 +1,147 @@
+"""ASGI entry point: /ws/game on one asyncio event loop, everything else served by the Flask app.
+
+Game websockets are handled natively here (a task per connection instead of
+an OS thread), using the same game state, protocol, auth check and send
+queues as game_websocket.handle_game_websocket. Plain HTTP requests are
+passed to server.app through asgiref's WSGI adapter.
+
+    uvicorn asgi:app --host 0.0.0.0 --port 8080
+    python asgi.py
+"""
+import asyncio
+import os
+import urllib.parse
+from http.cookies import SimpleCookie
+import uvicorn
+from asgiref.wsgi import WsgiToAsgi
+import game_websocket as game
+import server
+from backend.tools.game_codec import get_codec
+from backend.tools.outbound_queue import AsyncOutboundQueue
+
+flask_app = WsgiToAsgi(server.app)
+
+class AsgiWebSocket:
+    """The small websocket interface the game code needs, over ASGI receive/send"""
+
+    def __init__(self, receive, send):
+        self._receive = receive
+        self._send = send
+        self.closed = False
+
+    async def accept(self):
+        await self._send({"type": "websocket.accept"})
+
+    async def receive(self):
+        """Next text or binary message, or None once the client has gone"""
+        while True:
+            event = await self._receive()
+            if event["type"] == "websocket.receive":
+                return event["text"] if event.get("text") is not None else event.get("bytes")
+            if event["type"] == "websocket.disconnect":
+                self.closed = True
+                return None
+
+    async def send(self, payload):
+        if isinstance(payload, bytes):
+            await self._send({"type": "websocket.send", "bytes": payload})
+        else:
+            await self._send({"type": "websocket.send", "text": payload})
+
+    async def close(self, code=1000, reason=""):
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            await self._send({"type": "websocket.close", "code": code, "reason": reason})
+        except Exception:
+            pass
+
+def request_cookies(scope):
+    cookies = SimpleCookie()
+    for name, value in scope.get("headers", []):
+        if name == b"cookie":
+            cookies.load(value.decode("latin-1"))
+    return {name: morsel.value for name, morsel in cookies.items()}
+
+async def game_websocket(scope, receive, send):
+    ws = AsgiWebSocket(receive, send)
+    if (await receive())["type"] != "websocket.connect":
+        return
+    await ws.accept()
+
+    if not game.accepting_connections:
+        await ws.close(1001, "Server shutting down")
+        return
+
+    game.start_food_spawner()
+    game.start_tick_loop()
+
+    auth_token = request_cookies(scope).get("auth_token")
+    if not auth_token:
+        await ws.close(1008, "Not authenticated")
+        return
+
+    # Mongo may be hit on a session cache miss; keep it off the event loop
+    user = await asyncio.to_thread(game.authenticate_game_user, auth_token)
+    if not user:
+        await ws.close(1008, "User not found")
+        return
+
+    conn_id = auth_token
+    query = urllib.parse.parse_qs(scope.get("query_string", b"").decode("latin-1"))
+    codec = get_codec(query.get("codec", [None])[0])
+
+    client_queue = game.create_send_queue(
+        conn_id, ws, user.get("username", "Anonymous"), codec,
+        queue_class=AsyncOutboundQueue, loop=asyncio.get_running_loop()
+    )
+    writer = asyncio.create_task(client_queue.drain())
+    inbox = game.create_inbox()
+    heartbeat_job = None
+    try:
+        heartbeat_job = game.open_game_session(conn_id, client_queue)
+
+        while True:
+            message = await ws.receive()
+            if message is None:
+                break
+
+            if not game.handle_game_message(conn_id, user, codec.decode(message), inbox):
+                client_queue.close(1008, "Too many messages")
+                break
+
+    except Exception as e:
+        pass
+    finally:
+        game.close_game_session(conn_id, client_queue, heartbeat_job)
+        client_queue.close()
+        writer.cancel()
+
+async def lifespan(receive, send):
+    while True:
+        event = await receive()
+        if event["type"] == "lifespan.startup":
+            await asyncio.to_thread(server.create_app)
+            await send({"type": "lifespan.startup.complete"})
+        elif event["type"] == "lifespan.shutdown":
+            await asyncio.to_thread(game.shutdown_game_system)
+            # uvicorn re-raises SIGTERM after this, which skips atexit, so the
+            # bcrypt workers have to be stopped and unsaved stats written here
+            await asyncio.to_thread(server.auth.password_hasher.shutdown)
+            await asyncio.to_thread(server.db.stats_buffer.close)
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+async def app(scope, receive, send):
+    if scope["type"] == "websocket" and scope["path"] == "/ws/game":
+        await game_websocket(scope, receive, send)
+    elif scope["type"] == "lifespan":
+        await lifespan(receive, send)
+    elif scope["type"] == "websocket":
+        await send({"type": "websocket.close", "code": 1008})
+    else:
+        await flask_app(scope, receive, send)
+
+if __name__ == "__main__":
+    uvicorn.run(app, host="0.0.0.0", port=int(os.environ.get("PORT", "8080")))
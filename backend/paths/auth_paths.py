@@ -1,12 +1,25 @@
+import os
 import hashlib
 import uuid
-import bcrypt
 import pymongo
+from pymongo.errors import DuplicateKeyError
 import database as db
 import backend.tools.auth_tools as tools
+from backend.tools.password_pool import PasswordHasher, PoolBusyError
 from flask import Request, Response, current_app
 from typing import *
 
+# bcrypt runs on its own worker processes; logins beyond BCRYPT_MAX_PENDING get a 503
+password_hasher: PasswordHasher = PasswordHasher(
+    workers=int(os.environ.get("BCRYPT_WORKERS", "2")),
+    max_pending=int(os.environ.get("BCRYPT_MAX_PENDING", "32"))
+)
+
+def set_busy(res: Response) -> None:
+    res.status_code = 503
+    res.data = "Server busy, try again"
+    res.headers["Retry-After"] = "1"
+
 def receive_registration_credentials(req: Request) -> Response:
     res: Response = Response()
 
@@ -29,12 +42,26 @@ def receive_registration_credentials(req: Request) -> Response:
         current_app.logger.info("Registration failed for %s: %s", username, res.data)
 
     else:
-        hashed: bytes = bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt())
+        try:
+            hashed: bytes = password_hasher.hash_password(password.encode("utf-8"))
+        except PoolBusyError:
+            set_busy(res)
+            current_app.logger.info("Registration rejected for %s: password pool full", username)
+            return res
+
         user_id: str = str(uuid.uuid4())
         auth_token: str = str(uuid.uuid4())
         hashed_auth: bytes = hashlib.sha256(auth_token.encode("utf-8")).hexdigest().encode("utf-8")
+        try:
+            db.user_collection.insert_one({"id": user_id, "username": username, "password": hashed, "token": hashed_auth})
+        except DuplicateKeyError:
+            # Another registration took the name while this one was hashing
+            res.status_code = 400
+            res.data = "Username taken"
+            current_app.logger.info("Registration failed for %s: %s", username, res.data)
+            return res
+
         res.set_cookie("auth_token", auth_token, max_age=20000000, secure=True, httponly=True)
-        db.user_collection.insert_one({"id": user_id, "username": username, "password": hashed, "token": hashed_auth})
         res.status_code = 200
         res.data = "Registration successful"
         current_app.logger.info("Registration successful for %s", username)
@@ -55,7 +82,16 @@ def receive_login_credentials(req: Request) -> Response:
         res.status_code = 400
         res.data = "Username does not exist"
         current_app.logger.info("Login failed for %s: %s", username, res.data)
-    elif(not(bcrypt.checkpw(password.encode("utf-8"), user["password"]))):
+        return res
+
+    try:
+        matches: bool = password_hasher.check_password(password.encode("utf-8"), user["password"])
+    except PoolBusyError:
+        set_busy(res)
+        current_app.logger.info("Login rejected for %s: password pool full", username)
+        return res
+
+    if(not(matches)):
         res.status_code = 400
         res.data = "Password does not match"
         current_app.logger.info("Login failed for %s: %s", username, res.data)
@@ -65,6 +101,7 @@ def receive_login_credentials(req: Request) -> Response:
         hashed_auth: bytes = hashlib.sha256(auth_token.encode("utf-8")).hexdigest().encode("utf-8")
         update_operation: dict[str, dict[str, (str | bytes)]] = {"$set": {"token": hashed_auth}}
         db.user_collection.update_one(user, update_operation)
+        db.session_cache.invalidate(user.get("token"))
         res.status_code = 200
         res.data = "Login successful"
         current_app.logger.info("Login successful for %s", username)
@@ -89,6 +126,7 @@ def receive_logout_request(req: Request) -> Response:
 
         update_operation: dict[str, dict[str, (str | bytes)]] = {"$set": {"token": hashed_logout}}
         db.user_collection.update_one(user, update_operation)
+        db.session_cache.invalidate(hashed_auth)
 
         res.status_code = 302
         res.headers["Location"] = "/"
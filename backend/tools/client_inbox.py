@@ -0,0 +1,66 @@
+import threading
+from typing import *
+
+class InboxFull(RuntimeError):
+    pass
+
+class ClientInbox:
+    """Messages one connection has handed the game-state thread that it has not applied yet.
+
+    Every waiting message is a one-element cell that the job applying it
+    reads when it runs. A message type in `merge` carries the client's whole
+    state, so if the newest waiting message has the same type, the new one
+    overwrites that cell instead of queueing another job. Only the newest is
+    merged, so messages are still applied in the order they arrived. Once
+    `limit` messages are waiting, add() raises InboxFull and the caller
+    disconnects the client, so one connection cannot fill the shared queue
+    or hold up everybody else's commands.
+    """
+
+    def __init__(self, limit: int = 256, merge: Collection[str] = ()):
+        self.limit: int = limit
+        self.merge: frozenset[str] = frozenset(merge)
+        self.lock: threading.Lock = threading.Lock()
+        self.waiting: int = 0
+        # The newest waiting cell and its message type
+        self.tail: (list[Any] | None) = None
+        self.tail_type: (str | None) = None
+
+        self.max_waiting: int = 0
+        self.merged: int = 0
+
+    def add(self, message_type: (str | None), data: Any) -> (list[Any] | None):
+        """The cell to hand the game-state thread, or None if data was merged into one already waiting"""
+        with self.lock:
+            if(self.tail is not None and message_type == self.tail_type and message_type in self.merge):
+                self.tail[0] = data
+                self.merged += 1
+                return None
+
+            if(self.waiting >= self.limit):
+                raise InboxFull(f"{self.waiting} messages waiting")
+
+            cell: list[Any] = [data]
+            self.tail = cell
+            self.tail_type = message_type
+            self.waiting += 1
+            self.max_waiting = max(self.max_waiting, self.waiting)
+            return cell
+
+    def take(self, cell: list[Any]) -> Any:
+        """The latest data of a cell; called by the job applying it"""
+        with self.lock:
+            self.waiting -= 1
+            if(self.tail is cell):
+                self.tail = None
+                self.tail_type = None
+            return cell[0]
+
+    def stats(self) -> dict[str, Any]:
+        with self.lock:
+            return {
+                "waiting": self.waiting,
+                "maxWaiting": self.max_waiting,
+                "merged": self.merged,
+                "limit": self.limit
+            }
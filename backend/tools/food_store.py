@@ -0,0 +1,246 @@
+import json
+import numpy as np
+from typing import *
+
+COLOR_DTYPE = "<U7"
+# Cell (cx, cy) is keyed cx * CELL_KEY_STRIDE + cy; worlds are far smaller than this many cells across
+CELL_KEY_STRIDE = 1 << 20
+NO_CELL = -1
+
+# One active food as json.dumps writes it in the food_state message shape; the color goes in already encoded
+FOOD_JSON = '{{"id": "{}", "x": {!r}, "y": {!r}, "color": {}, "active": true}}'
+
+def foods_json(ids: np.ndarray, xs: np.ndarray, ys: np.ndarray, colors: np.ndarray) -> str:
+    """JSON array of active foods from their field arrays; same text as json.dumps(to_dicts(slots)) for finite positions"""
+    return "[" + ", ".join(map(FOOD_JSON.format, ids.tolist(), xs.tolist(), ys.tolist(), map(json.dumps, colors.tolist()))) + "]"
+
+def random_colors(rng: np.random.Generator, count: int) -> np.ndarray:
+    """count random '#RRGGBB' strings, built without a Python-level loop"""
+    hex_digits: np.ndarray = np.frombuffer(rng.bytes(3 * count).hex().upper().encode("ascii"), dtype=np.uint8)
+    text: np.ndarray = np.empty((count, 7), dtype=np.uint8)
+    text[:, 0] = ord("#")
+    text[:, 1:] = hex_digits.reshape(count, 6)
+    return text.view("S7").ravel().astype(COLOR_DTYPE)
+
+class FoodStore:
+    """Struct-of-arrays storage for food: one NumPy array per field.
+
+    Slots are recycled through a free-list, food ids (what clients see) stay
+    unique for the lifetime of the store, and the active count is kept up to
+    date so spawning never has to scan. Bulk spawns and area queries are
+    vectorised; single foods are activated and deactivated in O(1). Active
+    slots are also bucketed by grid cell for segment queries; positions
+    are read from the arrays, so a food costs the grid one set entry and
+    one int in `cell`.
+    """
+
+    def __init__(self, capacity: int = 1024, cell_size: float = 50):
+        self.x: np.ndarray = np.zeros(capacity, dtype=np.float64)
+        self.y: np.ndarray = np.zeros(capacity, dtype=np.float64)
+        self.color: np.ndarray = np.zeros(capacity, dtype=COLOR_DTYPE)
+        self.ids: np.ndarray = np.full(capacity, -1, dtype=np.int64)
+        self.active: np.ndarray = np.zeros(capacity, dtype=bool)
+        self.respawns: np.ndarray = np.zeros(capacity, dtype=bool)
+        # Grid cell of each active slot, NO_CELL otherwise
+        self.cell: np.ndarray = np.full(capacity, NO_CELL, dtype=np.int64)
+
+        self.free_slots: list[int] = list(range(capacity - 1, -1, -1))
+        self.slot_of: dict[str, int] = {}
+        self.next_id: int = 0
+        self.active_total: int = 0
+        self.cell_size: float = cell_size
+        self.cells: dict[int, set[int]] = {}
+
+    def __len__(self) -> int:
+        return len(self.slot_of)
+
+    def __contains__(self, food_id: str) -> bool:
+        return food_id in self.slot_of
+
+    def active_count(self) -> int:
+        return self.active_total
+
+    def clear(self) -> None:
+        capacity: int = len(self.x)
+        self.ids.fill(-1)
+        self.active.fill(False)
+        self.respawns.fill(False)
+        self.cell.fill(NO_CELL)
+        self.free_slots = list(range(capacity - 1, -1, -1))
+        self.slot_of.clear()
+        self.active_total = 0
+        self.cells.clear()
+
+    def add_many(self, xs: np.ndarray, ys: np.ndarray, colors: (np.ndarray | str), respawns: bool = True) -> np.ndarray:
+        """Store a batch of active foods and return their slots"""
+        count: int = len(xs)
+        if(count == 0):
+            return np.empty(0, dtype=np.int64)
+
+        self._reserve(count)
+        slots: np.ndarray = np.array(self.free_slots[-count:][::-1], dtype=np.int64)
+        del self.free_slots[-count:]
+
+        new_ids: np.ndarray = np.arange(self.next_id, self.next_id + count, dtype=np.int64)
+        self.next_id += count
+
+        self.x[slots] = xs
+        self.y[slots] = ys
+        self.color[slots] = colors
+        self.ids[slots] = new_ids
+        self.active[slots] = True
+        self.respawns[slots] = respawns
+        self.active_total += count
+
+        cells: np.ndarray = self._cell_keys(self.x[slots], self.y[slots])
+        self.cell[slots] = cells
+        for slot, food_id, cell in zip(slots.tolist(), new_ids.tolist(), cells.tolist()):
+            self.slot_of[str(food_id)] = slot
+            self.cells.setdefault(cell, set()).add(slot)
+        return slots
+
+    def deactivate(self, food_id: str) -> bool:
+        """Mark a food eaten; False if it was unknown or already inactive"""
+        slot: (int | None) = self.slot_of.get(food_id)
+        if(slot is None or not self.active[slot]):
+            return False
+        self.active[slot] = False
+        self.active_total -= 1
+        self._remove_from_grid(slot)
+        return True
+
+    def activate(self, food_id: str, x: float, y: float) -> bool:
+        slot: (int | None) = self.slot_of.get(food_id)
+        if(slot is None or self.active[slot]):
+            return False
+        self.x[slot] = x
+        self.y[slot] = y
+        self.active[slot] = True
+        self.active_total += 1
+        cell: int = self._cell_key(x, y)
+        self.cell[slot] = cell
+        self.cells.setdefault(cell, set()).add(slot)
+        return True
+
+    def respawns_after_eaten(self, food_id: str) -> bool:
+        slot: (int | None) = self.slot_of.get(food_id)
+        return slot is not None and bool(self.respawns[slot])
+
+    def release(self, food_id: str) -> None:
+        """Forget a food entirely and put its slot back on the free-list"""
+        slot: (int | None) = self.slot_of.pop(food_id, None)
+        if(slot is None):
+            return
+        if(self.active[slot]):
+            self.active_total -= 1
+        self.active[slot] = False
+        self.ids[slot] = -1
+        self.free_slots.append(slot)
+        self._remove_from_grid(slot)
+
+    def position(self, food_id: str) -> (tuple[float, float] | None):
+        """Where an active food is, or None"""
+        slot: (int | None) = self.slot_of.get(food_id)
+        if(slot is None or not self.active[slot]):
+            return None
+        return float(self.x[slot]), float(self.y[slot])
+
+    def ids_near_segment(self, x0: float, y0: float, x1: float, y1: float, radius: float) -> list[str]:
+        """Active foods within radius of the segment (x0, y0)-(x1, y1), e.g. a head's path over a tick"""
+        candidates: list[int] = self._slots_in_cells(
+            min(x0, x1) - radius, min(y0, y1) - radius,
+            max(x0, x1) + radius, max(y0, y1) + radius
+        )
+        if(not candidates):
+            return []
+
+        slots: np.ndarray = np.array(candidates, dtype=np.int64)
+        dx: float = x1 - x0
+        dy: float = y1 - y0
+        length_sq: float = dx * dx + dy * dy
+        px: np.ndarray = self.x[slots] - x0
+        py: np.ndarray = self.y[slots] - y0
+        if(length_sq > 0):
+            t: np.ndarray = np.clip((px * dx + py * dy) / length_sq, 0.0, 1.0)
+            px = px - t * dx
+            py = py - t * dy
+
+        hits: np.ndarray = slots[px * px + py * py <= radius * radius]
+        return [str(food_id) for food_id in self.ids[hits].tolist()]
+
+    def active_slots(self) -> np.ndarray:
+        return np.flatnonzero(self.active)
+
+    def slots_in_rect(self, min_x: float, min_y: float, max_x: float, max_y: float) -> np.ndarray:
+        mask: np.ndarray = self.active & (self.x >= min_x) & (self.x <= max_x) & (self.y >= min_y) & (self.y <= max_y)
+        return np.flatnonzero(mask)
+
+    def active_fields(self) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """Copies of (ids, x, y, color) of every active food, for foods_json on another thread"""
+        slots: np.ndarray = self.active_slots()
+        return self.ids[slots], self.x[slots], self.y[slots], self.color[slots]
+
+    def active_foods(self) -> list[dict[str, Any]]:
+        return self.to_dicts(self.active_slots())
+
+    def active_in_rect(self, min_x: float, min_y: float, max_x: float, max_y: float) -> list[dict[str, Any]]:
+        return self.to_dicts(self.slots_in_rect(min_x, min_y, max_x, max_y))
+
+    def to_dicts(self, slots: np.ndarray) -> list[dict[str, Any]]:
+        """The food_state message shape: {"id", "x", "y", "color", "active"}"""
+        return [
+            {"id": str(food_id), "x": x, "y": y, "color": color, "active": active}
+            for food_id, x, y, color, active in zip(
+                self.ids[slots].tolist(),
+                self.x[slots].tolist(),
+                self.y[slots].tolist(),
+                self.color[slots].tolist(),
+                self.active[slots].tolist()
+            )
+        ]
+
+    def _cell_key(self, x: float, y: float) -> int:
+        return int(x // self.cell_size) * CELL_KEY_STRIDE + int(y // self.cell_size)
+
+    def _cell_keys(self, xs: np.ndarray, ys: np.ndarray) -> np.ndarray:
+        return (xs // self.cell_size).astype(np.int64) * CELL_KEY_STRIDE + (ys // self.cell_size).astype(np.int64)
+
+    def _remove_from_grid(self, slot: int) -> None:
+        cell: int = int(self.cell[slot])
+        if(cell == NO_CELL):
+            return
+        self.cell[slot] = NO_CELL
+        slots: (set[int] | None) = self.cells.get(cell)
+        if(slots is not None):
+            slots.discard(slot)
+            if(not slots):
+                del self.cells[cell]
+
+    def _slots_in_cells(self, min_x: float, min_y: float, max_x: float, max_y: float) -> list[int]:
+        """Active slots in every cell the rectangle touches; callers filter by exact position"""
+        found: list[int] = []
+        for cx in range(int(min_x // self.cell_size), int(max_x // self.cell_size) + 1):
+            for cy in range(int(min_y // self.cell_size), int(max_y // self.cell_size) + 1):
+                slots: (set[int] | None) = self.cells.get(cx * CELL_KEY_STRIDE + cy)
+                if(slots):
+                    found.extend(slots)
+        return found
+
+    def _reserve(self, count: int) -> None:
+        if(len(self.free_slots) >= count):
+            return
+
+        old_capacity: int = len(self.x)
+        new_capacity: int = max(old_capacity * 2, old_capacity + count)
+        grow: int = new_capacity - old_capacity
+
+        self.x = np.concatenate([self.x, np.zeros(grow, dtype=np.float64)])
+        self.y = np.concatenate([self.y, np.zeros(grow, dtype=np.float64)])
+        self.color = np.concatenate([self.color, np.zeros(grow, dtype=COLOR_DTYPE)])
+        self.ids = np.concatenate([self.ids, np.full(grow, -1, dtype=np.int64)])
+        self.active = np.concatenate([self.active, np.zeros(grow, dtype=bool)])
+        self.respawns = np.concatenate([self.respawns, np.zeros(grow, dtype=bool)])
+        self.cell = np.concatenate([self.cell, np.full(grow, NO_CELL, dtype=np.int64)])
+
+        # New slots go under the existing free ones so low slots are reused first
+        self.free_slots[:0] = range(new_capacity - 1, old_capacity - 1, -1)
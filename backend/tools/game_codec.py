@@ -0,0 +1,233 @@
+import json
+import math
+import struct
+from typing import *
+
+# Coordinates travel as int16 in 1/COORD_SCALE px steps (about +-4095 px)
+COORD_SCALE = 8
+COORD_LIMIT = 32767
+
+MOVE_FRAME = 1
+WORLD_SNAPSHOT_FRAME = 2
+INPUT_FRAME = 3
+
+SNAKE_FULL = 0
+SNAKE_DELTA = 1
+
+NULL_STRING = 255
+
+HEADER = struct.Struct("<B")
+COUNT = struct.Struct("<H")
+MOVE_FIELDS = struct.Struct("<hhHIB")
+SNAKE_FIELDS = struct.Struct("<BhhHIB")
+# Heading in 1/HEADING_SCALE radians, then flags (bit 0: boost)
+INPUT_FIELDS = struct.Struct("<hB")
+HEADING_SCALE = 10000
+
+def quantize(value: float) -> int:
+    return max(-COORD_LIMIT, min(COORD_LIMIT, int(round(value * COORD_SCALE))))
+
+def dequantize(value: int) -> float:
+    return value / COORD_SCALE
+
+def clamp_uint(value: Any, limit: int) -> int:
+    return max(0, min(limit, int(value or 0)))
+
+def pack_string(out: bytearray, value: (str | None)) -> None:
+    if(value is None):
+        out.append(NULL_STRING)
+        return
+    data: bytes = str(value).encode("utf-8")[:NULL_STRING - 1]
+    out.append(len(data))
+    out += data
+
+def unpack_string(data: bytes, offset: int) -> tuple[(str | None), int]:
+    length: int = data[offset]
+    offset += 1
+    if(length == NULL_STRING):
+        return None, offset
+    return data[offset:offset + length].decode("utf-8", "replace"), offset + length
+
+def pack_points(out: bytearray, points: list[dict[str, float]]) -> None:
+    count: int = min(len(points), 65535)
+    points = points[:count]
+    flat: list[int] = [0] * (2 * count)
+    flat[0::2] = [round(point["x"] * COORD_SCALE) for point in points]
+    flat[1::2] = [round(point["y"] * COORD_SCALE) for point in points]
+
+    out += COUNT.pack(count)
+    try:
+        out += struct.pack(f"<{2 * count}h", *flat)
+    except struct.error:
+        # Something is outside the int16 range, clamp it
+        out += struct.pack(f"<{2 * count}h", *[max(-COORD_LIMIT, min(COORD_LIMIT, v)) for v in flat])
+
+def unpack_points(data: bytes, offset: int) -> tuple[list[dict[str, float]], int]:
+    (count,) = COUNT.unpack_from(data, offset)
+    offset += COUNT.size
+    flat: tuple[int, ...] = struct.unpack_from(f"<{2 * count}h", data, offset)
+    points: list[dict[str, float]] = [
+        {"x": x / COORD_SCALE, "y": y / COORD_SCALE}
+        for x, y in zip(flat[0::2], flat[1::2])
+    ]
+    return points, offset + 4 * count
+
+class JsonCodec:
+    """The original text protocol: every frame is a JSON object"""
+
+    name: str = "json"
+
+    def encode(self, message: dict[str, Any]) -> (str | bytes):
+        return json.dumps(message)
+
+    def decode(self, payload: (str | bytes)) -> dict[str, Any]:
+        return json.loads(payload)
+
+class BinaryCodec(JsonCodec):
+    """Struct-packed frames for the hot messages, JSON text for everything else.
+
+    `move` and `input` (client to server) and `world_snapshot` (server to
+    client) go out as binary websocket frames with quantised int16 values. All other
+    message types stay JSON text frames, so broadcasts that are encoded once
+    for every client can be shared between JSON and binary connections.
+    """
+
+    name: str = "binary"
+
+    def encode(self, message: dict[str, Any]) -> (str | bytes):
+        message_type: (str | None) = message.get("messageType")
+        if(message_type == "world_snapshot"):
+            return self.encode_world_snapshot(message)
+        if(message_type == "move"):
+            return self.encode_move(message)
+        if(message_type == "input"):
+            return self.encode_input(message)
+        return json.dumps(message)
+
+    def decode(self, payload: (str | bytes)) -> dict[str, Any]:
+        if(isinstance(payload, str)):
+            return json.loads(payload)
+
+        frame_type: int = payload[0]
+        if(frame_type == MOVE_FRAME):
+            return self.decode_move(payload)
+        if(frame_type == WORLD_SNAPSHOT_FRAME):
+            return self.decode_world_snapshot(payload)
+        if(frame_type == INPUT_FRAME):
+            return self.decode_input(payload)
+        raise ValueError(f"Unknown binary frame type {frame_type}")
+
+    def encode_move(self, message: dict[str, Any]) -> bytes:
+        out: bytearray = bytearray(HEADER.pack(MOVE_FRAME))
+        out += MOVE_FIELDS.pack(
+            quantize(message.get("snake_x", 0)),
+            quantize(message.get("snake_y", 0)),
+            clamp_uint(message.get("length", 1), 65535),
+            clamp_uint(message.get("score", 0), 4294967295),
+            1 if message.get("alive", True) else 0
+        )
+        pack_string(out, message.get("snake_color"))
+        pack_string(out, message.get("username"))
+        pack_points(out, message.get("segments", []))
+        return bytes(out)
+
+    def decode_move(self, data: bytes) -> dict[str, Any]:
+        offset: int = HEADER.size
+        x, y, length, score, alive = MOVE_FIELDS.unpack_from(data, offset)
+        offset += MOVE_FIELDS.size
+        color, offset = unpack_string(data, offset)
+        username, offset = unpack_string(data, offset)
+        segments, offset = unpack_points(data, offset)
+
+        message: dict[str, Any] = {
+            "messageType": "move",
+            "snake_x": dequantize(x),
+            "snake_y": dequantize(y),
+            "snake_color": color,
+            "segments": segments,
+            "length": length,
+            "score": score,
+            "alive": bool(alive)
+        }
+        if(username is not None):
+            message["username"] = username
+        return message
+
+    def encode_input(self, message: dict[str, Any]) -> bytes:
+        # Wrapped to (-pi, pi] so it fits the int16
+        heading: float = math.remainder(float(message.get("heading", 0.0)), math.tau)
+        return HEADER.pack(INPUT_FRAME) + INPUT_FIELDS.pack(
+            int(round(heading * HEADING_SCALE)),
+            1 if message.get("boost", False) else 0
+        )
+
+    def decode_input(self, data: bytes) -> dict[str, Any]:
+        heading, flags = INPUT_FIELDS.unpack_from(data, HEADER.size)
+        return {"messageType": "input", "heading": heading / HEADING_SCALE, "boost": bool(flags & 1)}
+
+    def encode_world_snapshot(self, message: dict[str, Any]) -> bytes:
+        snakes: list[dict[str, Any]] = message["snakes"]
+        out: bytearray = bytearray(HEADER.pack(WORLD_SNAPSHOT_FRAME))
+        out += COUNT.pack(len(snakes))
+
+        for snake in snakes:
+            is_delta: bool = snake.get("delta", False)
+            out += SNAKE_FIELDS.pack(
+                SNAKE_DELTA if is_delta else SNAKE_FULL,
+                quantize(snake.get("x", 0)),
+                quantize(snake.get("y", 0)),
+                clamp_uint(snake.get("length", 1), 65535),
+                clamp_uint(snake.get("score", 0), 4294967295),
+                1 if snake.get("alive", True) else 0
+            )
+            pack_string(out, snake["id"])
+            if(is_delta):
+                pack_points(out, snake["added"])
+                out += COUNT.pack(clamp_uint(snake["trimmed"], 65535))
+            else:
+                pack_string(out, snake.get("color"))
+                pack_string(out, snake.get("username"))
+                pack_points(out, snake.get("segments", []))
+
+        return bytes(out)
+
+    def decode_world_snapshot(self, data: bytes) -> dict[str, Any]:
+        offset: int = HEADER.size
+        (count,) = COUNT.unpack_from(data, offset)
+        offset += COUNT.size
+
+        snakes: list[dict[str, Any]] = []
+        for _ in range(count):
+            kind, x, y, length, score, alive = SNAKE_FIELDS.unpack_from(data, offset)
+            offset += SNAKE_FIELDS.size
+            snake_id, offset = unpack_string(data, offset)
+            snake: dict[str, Any] = {
+                "id": snake_id,
+                "x": dequantize(x),
+                "y": dequantize(y),
+                "length": length,
+                "score": score,
+                "alive": bool(alive)
+            }
+
+            if(kind == SNAKE_DELTA):
+                snake["delta"] = True
+                snake["added"], offset = unpack_points(data, offset)
+                (snake["trimmed"],) = COUNT.unpack_from(data, offset)
+                offset += COUNT.size
+            else:
+                snake["color"], offset = unpack_string(data, offset)
+                snake["username"], offset = unpack_string(data, offset)
+                snake["segments"], offset = unpack_points(data, offset)
+            snakes.append(snake)
+
+        return {"messageType": "world_snapshot", "snakes": snakes}
+
+CODECS: dict[str, JsonCodec] = {
+    JsonCodec.name: JsonCodec(),
+    BinaryCodec.name: BinaryCodec()
+}
+
+def get_codec(name: (str | None)) -> JsonCodec:
+    """Codec requested in the /ws/game handshake, falling back to JSON"""
+    return CODECS.get(name or JsonCodec.name, CODECS[JsonCodec.name])
@@ -0,0 +1,62 @@
+import itertools
+from typing import *
+from sortedcontainers import SortedList
+
+class Leaderboard:
+    """Ranking of every entry by score, kept sorted as scores change.
+
+    Updates and removals are O(log N) and report whether they touched the
+    visible top `size`, so callers only rebuild and broadcast the top list
+    when it actually changed. Equal scores keep their insertion order.
+    """
+
+    def __init__(self, size: int = 10):
+        self.size: int = size
+        self.ranking: SortedList = SortedList()
+        self.entries: dict[str, tuple[tuple[int, int, str], str]] = {}
+        self.counter: Iterator[int] = itertools.count()
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __contains__(self, entry_id: str) -> bool:
+        return entry_id in self.entries
+
+    def update(self, entry_id: str, name: str, score: int) -> bool:
+        """Insert or move an entry; True if the visible top changed"""
+        old: (tuple[tuple[int, int, str], str] | None) = self.entries.get(entry_id)
+        old_rank: int = self.size
+        if(old is not None):
+            old_key, old_name = old
+            if(old_key[0] == -score and old_name == name):
+                return False
+            old_rank = self.ranking.index(old_key)
+            self.ranking.remove(old_key)
+            order: int = old_key[1]
+        else:
+            order = next(self.counter)
+
+        key: tuple[int, int, str] = (-score, order, entry_id)
+        self.ranking.add(key)
+        self.entries[entry_id] = (key, name)
+        return old_rank < self.size or self.ranking.index(key) < self.size
+
+    def remove(self, entry_id: str) -> bool:
+        """Drop an entry; True if it was in the visible top"""
+        old: (tuple[tuple[int, int, str], str] | None) = self.entries.pop(entry_id, None)
+        if(old is None):
+            return False
+        rank: int = self.ranking.index(old[0])
+        self.ranking.remove(old[0])
+        return rank < self.size
+
+    def clear(self) -> None:
+        self.ranking.clear()
+        self.entries.clear()
+
+    def top(self) -> list[dict[str, Any]]:
+        """The leaderboard_update shape: [{"id", "name", "score"}], best first"""
+        return [
+            {"id": entry_id, "name": self.entries[entry_id][1], "score": -neg_score}
+            for neg_score, _, entry_id in self.ranking.islice(0, self.size)
+        ]
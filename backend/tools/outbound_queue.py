@@ -0,0 +1,384 @@
+import asyncio
+import collections
+import json
+import logging
+import threading
+import time
+from typing import *
+
+# An encoded frame, or a function the writer calls to encode it
+Payload = (str | bytes | Callable[[], (str | bytes)])
+
+logger: logging.Logger = logging.getLogger(__name__)
+
+class QueuedFrame:
+    __slots__ = ("message_type", "payload", "snakes", "droppable")
+
+    def __init__(self, message_type: str, payload: (Payload | None), snakes: (dict[str, dict] | None), droppable: bool):
+        self.message_type: str = message_type
+        self.payload: (Payload | None) = payload
+        self.snakes: (dict[str, dict] | None) = snakes
+        self.droppable: bool = droppable
+
+    def is_live(self) -> bool:
+        if(self.snakes is not None):
+            return len(self.snakes) > 0
+        return self.payload is not None
+
+    def kill(self) -> None:
+        self.payload = None
+        if(self.snakes is not None):
+            self.snakes.clear()
+
+class OutboundQueue:
+    """Bounded per-connection send queue drained by its own writer thread.
+
+    Broadcasting threads only enqueue, so a slow socket delays nobody but
+    its own client. Message types in `droppable` are shed oldest-first once
+    `max_size` frames are waiting, types in `coalesce` keep only their most
+    recent frame, and world snapshots keep only the latest state per snake.
+    Anything else is never dropped; if that backlog alone reaches
+    `hard_limit` the client is considered too slow and `on_overflow` runs.
+
+    Snapshot entries may carry a delta against an earlier version of the
+    snake. The queue remembers which version each snake will be at on the
+    client once queued frames are sent, and falls back to the full form
+    whenever a delta would not apply, e.g. after an entry was coalesced away
+    or dropped.
+    """
+
+    def __init__(self, ws: Any, label: str = "", max_size: int = 256, hard_limit: int = 1024,
+                 droppable: Collection[str] = (), coalesce: Collection[str] = (),
+                 encode: Callable[[Any], str] = json.dumps,
+                 on_error: (Callable[["OutboundQueue"], None] | None) = None,
+                 on_overflow: (Callable[["OutboundQueue"], None] | None) = None):
+        self.ws: Any = ws
+        self.label: str = label
+        self.max_size: int = max_size
+        self.hard_limit: int = hard_limit
+        self.droppable: frozenset[str] = frozenset(droppable)
+        self.coalesce: frozenset[str] = frozenset(coalesce)
+        self.encode: Callable[[Any], str] = encode
+        self.on_error: (Callable[["OutboundQueue"], None] | None) = on_error
+        self.on_overflow: (Callable[["OutboundQueue"], None] | None) = on_overflow
+
+        self.frames: collections.deque[QueuedFrame] = collections.deque()
+        self.latest: dict[str, QueuedFrame] = {}
+        self.snake_frames: dict[str, QueuedFrame] = {}
+        self.known_versions: dict[str, int] = {}
+        self.depth: int = 0
+        self.in_flight: bool = False
+        self.cond: threading.Condition = threading.Condition()
+        self.closed: bool = False
+
+        self.max_depth: int = 0
+        self.sent: int = 0
+        self.dropped: int = 0
+        self.coalesced: int = 0
+        self.encode_errors: int = 0
+
+        self._start_writer()
+
+    def put(self, payload: Payload, message_type: str) -> bool:
+        """Queue an encoded frame. A callable payload is called on the writer to
+        encode a large frame there; it must only read data nobody else changes."""
+        with self.cond:
+            if(self.closed):
+                return False
+
+            if(message_type in self.coalesce):
+                older: (QueuedFrame | None) = self.latest.get(message_type)
+                if(older is not None and older.is_live()):
+                    older.kill()
+                    self.depth -= 1
+                    self.coalesced += 1
+
+            frame: QueuedFrame = QueuedFrame(message_type, payload, None, message_type in self.droppable)
+            if(not self._make_room(frame)):
+                return False
+
+            if(message_type in self.coalesce):
+                self.latest[message_type] = frame
+            self._append(frame)
+            return True
+
+    def put_snapshot(self, entries: Iterable[tuple[str, (int | None), int, dict, (dict | None)]],
+                     message_type: str = "world_snapshot") -> bool:
+        """Queue snake states as (snake_id, base_version, version, full, delta) entries"""
+        with self.cond:
+            if(self.closed):
+                return False
+
+            snakes: dict[str, dict] = {}
+            frame: QueuedFrame = QueuedFrame(message_type, None, snakes, message_type in self.droppable)
+            for snake_id, base_version, version, full, delta in entries:
+                older: (QueuedFrame | None) = self.snake_frames.get(snake_id)
+                if(older is not None and older.snakes is not None and snake_id in older.snakes):
+                    del older.snakes[snake_id]
+                    self.coalesced += 1
+                    # The superseded state never reaches the client
+                    self.known_versions.pop(snake_id, None)
+                    if(not older.snakes):
+                        self.depth -= 1
+
+                if(delta is not None and base_version is not None and self.known_versions.get(snake_id) == base_version):
+                    snakes[snake_id] = delta
+                else:
+                    snakes[snake_id] = full
+                self.known_versions[snake_id] = version
+                self.snake_frames[snake_id] = frame
+
+            if(not snakes):
+                return True
+            if(not self._make_room(frame)):
+                self._discard(frame)
+                return False
+
+            self._append(frame)
+            return True
+
+    def resync(self) -> None:
+        """Send the full form of every snake on its next update"""
+        with self.cond:
+            self.known_versions.clear()
+
+    def flush(self, timeout: float) -> bool:
+        """Wait until every queued frame has been written; False on timeout or close"""
+        deadline: float = time.monotonic() + timeout
+        with self.cond:
+            while(not self.closed and (self.depth > 0 or self.in_flight)):
+                remaining: float = deadline - time.monotonic()
+                if(remaining <= 0):
+                    return False
+                self.cond.wait(remaining)
+            return not self.closed
+
+    def close(self, *args: Any) -> None:
+        with self.cond:
+            already_closed: bool = self.closed
+            self.closed = True
+            self.frames.clear()
+            self.latest.clear()
+            self.snake_frames.clear()
+            self.known_versions.clear()
+            self.depth = 0
+            self.in_flight = False
+            self._wake()
+            # Wake flush() callers too
+            self.cond.notify_all()
+
+        if(not already_closed):
+            self._close_socket(*args)
+
+    def stats(self) -> dict[str, Any]:
+        with self.cond:
+            return {
+                "client": self.label,
+                "depth": self.depth,
+                "maxDepth": self.max_depth,
+                "sent": self.sent,
+                "dropped": self.dropped,
+                "coalesced": self.coalesced,
+                "encodeErrors": self.encode_errors,
+                "closed": self.closed
+            }
+
+    def _append(self, frame: QueuedFrame) -> None:
+        self.frames.append(frame)
+        self.depth += 1
+        self.max_depth = max(self.max_depth, self.depth)
+
+        # Coalesced frames stay in the deque as dead entries until drained
+        if(len(self.frames) > 2 * self.hard_limit):
+            self.frames = collections.deque(f for f in self.frames if f.is_live())
+
+        self._wake()
+
+    def _make_room(self, frame: QueuedFrame) -> bool:
+        if(self.depth < self.max_size):
+            return True
+
+        for queued in self.frames:
+            if(queued.droppable and queued.is_live()):
+                self._discard(queued)
+                self.depth -= 1
+                self.dropped += 1
+                return True
+
+        if(frame.droppable):
+            self.dropped += 1
+            return False
+
+        if(self.depth >= self.hard_limit):
+            self.dropped += 1
+            threading.Thread(target=self._overflow, daemon=True).start()
+            return False
+
+        return True
+
+    def _discard(self, frame: QueuedFrame) -> None:
+        if(frame.snakes):
+            for snake_id in frame.snakes:
+                self.known_versions.pop(snake_id, None)
+        frame.kill()
+
+    def _start_writer(self) -> None:
+        self.writer: threading.Thread = threading.Thread(target=self._drain, daemon=True)
+        self.writer.start()
+
+    def _wake(self) -> None:
+        """Tell the writer there is work (or that the queue closed). Caller holds cond."""
+        self.cond.notify_all()
+
+    def _close_socket(self, *args: Any) -> None:
+        try:
+            self.ws.close(*args)
+        except Exception:
+            pass
+
+    def _pop_frame(self) -> (tuple[str, (Payload | None), (list[dict] | None)] | None):
+        """Take the next live frame without waiting. Caller holds cond."""
+        while(self.frames):
+            frame: QueuedFrame = self.frames.popleft()
+            if(not frame.is_live()):
+                continue
+
+            self.depth -= 1
+            self.in_flight = True
+            if(frame.snakes is None):
+                if(self.latest.get(frame.message_type) is frame):
+                    del self.latest[frame.message_type]
+                return (frame.message_type, frame.payload, None)
+
+            snakes: list[dict] = list(frame.snakes.values())
+            for snake_id in frame.snakes:
+                if(self.snake_frames.get(snake_id) is frame):
+                    del self.snake_frames[snake_id]
+            frame.snakes = None
+            return (frame.message_type, None, snakes)
+        return None
+
+    def _next_frame(self) -> (tuple[str, (Payload | None), (list[dict] | None)] | None):
+        with self.cond:
+            while(not self.closed):
+                next_frame = self._pop_frame()
+                if(next_frame is not None):
+                    return next_frame
+                self.cond.wait()
+            return None
+
+    def _sent(self, delivered: bool) -> None:
+        with self.cond:
+            if(delivered):
+                self.sent += 1
+            self.in_flight = False
+            self.cond.notify_all()
+
+    def _frame_payload(self, message_type: str, payload: (Payload | None), snakes: (list[dict] | None)) -> (str | bytes | None):
+        """The bytes to send for a frame, or None if it could not be encoded"""
+        if(callable(payload)):
+            try:
+                return payload()
+            except Exception:
+                logger.exception("could not encode %s for %s", message_type, self.label)
+                with self.cond:
+                    self.encode_errors += 1
+                return None
+        if(payload is not None):
+            return payload
+
+        # Snapshots are encoded here, off the broadcasting thread
+        try:
+            return self.encode({"messageType": message_type, "snakes": snakes})
+        except Exception:
+            logger.exception("could not encode %s of %d snakes for %s", message_type, len(snakes), self.label)
+            with self.cond:
+                self.encode_errors += 1
+                for snake in snakes:
+                    self.known_versions.pop(snake["id"], None)
+            return None
+
+    def _send_failed(self) -> None:
+        self.close()
+        if(self.on_error is not None):
+            self.on_error(self)
+
+    def _drain(self) -> None:
+        while(True):
+            next_frame = self._next_frame()
+            if(next_frame is None):
+                return
+
+            payload = self._frame_payload(*next_frame)
+            if(payload is None):
+                self._sent(False)
+                continue
+
+            try:
+                self.ws.send(payload)
+            except Exception:
+                self._send_failed()
+                return
+
+            self._sent(True)
+
+    def _overflow(self) -> None:
+        self.close(1008, "Client too slow")
+        if(self.on_overflow is not None):
+            self.on_overflow(self)
+
+class AsyncOutboundQueue(OutboundQueue):
+    """OutboundQueue for an asyncio websocket, drained by a task on `loop`.
+
+    Enqueuing works from any thread (the tick runs on the scheduler thread);
+    the writer is woken with call_soon_threadsafe instead of a condition
+    variable, so a connection costs a task rather than an OS thread. Run
+    `drain()` as a task on the connection's loop.
+    """
+
+    def __init__(self, ws: Any, loop: asyncio.AbstractEventLoop, **kwargs: Any):
+        self.loop: asyncio.AbstractEventLoop = loop
+        self.ready: asyncio.Event = asyncio.Event()
+        super().__init__(ws, **kwargs)
+
+    def _start_writer(self) -> None:
+        pass
+
+    def _wake(self) -> None:
+        try:
+            self.loop.call_soon_threadsafe(self.ready.set)
+        except RuntimeError:
+            # Loop already closed
+            pass
+
+    def _close_socket(self, *args: Any) -> None:
+        try:
+            asyncio.run_coroutine_threadsafe(self.ws.close(*args), self.loop)
+        except RuntimeError:
+            pass
+
+    async def drain(self) -> None:
+        while(True):
+            with self.cond:
+                if(self.closed):
+                    return
+                next_frame = self._pop_frame()
+                if(next_frame is None):
+                    self.ready.clear()
+
+            if(next_frame is None):
+                await self.ready.wait()
+                continue
+
+            payload = self._frame_payload(*next_frame)
+            if(payload is None):
+                self._sent(False)
+                continue
+
+            try:
+                await self.ws.send(payload)
+            except Exception:
+                self._send_failed()
+                return
+
+            self._sent(True)
@@ -0,0 +1,144 @@
+import collections
+import concurrent.futures
+import concurrent.futures.process
+import multiprocessing
+import threading
+import time
+import bcrypt
+from typing import *
+
+class PoolBusyError(Exception):
+    pass
+
+def _timed_hashpw(password: bytes) -> tuple[bytes, float, float]:
+    started: float = time.time()
+    hashed: bytes = bcrypt.hashpw(password, bcrypt.gensalt())
+    return hashed, started, time.time()
+
+def _timed_checkpw(password: bytes, hashed: bytes) -> tuple[bool, float, float]:
+    started: float = time.time()
+    matches: bool = bcrypt.checkpw(password, hashed)
+    return matches, started, time.time()
+
+class PhaseTimer:
+    """Recent durations of one phase, for averages and percentiles"""
+
+    def __init__(self, window: int = 1000):
+        self.samples: collections.deque[float] = collections.deque(maxlen=window)
+        self.count: int = 0
+
+    def record(self, seconds: float) -> None:
+        self.samples.append(max(0.0, seconds))
+        self.count += 1
+
+    def summary(self) -> dict[str, float]:
+        ordered: list[float] = sorted(self.samples)
+        if(not ordered):
+            return {"count": self.count, "avgMs": 0.0, "p95Ms": 0.0, "maxMs": 0.0}
+        return {
+            "count": self.count,
+            "avgMs": sum(ordered) / len(ordered) * 1000,
+            "p95Ms": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000,
+            "maxMs": ordered[-1] * 1000
+        }
+
+class PasswordHasher:
+    """bcrypt on a process pool, so hashing never holds the web process's GIL.
+
+    At most `max_pending` hashes may be queued or running at once; beyond
+    that calls raise PoolBusyError straight away instead of waiting, so
+    callers can answer 503. With `workers` set to 0 hashing runs inline on
+    the calling thread (same limit and metrics). Worker processes are
+    spawned rather than forked because the server is multithreaded. If a
+    worker dies the pool is broken for good, so it is replaced and the call
+    retried once; a second failure raises PoolBusyError.
+    """
+
+    def __init__(self, workers: int = 2, max_pending: int = 32):
+        self.workers: int = workers
+        self.max_pending: int = max_pending
+        self.slots: threading.BoundedSemaphore = threading.BoundedSemaphore(max_pending)
+        self.executor: (concurrent.futures.ProcessPoolExecutor | None) = None
+        self.lock: threading.Lock = threading.Lock()
+
+        self.queue_wait: PhaseTimer = PhaseTimer()
+        self.hash_time: PhaseTimer = PhaseTimer()
+        self.rejected: int = 0
+        self.pending: int = 0
+        self.restarts: int = 0
+
+    def hash_password(self, password: bytes) -> bytes:
+        return self._run(_timed_hashpw, password)
+
+    def check_password(self, password: bytes, hashed: bytes) -> bool:
+        return self._run(_timed_checkpw, password, hashed)
+
+    def metrics(self) -> dict[str, Any]:
+        with self.lock:
+            return {
+                "workers": self.workers,
+                "maxPending": self.max_pending,
+                "pending": self.pending,
+                "rejected": self.rejected,
+                "restarts": self.restarts,
+                "queueWait": self.queue_wait.summary(),
+                "hashTime": self.hash_time.summary()
+            }
+
+    def shutdown(self) -> None:
+        with self.lock:
+            executor: (concurrent.futures.ProcessPoolExecutor | None) = self.executor
+            self.executor = None
+        if(executor is not None):
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def _get_executor(self) -> concurrent.futures.ProcessPoolExecutor:
+        with self.lock:
+            if(self.executor is None):
+                self.executor = concurrent.futures.ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn")
+                )
+            return self.executor
+
+    def _replace_executor(self, broken: concurrent.futures.ProcessPoolExecutor) -> None:
+        """Drop a broken pool; the next call starts a new one. Calls that saw the same pool break only drop it once."""
+        with self.lock:
+            if(self.executor is not broken):
+                return
+            self.executor = None
+            self.restarts += 1
+        broken.shutdown(wait=False, cancel_futures=True)
+
+    def _submit(self, function: Callable[..., tuple[Any, float, float]], *args: Any) -> tuple[Any, float, float]:
+        for _ in range(2):
+            executor: concurrent.futures.ProcessPoolExecutor = self._get_executor()
+            try:
+                return executor.submit(function, *args).result()
+            except concurrent.futures.process.BrokenProcessPool:
+                self._replace_executor(executor)
+        raise PoolBusyError("Password worker pool keeps failing")
+
+    def _run(self, function: Callable[..., tuple[Any, float, float]], *args: Any) -> Any:
+        if(not self.slots.acquire(blocking=False)):
+            with self.lock:
+                self.rejected += 1
+            raise PoolBusyError("Too many password checks in progress")
+
+        with self.lock:
+            self.pending += 1
+        try:
+            submitted: float = time.time()
+            if(self.workers <= 0):
+                result, started, finished = function(*args)
+            else:
+                result, started, finished = self._submit(function, *args)
+
+            with self.lock:
+                self.queue_wait.record(started - submitted)
+                self.hash_time.record(finished - started)
+            return result
+        finally:
+            with self.lock:
+                self.pending -= 1
+            self.slots.release()
@@ -0,0 +1,78 @@
+import collections
+import hashlib
+import threading
+from typing import *
+
+class ProfileCache:
+    """Bounded LRU of rendered profile responses keyed by hashed auth token.
+
+    Each user holds one body per endpoint (stats, achievements), stamped with
+    the stats version it was rendered from. A body is only served while the
+    caller's current version matches, so a game saved or flushed anywhere
+    retires it without coordination. The ETag is a digest of the body, so it
+    is strong: the same tag always means the same bytes.
+    """
+
+    def __init__(self, max_size: int = 10000):
+        self.max_size: int = max_size
+        self.entries: collections.OrderedDict[bytes, dict[str, tuple[int, str, bytes]]] = collections.OrderedDict()
+        self.lock: threading.Lock = threading.Lock()
+
+        self.hits: int = 0
+        self.misses: int = 0
+        self.evictions: int = 0
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def get(self, hashed_token: bytes, endpoint: str, version: int) -> (tuple[str, bytes] | None):
+        """(etag, body) rendered from this stats version, or None"""
+        with self.lock:
+            rendered: (dict[str, tuple[int, str, bytes]] | None) = self.entries.get(hashed_token)
+            entry: (tuple[int, str, bytes] | None) = None if rendered is None else rendered.get(endpoint)
+            if(entry is None or entry[0] != version):
+                self.misses += 1
+                return None
+
+            self.entries.move_to_end(hashed_token)
+            self.hits += 1
+            return entry[1], entry[2]
+
+    def put(self, hashed_token: bytes, endpoint: str, version: int, body: bytes) -> tuple[str, bytes]:
+        etag: str = hashlib.sha256(body).hexdigest()[:24]
+        if(self.max_size <= 0):
+            return etag, body
+
+        with self.lock:
+            rendered: (dict[str, tuple[int, str, bytes]] | None) = self.entries.get(hashed_token)
+            if(rendered is None):
+                rendered = self.entries[hashed_token] = {}
+            # One stats version per user; bodies of any other are dropped
+            for name in [name for name, entry in rendered.items() if entry[0] != version]:
+                del rendered[name]
+            rendered[endpoint] = (version, etag, body)
+            self.entries.move_to_end(hashed_token)
+            while(len(self.entries) > self.max_size):
+                self.entries.popitem(last=False)
+                self.evictions += 1
+        return etag, body
+
+    def invalidate(self, hashed_token: (bytes | None)) -> None:
+        with self.lock:
+            self.entries.pop(hashed_token, None)
+
+    def clear(self) -> None:
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self) -> dict[str, Any]:
+        with self.lock:
+            lookups: int = self.hits + self.misses
+            return {
+                "size": len(self.entries),
+                "maxSize": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hitRate": self.hits / lookups if lookups else 0.0
+            }
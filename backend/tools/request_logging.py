@@ -0,0 +1,54 @@
+import atexit
+import datetime
+import json
+import logging
+import queue
+from logging.handlers import QueueHandler, QueueListener
+from typing import *
+
+class JsonLinesFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, message, plus any `fields` passed in `extra`"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry: dict[str, Any] = {
+            "time": datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage()
+        }
+        entry.update(getattr(record, "fields", None) or {})
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+class DroppingQueueHandler(QueueHandler):
+    """QueueHandler over a bounded queue that drops (and counts) records when the writer falls behind.
+
+    A full queue means the disk cannot keep up; blocking the request thread
+    there would bring back the latency the queue exists to remove.
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped: int = 0
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def stats(self) -> dict[str, int]:
+        return {"queued": self.queue.qsize(), "maxQueued": self.queue.maxsize, "dropped": self.dropped}
+
+def queue_logging(logger: logging.Logger, *handlers: logging.Handler, max_queued: int = 10000) -> DroppingQueueHandler:
+    """Route `logger` through a queue to `handlers`, written by one listener thread.
+
+    The listener is stopped at exit, which writes out whatever is still queued.
+    """
+    log_queue: queue.Queue = queue.Queue(max_queued)
+    queue_handler: DroppingQueueHandler = DroppingQueueHandler(log_queue)
+    logger.addHandler(queue_handler)
+
+    listener: QueueListener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    return queue_handler
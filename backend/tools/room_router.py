@@ -0,0 +1,72 @@
+import json
+import os
+import threading
+import time
+import urllib.request
+from typing import *
+
+class RoomRouter:
+    """Picks the least-loaded game room for each new /ws/game connection.
+
+    Rooms are separate processes (see rooms.py), each with its own game world,
+    serving /ws/game on its own port and reporting its player count at
+    /api/game/status. Counts are refreshed at most every `refresh` seconds;
+    connections assigned since the last refresh are added on top, so a burst
+    of joins spreads over the rooms instead of piling onto one.
+    """
+
+    def __init__(self, ports: list[int], host: str = "127.0.0.1", refresh: float = 1.0, timeout: float = 0.5):
+        self.ports: list[int] = ports
+        self.host: str = host
+        self.refresh: float = refresh
+        self.timeout: float = timeout
+        self.players: list[int] = [0] * len(ports)
+        self.up: list[bool] = [False] * len(ports)
+        self.assigned: list[int] = [0] * len(ports)
+        self.refreshed_at: float = 0.0
+        self.lock: threading.Lock = threading.Lock()
+
+    def rooms(self) -> list[dict[str, Any]]:
+        """Per-room player counts, for /api/game/rooms"""
+        with self.lock:
+            self._refresh_if_stale()
+            return [
+                {"room": i, "port": port, "players": self.players[i], "up": self.up[i]}
+                for i, port in enumerate(self.ports)
+            ]
+
+    def assign(self) -> (dict[str, Any] | None):
+        """The room a new connection should join, or None if every room is down"""
+        with self.lock:
+            self._refresh_if_stale()
+            candidates: list[int] = [i for i in range(len(self.ports)) if self.up[i]]
+            if(not candidates):
+                return None
+
+            room: int = min(candidates, key=lambda i: (self.players[i] + self.assigned[i], i))
+            self.assigned[room] += 1
+            return {"room": room, "port": self.ports[room]}
+
+    def _refresh_if_stale(self) -> None:
+        if(time.monotonic() - self.refreshed_at < self.refresh):
+            return
+
+        for i, port in enumerate(self.ports):
+            try:
+                with urllib.request.urlopen(f"http://{self.host}:{port}/api/game/status", timeout=self.timeout) as response:
+                    self.players[i] = int(json.loads(response.read())["players"])
+                self.up[i] = True
+            except Exception:
+                self.up[i] = False
+            self.assigned[i] = 0
+        self.refreshed_at = time.monotonic()
+
+def room_router_from_env() -> (RoomRouter | None):
+    """A router over GAME_ROOM_PORTS (comma separated), or None when rooms are not in use"""
+    ports: str = os.environ.get("GAME_ROOM_PORTS", "")
+    if(not ports.strip()):
+        return None
+    return RoomRouter(
+        [int(port) for port in ports.split(",") if port.strip()],
+        host=os.environ.get("GAME_ROOM_HOST", "127.0.0.1")
+    )
@@ -0,0 +1,114 @@
+import collections
+import heapq
+import itertools
+import logging
+import threading
+import time
+from typing import *
+
+logger: logging.Logger = logging.getLogger(__name__)
+
+class ScheduledJob:
+    __slots__ = ("due", "interval", "callback", "args", "cancelled")
+
+    def __init__(self, due: float, interval: (float | None), callback: Callable[..., Any], args: tuple):
+        self.due: float = due
+        self.interval: (float | None) = interval
+        self.callback: Callable[..., Any] = callback
+        self.args: tuple = args
+        self.cancelled: bool = False
+
+    def cancel(self) -> None:
+        self.cancelled = True
+
+class Scheduler:
+    """Runs deferred and periodic jobs from a heap on one daemon thread.
+
+    Replaces spawning a threading.Timer (and so an OS thread) per delayed
+    call. Jobs run one after another on the scheduler thread, so they must
+    not block; anything slow belongs on its own worker. Periodic jobs are
+    fixed-rate: if the thread falls behind, missed runs are skipped rather
+    than replayed back to back.
+
+    call_soon() queues a job to run in order with other call_soon() jobs as
+    soon as no timed job is due, which makes the thread usable as the single
+    owner of some state: other threads hand it commands instead of taking a
+    lock around the state themselves.
+    """
+
+    def __init__(self, name: str = "scheduler"):
+        self.name: str = name
+        self.jobs: list[tuple[float, int, ScheduledJob]] = []
+        self.ready: collections.deque[ScheduledJob] = collections.deque()
+        self.counter: Iterator[int] = itertools.count()
+        self.cond: threading.Condition = threading.Condition()
+        self.thread: (threading.Thread | None) = None
+
+    def call_later(self, delay: float, callback: Callable[..., Any], *args: Any) -> ScheduledJob:
+        job: ScheduledJob = ScheduledJob(time.monotonic() + delay, None, callback, args)
+        self._push(job)
+        return job
+
+    def call_soon(self, callback: Callable[..., Any], *args: Any) -> ScheduledJob:
+        job: ScheduledJob = ScheduledJob(time.monotonic(), None, callback, args)
+        with self.cond:
+            self.ready.append(job)
+            self._ensure_thread()
+            self.cond.notify()
+        return job
+
+    def call_every(self, interval: float, callback: Callable[..., Any], *args: Any, first_delay: (float | None) = None) -> ScheduledJob:
+        delay: float = interval if first_delay is None else first_delay
+        job: ScheduledJob = ScheduledJob(time.monotonic() + delay, interval, callback, args)
+        self._push(job)
+        return job
+
+    def backlog(self) -> int:
+        """call_soon() jobs waiting to run"""
+        return len(self.ready)
+
+    def _push(self, job: ScheduledJob) -> None:
+        with self.cond:
+            heapq.heappush(self.jobs, (job.due, next(self.counter), job))
+            self._ensure_thread()
+            self.cond.notify()
+
+    def _ensure_thread(self) -> None:
+        """Caller holds cond"""
+        if(self.thread is None):
+            self.thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self.thread.start()
+
+    def _next_due_job(self) -> ScheduledJob:
+        with self.cond:
+            while(True):
+                while(self.jobs and self.jobs[0][2].cancelled):
+                    heapq.heappop(self.jobs)
+
+                # Timed jobs first, so a burst of commands cannot hold up the tick
+                wait: (float | None) = self.jobs[0][0] - time.monotonic() if self.jobs else None
+                if(wait is None or wait > 0):
+                    if(self.ready):
+                        return self.ready.popleft()
+                    self.cond.wait(wait)
+                    continue
+
+                _, _, job = heapq.heappop(self.jobs)
+                if(job.interval is not None):
+                    now: float = time.monotonic()
+                    job.due += job.interval
+                    if(job.due <= now):
+                        job.due = now + job.interval
+                    heapq.heappush(self.jobs, (job.due, next(self.counter), job))
+                return job
+
+    def _run(self) -> None:
+        while(True):
+            job: ScheduledJob = self._next_due_job()
+            if(job.cancelled):
+                continue
+            try:
+                job.callback(*job.args)
+            except Exception:
+                # The thread keeps running the other jobs
+                logger.exception("%s job %r failed", self.name, job.callback)
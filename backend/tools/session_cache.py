@@ -0,0 +1,70 @@
+import collections
+import threading
+import time
+from typing import *
+
+class SessionCache:
+    """Bounded LRU of user documents keyed by hashed auth token.
+
+    Entries expire `ttl` seconds after they were stored, which bounds how
+    long a change made elsewhere (another worker process, a manual edit)
+    can go unnoticed. Writes made by this process invalidate the entry
+    directly. Only hits are cached; unknown tokens always go to the database.
+    """
+
+    def __init__(self, max_size: int = 10000, ttl: float = 30.0):
+        self.max_size: int = max_size
+        self.ttl: float = ttl
+        self.entries: collections.OrderedDict[bytes, tuple[float, Mapping[str, Any]]] = collections.OrderedDict()
+        self.lock: threading.Lock = threading.Lock()
+
+        self.hits: int = 0
+        self.misses: int = 0
+        self.evictions: int = 0
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def get(self, hashed_token: bytes) -> (Mapping[str, Any] | None):
+        with self.lock:
+            entry: (tuple[float, Mapping[str, Any]] | None) = self.entries.get(hashed_token)
+            if(entry is None or entry[0] <= time.monotonic()):
+                if(entry is not None):
+                    del self.entries[hashed_token]
+                self.misses += 1
+                return None
+
+            self.entries.move_to_end(hashed_token)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, hashed_token: bytes, user: Mapping[str, Any]) -> None:
+        if(self.max_size <= 0):
+            return
+
+        with self.lock:
+            self.entries[hashed_token] = (time.monotonic() + self.ttl, user)
+            self.entries.move_to_end(hashed_token)
+            while(len(self.entries) > self.max_size):
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, hashed_token: (bytes | None)) -> None:
+        with self.lock:
+            self.entries.pop(hashed_token, None)
+
+    def clear(self) -> None:
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self) -> dict[str, Any]:
+        with self.lock:
+            lookups: int = self.hits + self.misses
+            return {
+                "size": len(self.entries),
+                "maxSize": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hitRate": self.hits / lookups if lookups else 0.0
+            }
@@ -0,0 +1,50 @@
+import math
+from typing import *
+
+Point = dict[str, float]
+
+class SnakeBody:
+    """Segment positions of a server-simulated snake, head first, in a ring buffer.
+
+    Movement follows the browser client: the head slot is overwritten every
+    step, and once the head is `spacing` past the point where the last head
+    was pushed, a fresh head slot is pushed in front of it. Pushing moves
+    the start index back one slot and trimming the tail only lowers the
+    count, so a step costs the same for any length. The slots hold the
+    {"x", "y"} points that snapshots send; a point is never changed once
+    written, so points() can hand out the slots without copying them.
+    """
+
+    def __init__(self, x: float, y: float, capacity: int = 16):
+        self.slots: list[(Point | None)] = [None] * capacity
+        self.start: int = 0
+        self.count: int = 1
+        self.slots[0] = {"x": x, "y": y}
+        # Where the head was last pushed
+        self.anchor: tuple[float, float] = (x, y)
+
+    def __len__(self) -> int:
+        return self.count
+
+    def move_head(self, x: float, y: float, spacing: float) -> None:
+        if(math.hypot(x - self.anchor[0], y - self.anchor[1]) >= spacing):
+            if(self.count == len(self.slots)):
+                self._grow()
+            self.start = (self.start - 1) % len(self.slots)
+            self.count += 1
+            self.anchor = (x, y)
+        self.slots[self.start] = {"x": x, "y": y}
+
+    def trim(self, length: int) -> None:
+        self.count = min(self.count, max(1, length))
+
+    def points(self) -> list[Point]:
+        """A new list of the segments, head first"""
+        end: int = self.start + self.count
+        if(end <= len(self.slots)):
+            return self.slots[self.start:end]
+        return self.slots[self.start:] + self.slots[:end - len(self.slots)]
+
+    def _grow(self) -> None:
+        self.slots = self.points() + [None] * len(self.slots)
+        self.start = 0
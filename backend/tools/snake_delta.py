@@ -0,0 +1,61 @@
+from typing import *
+
+Point = dict[str, float]
+
+def diff_segments(old: list[Point], new: list[Point]) -> (tuple[list[Point], int] | None):
+    """Describe `new` as `old` with points added behind the head and trimmed off the tail.
+
+    Clients move a snake by overwriting segments[0] (the head) and, once it
+    has travelled far enough, pushing a fresh head in front of it, then
+    popping the tail to stay at the target length. Everything after the head
+    is therefore shared between two consecutive states. Returns
+    (added, trimmed) or None when `new` is not a continuation of `old`.
+    """
+    if(not old or not new):
+        return None
+
+    if(len(old) == 1):
+        return new[1:], 0
+
+    anchor: Point = old[1]
+    added_count: int = -1
+    for i in range(1, len(new)):
+        if(new[i] == anchor):
+            added_count = i - 1
+            break
+
+    if(added_count < 0):
+        return None
+
+    kept: int = len(new) - 1 - added_count
+    if(kept > len(old) - 1 or new[-1] != old[kept]):
+        return None
+
+    return new[1:1 + added_count], len(old) - 1 - kept
+
+def apply_segments_delta(segments: list[Point], head: Point, added: list[Point], trimmed: int) -> list[Point]:
+    body: list[Point] = segments[1:max(1, len(segments) - trimmed)]
+    return [head] + added + body
+
+def build_snake_delta(snake: dict[str, Any], old_segments: list[Point]) -> (dict[str, Any] | None):
+    """Delta form of a snake_update: head, segment changes and the fields that vary per move.
+
+    Static fields (username, color) are left out; clients already have them
+    from snake_joined or the last keyframe.
+    """
+    diff: (tuple[list[Point], int] | None) = diff_segments(old_segments, snake["segments"])
+    if(diff is None):
+        return None
+
+    added, trimmed = diff
+    return {
+        "id": snake["id"],
+        "delta": True,
+        "x": snake["x"],
+        "y": snake["y"],
+        "added": added,
+        "trimmed": trimmed,
+        "length": snake["length"],
+        "score": snake["score"],
+        "alive": snake["alive"]
+    }
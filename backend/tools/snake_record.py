@@ -0,0 +1,50 @@
+from typing import *
+
+Point = dict[str, float]
+
+class Snake:
+    """One player's snake as the server tracks it, updated in place.
+
+    A `move` overwrites the fields of the existing record rather than
+    building a new dict per message. The dict that goes out on the wire is
+    only built by to_dict() when the snake is actually sent (a snapshot,
+    snake_joined or init_location). The segments list itself is never
+    changed in place, only replaced, so a view can share it.
+    """
+    __slots__ = ("id", "x", "y", "color", "username", "segments", "length", "score", "alive")
+
+    def __init__(self, snake_id: str, x: float, y: float, color: (str | None), username: str,
+                 segments: (list[Point] | None) = None, length: int = 1, score: int = 0, alive: bool = True):
+        self.id: str = snake_id
+        self.x: float = x
+        self.y: float = y
+        self.color: (str | None) = color
+        self.username: str = username
+        self.segments: list[Point] = [] if segments is None else segments
+        self.length: int = length
+        self.score: int = score
+        self.alive: bool = alive
+
+    def move(self, x: float, y: float, color: (str | None), username: str,
+             segments: list[Point], length: int, score: int, alive: bool) -> None:
+        self.x = x
+        self.y = y
+        self.color = color
+        self.username = username
+        self.segments = segments
+        self.length = length
+        self.score = score
+        self.alive = alive
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "id": self.id,
+            "x": self.x,
+            "y": self.y,
+            "color": self.color,
+            "username": self.username,
+            "segments": self.segments,
+            "length": self.length,
+            "score": self.score,
+            "alive": self.alive
+        }
@@ -0,0 +1,77 @@
+from typing import *
+
+class SpatialGrid:
+    """Uniform hash grid mapping ids to world positions.
+
+    Each id lives in exactly one cell, so moving an entity is O(1) and a
+    radius query only has to look at the cells overlapping the query circle
+    instead of every entity in the world.
+    """
+
+    def __init__(self, cell_size: float = 400):
+        self.cell_size: float = cell_size
+        self.cells: dict[tuple[int, int], set[Hashable]] = {}
+        self.positions: dict[Hashable, tuple[float, float]] = {}
+        self.entity_cells: dict[Hashable, tuple[int, int]] = {}
+
+    def __len__(self) -> int:
+        return len(self.positions)
+
+    def __contains__(self, entity_id: Hashable) -> bool:
+        return entity_id in self.positions
+
+    def cell_for(self, x: float, y: float) -> tuple[int, int]:
+        return (int(x // self.cell_size), int(y // self.cell_size))
+
+    def update(self, entity_id: Hashable, x: float, y: float) -> None:
+        cell: tuple[int, int] = self.cell_for(x, y)
+        old_cell: (tuple[int, int] | None) = self.entity_cells.get(entity_id)
+
+        if(old_cell != cell):
+            if(old_cell is not None):
+                self._discard_from_cell(entity_id, old_cell)
+            self.cells.setdefault(cell, set()).add(entity_id)
+            self.entity_cells[entity_id] = cell
+
+        self.positions[entity_id] = (x, y)
+
+    def remove(self, entity_id: Hashable) -> None:
+        cell: (tuple[int, int] | None) = self.entity_cells.pop(entity_id, None)
+        if(cell is not None):
+            self._discard_from_cell(entity_id, cell)
+        self.positions.pop(entity_id, None)
+
+    def clear(self) -> None:
+        self.cells.clear()
+        self.positions.clear()
+        self.entity_cells.clear()
+
+    def query_radius(self, x: float, y: float, radius: float, exclude_id: (Hashable | None) = None) -> list[Hashable]:
+        min_cx, min_cy = self.cell_for(x - radius, y - radius)
+        max_cx, max_cy = self.cell_for(x + radius, y + radius)
+        radius_sq: float = radius * radius
+        found: list[Hashable] = []
+
+        for cx in range(min_cx, max_cx + 1):
+            for cy in range(min_cy, max_cy + 1):
+                cell_ids: (set[Hashable] | None) = self.cells.get((cx, cy))
+                if(not cell_ids):
+                    continue
+                for entity_id in cell_ids:
+                    if(entity_id == exclude_id):
+                        continue
+                    ex, ey = self.positions[entity_id]
+                    dx: float = x - ex
+                    dy: float = y - ey
+                    if(dx * dx + dy * dy <= radius_sq):
+                        found.append(entity_id)
+
+        return found
+
+    def _discard_from_cell(self, entity_id: Hashable, cell: tuple[int, int]) -> None:
+        cell_ids: (set[Hashable] | None) = self.cells.get(cell)
+        if(cell_ids is None):
+            return
+        cell_ids.discard(entity_id)
+        if(not cell_ids):
+            del self.cells[cell]
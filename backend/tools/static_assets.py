@@ -0,0 +1,163 @@
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+import sys
+from typing import *
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_TYPES: tuple[str, ...] = (
+    "text/", "application/javascript", "application/json", "application/manifest+json",
+    "application/xml", "application/wasm", "image/svg+xml", "image/x-icon", "image/vnd.microsoft.icon"
+)
+MIN_COMPRESS_SIZE: int = 512
+# Larger files stay on disk and are served by send_from_directory
+MAX_ASSET_SIZE: int = 8 * 1024 * 1024
+# Vite's build output names: assets/<name>-<8 character content hash>.<ext>
+HASHED_NAME: re.Pattern = re.compile(r"^assets/.+-[A-Za-z0-9_-]{8}\.[A-Za-z0-9]+$")
+# Written at runtime, so never frozen into the manifest
+SKIP_DIRS: set[str] = {"avatars"}
+
+IMMUTABLE_CACHE: str = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE: str = "no-cache"
+
+# Preference order when the client accepts several
+ENCODINGS: tuple[tuple[str, str, str], ...] = (("br", ".br", "br"), ("gzip", ".gz", "gz"))
+
+def compress(encoding: str, data: bytes) -> (bytes | None):
+    if(encoding == "br"):
+        return brotli.compress(data, quality=11) if brotli is not None else None
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+class StaticAsset:
+    """One file of the static folder, held in memory with its compressed variants.
+
+    Each variant has its own strong ETag (the content hash plus an encoding
+    suffix), so a cached gzip body is never revalidated as the brotli one.
+    """
+
+    def __init__(self, path: str, content_type: str, body: bytes):
+        self.path: str = path
+        self.content_type: str = content_type
+        self.digest: str = hashlib.sha256(body).hexdigest()[:24]
+        self.variants: dict[str, tuple[bytes, str]] = {"identity": (body, self.digest)}
+        self.cache_control: str = IMMUTABLE_CACHE if HASHED_NAME.match(path) else REVALIDATE_CACHE
+
+    @property
+    def compressible(self) -> bool:
+        return self.content_type.startswith(COMPRESSIBLE_TYPES)
+
+    @property
+    def size(self) -> int:
+        return len(self.variants["identity"][0])
+
+    def add_variant(self, encoding: str, suffix: str, data: (bytes | None)) -> None:
+        # Only worth sending when it is actually smaller
+        if(data is not None and len(data) < self.size):
+            self.variants[encoding] = (data, f"{self.digest}-{suffix}")
+
+    def select(self, accepts: Callable[[str], bool]) -> tuple[str, bytes, str]:
+        """(encoding, body, unquoted etag) of the best variant the client accepts"""
+        for encoding, _, _ in ENCODINGS:
+            if(encoding in self.variants and accepts(encoding)):
+                body, etag = self.variants[encoding]
+                return encoding, body, etag
+        body, etag = self.variants["identity"]
+        return "identity", body, etag
+
+class StaticManifest:
+    """Every servable file under `root`, read once at startup.
+
+    Compressed variants come from `.br` / `.gz` files next to the original
+    when they are at least as new (see precompress()), and are computed in
+    memory otherwise. Lookups are exact matches on the URL path relative
+    to `root`, so no path is ever joined onto the file system per request.
+    """
+
+    def __init__(self, root: str):
+        self.root: str = root
+        self.assets: dict[str, StaticAsset] = {}
+
+    def __contains__(self, path: str) -> bool:
+        return path in self.assets
+
+    def __len__(self) -> int:
+        return len(self.assets)
+
+    def get(self, path: str) -> (StaticAsset | None):
+        return self.assets.get(path)
+
+    def build(self) -> None:
+        assets: dict[str, StaticAsset] = {}
+        for path, full_path in walk_static(self.root):
+            if(os.path.getsize(full_path) > MAX_ASSET_SIZE):
+                continue
+
+            content_type: str = mimetypes.guess_type(path)[0] or "application/octet-stream"
+            with open(full_path, "rb") as file:
+                asset: StaticAsset = StaticAsset(path, content_type, file.read())
+
+            if(asset.compressible and asset.size >= MIN_COMPRESS_SIZE):
+                for encoding, extension, suffix in ENCODINGS:
+                    asset.add_variant(encoding, suffix, read_precompressed(full_path, extension) or compress(encoding, asset.variants["identity"][0]))
+            assets[path] = asset
+
+        # Swapped in whole, so requests never see a half-built manifest
+        self.assets = assets
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "files": len(self.assets),
+            "bytes": sum(asset.size for asset in self.assets.values()),
+            "compressedBytes": {
+                encoding: sum(len(asset.variants.get(encoding, asset.variants["identity"])[0]) for asset in self.assets.values())
+                for encoding, _, _ in ENCODINGS
+            },
+            "immutable": sum(1 for asset in self.assets.values() if asset.cache_control == IMMUTABLE_CACHE)
+        }
+
+def walk_static(root: str) -> Iterator[tuple[str, str]]:
+    """(url path, file path) of every file under root, skipping precompressed siblings"""
+    for directory, dirs, files in os.walk(root):
+        if(directory == root):
+            dirs[:] = [d for d in dirs if d not in SKIP_DIRS]
+        for name in files:
+            if(name.endswith((".br", ".gz"))):
+                continue
+            full_path: str = os.path.join(directory, name)
+            yield os.path.relpath(full_path, root).replace(os.sep, "/"), full_path
+
+def read_precompressed(full_path: str, extension: str) -> (bytes | None):
+    compressed_path: str = full_path + extension
+    if(not os.path.exists(compressed_path) or os.path.getmtime(compressed_path) < os.path.getmtime(full_path)):
+        return None
+    with open(compressed_path, "rb") as file:
+        return file.read()
+
+def precompress(root: str) -> int:
+    """Write .br and .gz files next to each compressible file under root; returns files written"""
+    written: int = 0
+    for path, full_path in walk_static(root):
+        content_type: str = mimetypes.guess_type(path)[0] or ""
+        if(not content_type.startswith(COMPRESSIBLE_TYPES) or os.path.getsize(full_path) < MIN_COMPRESS_SIZE):
+            continue
+
+        with open(full_path, "rb") as file:
+            body: bytes = file.read()
+        for encoding, extension, _ in ENCODINGS:
+            data: (bytes | None) = compress(encoding, body)
+            if(data is not None and len(data) < len(body)):
+                with open(full_path + extension, "wb") as file:
+                    file.write(data)
+                written += 1
+    return written
+
+if __name__ == "__main__":
+    # Build step: python -m backend.tools.static_assets frontend/dist
+    for root in sys.argv[1:]:
+        print(f"{root}: wrote {precompress(root)} compressed files")
@@ -0,0 +1,309 @@
+import logging
+import threading
+import time
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, PyMongoError
+from typing import *
+
+logger: logging.Logger = logging.getLogger(__name__)
+
+class StatsBufferFull(RuntimeError):
+    pass
+
+def game_delta(score: int, length: int, survival_time: float, food_eaten: int, kills: int) -> dict[str, Any]:
+    """The stats change of one finished game"""
+    return {
+        "games": 1,
+        "highScore": score,
+        "longestSnake": length,
+        "survivalTime": survival_time,
+        "totalFood": food_eaten,
+        "totalKills": kills
+    }
+
+def merge_deltas(older: dict[str, Any], newer: dict[str, Any]) -> dict[str, Any]:
+    return {
+        "games": older["games"] + newer["games"],
+        "highScore": max(older["highScore"], newer["highScore"]),
+        "longestSnake": max(older["longestSnake"], newer["longestSnake"]),
+        "survivalTime": older["survivalTime"] + newer["survivalTime"],
+        "totalFood": older["totalFood"] + newer["totalFood"],
+        "totalKills": older["totalKills"] + newer["totalKills"]
+    }
+
+def apply_delta(stats: Mapping[str, Any], delta: dict[str, Any]) -> dict[str, Any]:
+    """Stats after the games in delta, same result as saving them one at a time"""
+    previous_games: int = stats.get("gameCount", 0)
+    game_count: int = previous_games + delta["games"]
+    total_survival_time: float = stats.get("avgSurvivalTime", 0) * previous_games + delta["survivalTime"]
+    return {
+        "highScore": max(stats.get("highScore", 0), delta["highScore"]),
+        "avgSurvivalTime": total_survival_time / game_count if game_count > 0 else 0,
+        "longestSnake": max(stats.get("longestSnake", 0), delta["longestSnake"]),
+        "totalFood": stats.get("totalFood", 0) + delta["totalFood"],
+        "totalKills": stats.get("totalKills", 0) + delta["totalKills"],
+        "gameCount": game_count
+    }
+
+def _stored(field: str) -> dict[str, Any]:
+    return {"$ifNull": [f"$stats.{field}", 0]}
+
+def stats_update(delta: dict[str, Any]) -> list[dict[str, Any]]:
+    """Update pipeline that applies delta to a user's stored stats in one server-side step.
+
+    Same result as apply_delta, without reading the stats first. Every
+    expression in the stage sees the document as it was before the update,
+    so the average is weighted by the previous game count. Mongo applies it
+    atomically per document, so concurrent saves for one user cannot lose
+    games. statsVersion counts the games applied, which is what profile
+    responses are cached by.
+    """
+    game_count: dict[str, Any] = {"$add": [_stored("gameCount"), delta["games"]]}
+    total_survival_time: dict[str, Any] = {
+        "$add": [{"$multiply": [_stored("avgSurvivalTime"), _stored("gameCount")]}, delta["survivalTime"]]
+    }
+    return [{"$set": {
+        "stats.highScore": {"$max": [_stored("highScore"), delta["highScore"]]},
+        "stats.avgSurvivalTime": {"$divide": [total_survival_time, game_count]},
+        "stats.longestSnake": {"$max": [_stored("longestSnake"), delta["longestSnake"]]},
+        "stats.totalFood": {"$add": [_stored("totalFood"), delta["totalFood"]]},
+        "stats.totalKills": {"$add": [_stored("totalKills"), delta["totalKills"]]},
+        "stats.gameCount": game_count,
+        "statsVersion": {"$add": [{"$ifNull": ["$statsVersion", 0]}, delta["games"]]}
+    }}]
+
+class StatsBuffer:
+    """Write-behind buffer for end-of-game stats, keyed by user id.
+
+    The id, unlike the auth token, survives logging out or in elsewhere
+    before the flush. Each entry also remembers the user's latest hashed
+    token, which is what on_flushed gets to drop cached copies of the user.
+
+    add() only merges the game into the user's pending delta, so a burst of
+    deaths costs the request path nothing but a dict update. One flusher
+    thread writes everything pending once `max_batch` users are waiting or
+    the oldest delta is `max_delay` seconds old: one unordered bulk_write
+    with a stats_update pipeline per user and no read before it, so
+    several server processes flushing the same user cannot lose games.
+    A failed flush puts the batch back to be retried. A user whose update
+    Mongo rejects `max_attempts` times in a row (e.g. stored stats that are
+    not numbers) is dropped from the batch and counted, so it cannot hold
+    up everybody else's games forever.
+
+    Flush lag (how long a game waits to be written) stays within max_delay
+    plus one flush while Mongo keeps up. If it does not, add() blocks once
+    `max_pending` users are waiting rather than letting the backlog grow,
+    and raises StatsBufferFull after `add_timeout` seconds. close() writes
+    whatever is left; it runs at exit and from the servers' shutdown hooks.
+    A crash loses at most the unflushed deltas.
+    """
+
+    def __init__(self, get_collection: Callable[[], Any], max_batch: int = 500, max_delay: float = 1.0,
+                 max_pending: int = 10000, retry_delay: float = 1.0, max_attempts: int = 5,
+                 add_timeout: float = 5.0,
+                 on_flushed: (Callable[[list[(bytes | None)]], None] | None) = None):
+        self.get_collection: Callable[[], Any] = get_collection
+        self.max_batch: int = max_batch
+        self.max_delay: float = max_delay
+        self.max_pending: int = max_pending
+        self.retry_delay: float = retry_delay
+        self.max_attempts: int = max_attempts
+        self.add_timeout: float = add_timeout
+        self.on_flushed: (Callable[[list[(bytes | None)]], None] | None) = on_flushed
+
+        # (queued at, delta, hashed token) by user id. Insertion-ordered, so
+        # the first entry is the oldest delta.
+        self.pending: dict[str, tuple[float, dict[str, Any], (bytes | None)]] = {}
+        self.cond: threading.Condition = threading.Condition()
+        self.thread: (threading.Thread | None) = None
+        self.closed: bool = False
+        # The batch being written, kept until on_flushed has run; empty when idle
+        self.flushing: dict[str, tuple[float, dict[str, Any], (bytes | None)]] = {}
+        self.retry_at: float = 0.0
+        # Rejected writes in a row, by user id
+        self.attempts: dict[str, int] = {}
+
+        self.games: int = 0
+        self.flushes: int = 0
+        self.written: int = 0
+        self.errors: int = 0
+        self.dropped: int = 0
+        self.max_lag: float = 0.0
+        self.last_flush_ms: float = 0.0
+
+    def add(self, key: str, delta: dict[str, Any], token: (bytes | None) = None) -> None:
+        """Queue one user's games; raises StatsBufferFull if no room opened up within add_timeout"""
+        deadline: float = time.monotonic() + self.add_timeout
+        with self.cond:
+            while(len(self.pending) >= self.max_pending and key not in self.pending and not self.closed):
+                remaining: float = deadline - time.monotonic()
+                if(remaining <= 0):
+                    raise StatsBufferFull(f"{len(self.pending)} users waiting to be written")
+                self.cond.wait(remaining)
+            self.games += 1
+
+            entry: (tuple[float, dict[str, Any], (bytes | None)] | None) = self.pending.get(key)
+            if(entry is None):
+                self.pending[key] = (time.monotonic(), delta, token)
+            else:
+                self.pending[key] = (entry[0], merge_deltas(entry[1], delta), token)
+
+            if(self.closed):
+                # After shutdown there is no flusher left; write straight through
+                self._flush_locked()
+                return
+
+            if(self.thread is None):
+                self.thread = threading.Thread(target=self._run, name="stats-flusher", daemon=True)
+                self.thread.start()
+            if(len(self.pending) >= self.max_batch or entry is None and len(self.pending) == 1):
+                self.cond.notify_all()
+
+    def pending_delta(self, key: str) -> (dict[str, Any] | None):
+        """Games of this user not written yet, to show on top of the stored stats.
+
+        Includes the games in the batch being written: until on_flushed has
+        dropped the cached user, readers may still hold the stats from before.
+        """
+        with self.cond:
+            entry: (tuple[float, dict[str, Any], (bytes | None)] | None) = self.pending.get(key)
+            in_flight: (tuple[float, dict[str, Any], (bytes | None)] | None) = self.flushing.get(key)
+            if(in_flight is None):
+                return None if entry is None else entry[1]
+            if(entry is None):
+                return in_flight[1]
+            return merge_deltas(in_flight[1], entry[1])
+
+    def close(self, timeout: float = 10.0) -> bool:
+        """Stop the flusher and write everything pending; False if that failed or timed out"""
+        deadline: float = time.monotonic() + timeout
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+            while(self.flushing):
+                remaining: float = deadline - time.monotonic()
+                if(remaining <= 0):
+                    return False
+                self.cond.wait(remaining)
+            self._flush_locked()
+            return not self.pending
+
+    def stats(self) -> dict[str, Any]:
+        with self.cond:
+            oldest: float = next(iter(self.pending.values()))[0] if self.pending else time.monotonic()
+            return {
+                "pendingUsers": len(self.pending),
+                "flushingUsers": len(self.flushing),
+                "maxPending": self.max_pending,
+                "games": self.games,
+                "flushes": self.flushes,
+                "written": self.written,
+                "errors": self.errors,
+                "dropped": self.dropped,
+                "lagMs": (time.monotonic() - oldest) * 1000,
+                "maxLagMs": self.max_lag * 1000,
+                "maxDelayMs": self.max_delay * 1000,
+                "lastFlushMs": self.last_flush_ms
+            }
+
+    def _due_in(self) -> (float | None):
+        """Seconds until the pending batch must be flushed; None when empty. Caller holds cond."""
+        if(not self.pending):
+            return None
+        now: float = time.monotonic()
+        if(len(self.pending) >= self.max_batch):
+            return self.retry_at - now
+        oldest: float = next(iter(self.pending.values()))[0]
+        return max(oldest + self.max_delay, self.retry_at) - now
+
+    def _run(self) -> None:
+        with self.cond:
+            while(not self.closed):
+                due_in: (float | None) = self._due_in()
+                if(due_in is None or due_in > 0):
+                    self.cond.wait(due_in)
+                    continue
+                try:
+                    flushed: bool = self._flush_locked()
+                except Exception:
+                    # The flusher must outlive any one batch
+                    logger.exception("stats flush failed")
+                    flushed = False
+                if(not flushed):
+                    self.retry_at = time.monotonic() + self.retry_delay
+
+    def _flush_locked(self) -> bool:
+        """Write the pending batch; cond is released during the Mongo calls. Caller holds cond."""
+        if(not self.pending):
+            return True
+
+        batch: dict[str, tuple[float, dict[str, Any], (bytes | None)]] = self.pending
+        self.pending = {}
+        self.flushing = batch
+        self.cond.notify_all()
+        self.cond.release()
+        started: float = time.monotonic()
+        # Updates Mongo would not apply, as opposed to a write that did not get through
+        rejected: set[str] = set()
+        try:
+            failed: set[str] = self._write(batch)
+            rejected = set(failed)
+        except PyMongoError:
+            # Nothing is known to have been written
+            failed = set(batch)
+        except Exception:
+            # Not a Mongo failure (e.g. a delta that cannot be encoded); retrying will not help forever
+            logger.exception("stats batch of %d users could not be written", len(batch))
+            failed = set(batch)
+            rejected = set(batch)
+        finally:
+            self.cond.acquire()
+
+        finished: float = time.monotonic()
+        self.last_flush_ms = (finished - started) * 1000
+        try:
+            written: list[str] = [key for key in batch if key not in failed]
+            for key in written:
+                self.attempts.pop(key, None)
+            for key in rejected:
+                self.attempts[key] = self.attempts.get(key, 0) + 1
+                if(self.attempts[key] >= self.max_attempts):
+                    del self.attempts[key]
+                    failed.discard(key)
+                    self.dropped += batch[key][1]["games"]
+                    logger.error("dropped %d unwritable games of user %s", batch[key][1]["games"], key)
+            if(written):
+                self.flushes += 1
+                self.written += len(written)
+                self.max_lag = max(self.max_lag, finished - batch[written[0]][0])
+                if(self.on_flushed is not None):
+                    self.on_flushed([batch[key][2] for key in written])
+            if(rejected or failed):
+                self.errors += 1
+            if(not failed):
+                return True
+
+            # Put the failed deltas back in front of anything added meanwhile
+            retry: dict[str, tuple[float, dict[str, Any], (bytes | None)]] = {key: batch[key] for key in batch if key in failed}
+            for key, (queued, delta, token) in self.pending.items():
+                if(key in retry):
+                    retry[key] = (retry[key][0], merge_deltas(retry[key][1], delta), token)
+                else:
+                    retry[key] = (queued, delta, token)
+            self.pending = retry
+            return False
+        finally:
+            # The cached users are gone or the failed games are pending again
+            self.flushing = {}
+            self.cond.notify_all()
+
+    def _write(self, batch: dict[str, tuple[float, dict[str, Any], (bytes | None)]]) -> set[str]:
+        """Write a batch and return the keys whose update failed"""
+        keys: list[str] = list(batch)
+        # Users deleted since their game match nothing and are dropped
+        operations: list[UpdateOne] = [UpdateOne({"id": key}, stats_update(batch[key][1])) for key in keys]
+        try:
+            self.get_collection().bulk_write(operations, ordered=False)
+        except BulkWriteError as e:
+            return {keys[error["index"]] for error in e.details.get("writeErrors", [])}
+        return set()
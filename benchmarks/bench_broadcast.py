@@ -0,0 +1,91 @@
+"""Encode count and wall time of broadcast_to_all at 500 connections.
+
+Compares the per-client json.dumps loop broadcast_to_all used to run with
+the serialize-once broadcast path in game_websocket.
+
+    python benchmarks/bench_broadcast.py
+"""
+import json
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import game_websocket as websocket
+
+CONNECTIONS = 500
+ROUNDS = 50
+
+class NullSocket:
+    def send(self, payload):
+        pass
+
+    def close(self, *args):
+        pass
+
+class CountingJson:
+    def __init__(self):
+        self.encodes = 0
+
+    def dumps(self, obj):
+        self.encodes += 1
+        return json.dumps(obj)
+
+    def loads(self, payload):
+        return json.loads(payload)
+
+raw_connections = {}
+connections_lock = threading.RLock()
+
+def per_client_broadcast(message, exclude_id=None):
+    # The previous broadcast_to_all: one lock round trip and one encode per client
+    with connections_lock:
+        client_ids = list(raw_connections.keys())
+
+    for client_id in client_ids:
+        if exclude_id is None or client_id != exclude_id:
+            try:
+                with connections_lock:
+                    if client_id in raw_connections:
+                        client_ws = raw_connections[client_id]
+                        client_ws.send(websocket.json.dumps(message))
+            except Exception as e:
+                websocket.disconnect_client(client_id)
+
+def sample_messages():
+    foods = websocket.generate_foods(30)
+    leaderboard = [{"id": str(i), "name": f"player{i}", "score": 100 - i} for i in range(10)]
+    return [
+        {"messageType": "food_update", "food_id": "42", "active": False},
+        {"messageType": "leaderboard_update", "leaderboard": leaderboard},
+        {"messageType": "new_foods", "foods": foods},
+        {"messageType": "player_died", "snake_id": "7", "food_particles": foods[:10]},
+    ]
+
+def measure(broadcast):
+    counter = CountingJson()
+    websocket.json = counter
+    try:
+        start = time.perf_counter()
+        for _ in range(ROUNDS):
+            for message in sample_messages_cache:
+                broadcast(message)
+        elapsed = time.perf_counter() - start
+    finally:
+        websocket.json = json
+    return counter.encodes, elapsed
+
+if __name__ == "__main__":
+    for i in range(CONNECTIONS):
+        raw_connections[str(i)] = NullSocket()
+        websocket.active_connections[str(i)] = websocket.create_send_queue(str(i), NullSocket(), f"player{i}", websocket.get_codec("json"))
+    sample_messages_cache = sample_messages()
+    broadcasts = ROUNDS * len(sample_messages_cache)
+
+    print(f"{CONNECTIONS} connections, {broadcasts} broadcasts")
+    print(f"{'path':>16} {'encodes':>9} {'total ms':>9} {'ms/broadcast':>13}")
+    for name, broadcast in (("per-client", per_client_broadcast), ("serialize-once", websocket.broadcast_to_all)):
+        encodes, elapsed = measure(broadcast)
+        print(f"{name:>16} {encodes:>9} {elapsed * 1000:>9.1f} {elapsed / broadcasts * 1000:>13.3f}")
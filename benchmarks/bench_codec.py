@@ -0,0 +1,88 @@
+"""Payload size and encode/decode throughput: JSON vs. the binary game codec.
+
+Also checks that every binary frame round-trips to the same message (with
+coordinates on the codec's quantisation grid) before timing it.
+
+    python benchmarks/bench_codec.py
+"""
+import math
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from backend.tools.game_codec import COORD_SCALE, get_codec
+
+ITERATIONS = 2000
+
+def grid_point(x, y):
+    # Values the binary codec can represent exactly
+    return {"x": round(x * COORD_SCALE) / COORD_SCALE, "y": round(y * COORD_SCALE) / COORD_SCALE}
+
+def body(length):
+    angle = random.uniform(0, 2 * math.pi)
+    x, y = random.uniform(200, 2200), random.uniform(200, 1400)
+    points = []
+    for _ in range(length):
+        points.append(grid_point(x, y))
+        angle += random.uniform(-0.3, 0.3)
+        x = min(2380, max(20, x - math.cos(angle) * 24))
+        y = min(1580, max(20, y - math.sin(angle) * 24))
+    return points
+
+def move_message(length):
+    segments = body(length)
+    return {
+        "messageType": "move",
+        "snake_x": segments[0]["x"],
+        "snake_y": segments[0]["y"],
+        "snake_color": "#3fa9f5",
+        "username": "benchmark_player",
+        "segments": segments,
+        "length": length,
+        "score": length * 5,
+        "alive": True
+    }
+
+def snapshot_message(length, snakes=10):
+    entries = []
+    for i in range(snakes):
+        segments = body(length)
+        if i % 2:
+            entries.append({
+                "id": f"{i:036d}", "delta": True, "x": segments[0]["x"], "y": segments[0]["y"],
+                "added": segments[1:2], "trimmed": 1, "length": length, "score": length * 5, "alive": True
+            })
+        else:
+            entries.append({
+                "id": f"{i:036d}", "x": segments[0]["x"], "y": segments[0]["y"], "color": "#3fa9f5",
+                "username": f"player{i}", "length": length, "segments": segments, "score": length * 5, "alive": True
+            })
+    return {"messageType": "world_snapshot", "snakes": entries}
+
+def timed(fn, arg):
+    start = time.perf_counter()
+    for _ in range(ITERATIONS):
+        fn(arg)
+    return (time.perf_counter() - start) / ITERATIONS * 1e6
+
+if __name__ == "__main__":
+    random.seed(312)
+    json_codec = get_codec("json")
+    binary_codec = get_codec("binary")
+
+    print(f"{'message':>22} {'json B':>8} {'bin B':>7} {'size':>6} {'json enc us':>12} {'bin enc us':>11} {'json dec us':>12} {'bin dec us':>11}")
+    for name, build in (("move", move_message), ("world_snapshot x10", snapshot_message)):
+        for length in (10, 100, 500):
+            message = build(length)
+            json_payload = json_codec.encode(message)
+            binary_payload = binary_codec.encode(message)
+            assert binary_codec.decode(binary_payload) == message
+            assert json_codec.decode(json_payload) == message
+
+            print(f"{name + ' ' + str(length):>22} {len(json_payload.encode()):>8} {len(binary_payload):>7} "
+                  f"{len(binary_payload) / len(json_payload.encode()):>5.0%} "
+                  f"{timed(json_codec.encode, message):>12.1f} {timed(binary_codec.encode, message):>11.1f} "
+                  f"{timed(json_codec.decode, json_payload):>12.1f} {timed(binary_codec.decode, binary_payload):>11.1f}")
@@ -0,0 +1,78 @@
+"""Food operations at MAX_FOODS = 300 / 5k / 50k: dict of dicts vs. FoodStore.
+
+"full-state json" is the foods part of init_location. The dict version
+built and encoded it on the game-state thread; FoodStore only copies its
+arrays there ("full-state on tick") and the connection's writer formats
+them with foods_json.
+
+    python benchmarks/bench_food_store.py
+"""
+import json
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from backend.tools.food_store import FoodStore, foods_json, random_colors
+
+WORLD_WIDTH = 2400
+WORLD_HEIGHT = 1600
+VIEW = (600, 400, 1800, 1200)
+
+def dict_generate(count):
+    # Per-food dicts with the one-character-at-a-time colors of the old generate_foods
+    foods = {}
+    for i in range(count):
+        foods[str(i)] = {
+            "id": str(i),
+            "x": random.uniform(40, WORLD_WIDTH - 40),
+            "y": random.uniform(40, WORLD_HEIGHT - 40),
+            "color": '#' + ''.join([random.choice('0123456789ABCDEF') for _ in range(6)]),
+            "active": True
+        }
+    return foods
+
+def store_generate(count, rng):
+    store = FoodStore()
+    store.add_many(rng.uniform(40, WORLD_WIDTH - 40, count), rng.uniform(40, WORLD_HEIGHT - 40, count), random_colors(rng, count))
+    return store
+
+def timed(fn, repeat=5):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return (time.perf_counter() - start) / repeat * 1000, result
+
+if __name__ == "__main__":
+    random.seed(312)
+    rng = np.random.default_rng(312)
+    print(f"{'foods':>7} {'op':>18} {'dict ms':>9} {'store ms':>9}")
+    for count in (300, 5000, 50000):
+        dict_ms, foods = timed(lambda: dict_generate(count), 1)
+        store_ms, store = timed(lambda: store_generate(count, rng), 1)
+        print(f"{count:>7} {'generate':>18} {dict_ms:>9.2f} {store_ms:>9.2f}")
+
+        for food_id in random.sample(list(foods), count // 3):
+            foods[food_id]["active"] = False
+            store.deactivate(food_id)
+
+        rows = (
+            ("count active", lambda: sum(1 for food in foods.values() if food["active"]), store.active_count),
+            ("full-state json", lambda: json.dumps([food for food in foods.values() if food["active"]]),
+                lambda: foods_json(*store.active_fields())),
+            ("full-state on tick", lambda: json.dumps([food for food in foods.values() if food["active"]]),
+                store.active_fields),
+            ("active in view", lambda: [f for f in foods.values() if f["active"] and VIEW[0] <= f["x"] <= VIEW[2] and VIEW[1] <= f["y"] <= VIEW[3]],
+                lambda: store.active_in_rect(*VIEW)),
+            ("eat + respawn", lambda: [foods["7"].update(active=False), foods["7"].update(active=True, x=1.0, y=2.0)],
+                lambda: [store.deactivate("7"), store.activate("7", 1.0, 2.0)]),
+        )
+        assert foods_json(*store.active_fields()) == json.dumps(store.active_foods())
+        for name, dict_fn, store_fn in rows:
+            dict_ms, dict_result = timed(dict_fn)
+            store_ms, store_result = timed(store_fn)
+            print(f"{count:>7} {name:>18} {dict_ms:>9.3f} {store_ms:>9.3f}")
@@ -0,0 +1,187 @@
+"""Lock wait time in the game server: shared locks vs. the scheduler thread as state owner.
+
+CLIENTS receive threads each send `move` messages at MOVE_RATE while the
+20 Hz tick builds and queues snapshots to every connection (send queues
+over a socket that discards frames). Every lock the game code waits on
+is timed.
+
+  locks  the previous design: each receive thread applies its message
+         under the game-state lock, and the tick holds it while it runs
+         (one lock standing in for snake_lock/food_lock/connections_lock,
+         which the tick and the move handler all went through)
+  actor  the current design: receive threads only queue the message with
+         scheduler.call_soon, and the scheduler thread applies it; the one
+         lock left is the scheduler's queue lock
+  flood-fifo  actor, plus one more client sending moves as fast as it can,
+         with every message queued (no merging, no per-connection limit)
+  flood  the same flood with the connection's ClientInbox: a move waiting
+         behind another move replaces it
+
+Columns: lock waits per message on the receive threads, total time they
+spent blocked per second, the tick's longest wait, and how long a message
+took from the receive thread to being applied (for the other clients,
+not the flooding one), and the scheduler queue length at the end of the
+run. Each mode runs in its own subprocess.
+
+    python benchmarks/bench_game_state.py
+"""
+import os
+import subprocess
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+CLIENTS = 50
+SEGMENTS = 30
+MOVE_RATE = 10
+DURATION = 5.0
+MODES = ["locks", "actor", "flood-fifo", "flood"]
+FLOOD_ID = "bench-flood"
+
+class NullSocket:
+    def send(self, payload):
+        pass
+
+    def close(self, *args):
+        pass
+
+class TimedLock:
+    """A lock that records how long each acquire waited, per thread name"""
+
+    def __init__(self, lock):
+        self.lock = lock
+        self.waits = {}
+
+    def acquire(self, blocking=True, timeout=-1):
+        start = time.perf_counter()
+        acquired = self.lock.acquire(blocking, timeout)
+        self.waits.setdefault(threading.current_thread().name, []).append(time.perf_counter() - start)
+        return acquired
+
+    def release(self):
+        self.lock.release()
+
+    __enter__ = acquire
+
+    def __exit__(self, *args):
+        self.release()
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+def measure(mode):
+    import game_websocket as websocket
+
+    lags = []
+    apply_game_message = websocket.apply_game_message
+
+    def timed_apply(conn_id, user, data):
+        apply_game_message(conn_id, user, data)
+        if conn_id != FLOOD_ID:
+            lags.append(time.perf_counter() - data["sent_at"])
+
+    if mode == "locks":
+        state_lock = TimedLock(threading.RLock())
+        run_tick = websocket.run_tick
+
+        def locked_tick():
+            with state_lock:
+                run_tick()
+
+        def receive(conn_id, user, data, inbox):
+            with state_lock:
+                timed_apply(conn_id, user, data)
+
+        websocket.scheduler.call_every(websocket.TICK_INTERVAL, locked_tick)
+        timed = state_lock
+    else:
+        if mode == "flood-fifo":
+            websocket.MERGED_MESSAGES = set()
+            websocket.INBOX_LIMIT = 1 << 30
+        timed = TimedLock(threading.Lock())
+        websocket.scheduler.cond = threading.Condition(timed)
+        websocket.apply_game_message = timed_apply
+        websocket.start_tick_loop()
+        receive = websocket.handle_game_message
+
+    stop = threading.Event()
+    sent = [0] * CLIENTS
+
+    flood_inbox = websocket.create_inbox()
+
+    def client(index):
+        conn_id = f"bench-{index}"
+        user = {"username": conn_id}
+        inbox = websocket.create_inbox()
+        x, y = 400.0 + (index % 10) * 160, 400.0 + (index // 10) * 160
+        receive(conn_id, user, {"messageType": "join", "snake_x": x, "snake_y": y, "snake_color": "#3FA9F5", "sent_at": time.perf_counter()}, inbox)
+        step = 0
+        next_send = time.perf_counter()
+        while not stop.is_set():
+            step += 1
+            head = x + (step % 40) * 3
+            receive(conn_id, user, {
+                "messageType": "move", "snake_x": head, "snake_y": y, "snake_color": "#3FA9F5",
+                "segments": [{"x": head - 24 * k, "y": y} for k in range(SEGMENTS)],
+                "length": SEGMENTS, "score": step, "alive": True, "sent_at": time.perf_counter()
+            }, inbox)
+            sent[index] += 1
+            next_send += 1.0 / MOVE_RATE
+            time.sleep(max(0.0, next_send - time.perf_counter()))
+
+    def flood():
+        user = {"username": FLOOD_ID}
+        segments = [{"x": 400.0 - 24 * k, "y": 300.0} for k in range(SEGMENTS)]
+        step = 0
+        while not stop.is_set():
+            step += 1
+            receive(FLOOD_ID, user, {
+                "messageType": "move", "snake_x": 400.0 + step % 40, "snake_y": 300.0, "snake_color": "#FF0000",
+                "segments": segments, "length": SEGMENTS, "score": 0, "alive": True, "sent_at": time.perf_counter()
+            }, flood_inbox)
+
+    for index in range(CLIENTS):
+        conn_id = f"bench-{index}"
+        client_queue = websocket.create_send_queue(conn_id, NullSocket(), conn_id, websocket.get_codec("json"))
+        if mode == "locks":
+            websocket.register_connection(conn_id, client_queue)
+        else:
+            websocket.open_game_session(conn_id, client_queue)
+
+    threads = [threading.Thread(target=client, args=(index,), name=f"receive-{index}") for index in range(CLIENTS)]
+    if mode.startswith("flood"):
+        threads.append(threading.Thread(target=flood, name="flood"))
+    for thread in threads:
+        thread.start()
+    time.sleep(DURATION)
+    backlog = websocket.scheduler.backlog()
+    stop.set()
+    for thread in threads:
+        thread.join()
+    time.sleep(0.5)
+
+    receive_waits = [wait for name, waits in list(timed.waits.items()) if name.startswith("receive-") for wait in waits]
+    tick_waits = timed.waits.get(websocket.scheduler.name, [])
+    messages = sum(sent)
+    print(f"{mode:>10} {messages / DURATION:>7.0f} {percentile(receive_waits, 0.5) * 1e6:>9.1f} "
+          f"{percentile(receive_waits, 0.99) * 1e6:>9.1f} {max(receive_waits) * 1e3:>8.1f} "
+          f"{sum(receive_waits) / DURATION * 1e3:>12.1f} {max(tick_waits) * 1e3:>12.1f} "
+          f"{percentile(lags, 0.5) * 1e3:>8.2f} {percentile(lags, 0.99) * 1e3:>8.2f} {backlog:>8}")
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        measure(sys.argv[1])
+        sys.exit(0)
+
+    print(f"{CLIENTS} clients, {MOVE_RATE} moves/s each with {SEGMENTS} segments, {DURATION}s")
+    print(f"{'mode':>10} {'msgs/s':>7} {'wait p50':>9} {'wait p99':>9} {'wait max':>8} "
+          f"{'blocked ms/s':>12} {'tick max ms':>12} {'lag p50':>8} {'lag p99':>8} {'backlog':>8}")
+    print(f"{'':>10} {'':>7} {'us':>9} {'us':>9} {'ms':>8} {'':>12} {'':>12} {'ms':>8} {'ms':>8} {'':>8}")
+    sys.stdout.flush()
+    for mode in MODES:
+        subprocess.run([sys.executable, __file__, mode], check=True)
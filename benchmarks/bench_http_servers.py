@@ -0,0 +1,132 @@
+"""HTTP throughput: the Werkzeug dev server (as `python server.py` runs it) vs. gunicorn.
+
+Each mode runs the real app in a subprocess against an in-process mongomock
+user collection. CLIENTS threads then hammer a static file (/app.css) and
+/user/current for DURATION seconds each, one connection per request.
+Gunicorn uses gunicorn.conf.py, with the worker count overridden per mode.
+
+    python benchmarks/bench_http_servers.py
+"""
+import hashlib
+import logging
+import os
+import runpy
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+CLIENTS = 16
+DURATION = 5.0
+USERS = 100
+PATHS = ["/app.css", "/user/current"]
+MODES = ["dev", "gunicorn x1", "gunicorn x2", "gunicorn x4"]
+
+def token_for(i):
+    return f"bench-token-{i}"
+
+def prepare_app():
+    """Point the app at a mongomock collection; runs in every server process"""
+    import mongomock
+    import database as db
+
+    db.user_collection = mongomock.MongoClient()["potato"]["user"]
+    # mongomock has no explain(), so skip the startup query-plan check
+    db.bootstrap_indexes = lambda collection=None: None
+    for i in range(USERS):
+        hashed = hashlib.sha256(token_for(i).encode("utf-8")).hexdigest().encode("utf-8")
+        db.user_collection.insert_one({"id": f"id-{i}", "username": f"bench{i}", "token": hashed})
+
+    import server
+    server.app.logger.disabled = True
+    server.raw_logger.disabled = True
+    logging.getLogger("werkzeug").disabled = True
+    return server
+
+def serve(mode, port):
+    os.chdir(tempfile.mkdtemp())
+    if mode == "dev":
+        server = prepare_app()
+        server.create_app()
+        # Same settings as server.py's __main__, reloader included
+        server.app.run(host="127.0.0.1", port=port, debug=True, threaded=True)
+        return
+
+    from gunicorn.app.base import BaseApplication
+
+    class BenchApplication(BaseApplication):
+        def load_config(self):
+            config = runpy.run_path(os.path.join(os.path.dirname(__file__), "..", "gunicorn.conf.py"))
+            for key, value in config.items():
+                if key in self.cfg.settings:
+                    self.cfg.set(key, value)
+            self.cfg.set("bind", f"127.0.0.1:{port}")
+            self.cfg.set("workers", int(mode.split("x")[1]))
+            self.cfg.set("accesslog", None)
+
+        def load(self):
+            # Loaded in each worker, like wsgi:app without preload
+            return prepare_app().create_app()
+
+    BenchApplication().run()
+
+def wait_for(port):
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/app.css", timeout=1).read()
+            return
+        except Exception:
+            time.sleep(0.2)
+    raise RuntimeError("server did not start")
+
+def hammer(port, path):
+    stop = time.monotonic() + DURATION
+    counts = {"ok": 0, "errors": 0}
+    lock = threading.Lock()
+
+    def worker(i):
+        request = urllib.request.Request(f"http://127.0.0.1:{port}{path}", headers={"Cookie": f"auth_token={token_for(i % USERS)}"})
+        while time.monotonic() < stop:
+            try:
+                urllib.request.urlopen(request, timeout=10).read()
+                key = "ok"
+            except Exception:
+                key = "errors"
+            with lock:
+                counts[key] += 1
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(CLIENTS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return counts["ok"] / DURATION, counts["errors"]
+
+def measure(mode, port):
+    process = subprocess.Popen([sys.executable, __file__, "serve", mode, str(port)], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_for(port)
+        results = [hammer(port, path) for path in PATHS]
+        print(f"{mode:>12}" + "".join(f" {rate:>13.0f} {errors:>7}" for rate, errors in results), flush=True)
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=20)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+
+if __name__ == "__main__":
+    if len(sys.argv) > 3 and sys.argv[1] == "serve":
+        serve(sys.argv[2], int(sys.argv[3]))
+        sys.exit(0)
+
+    print(f"{CLIENTS} client threads, {DURATION:.0f}s per path, new connection per request")
+    print(f"{'mode':>12}" + "".join(f" {path + ' req/s':>13} {'errors':>7}" for path in PATHS))
+    for offset, mode in enumerate(MODES):
+        measure(mode, 18080 + offset)
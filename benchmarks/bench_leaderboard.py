@@ -0,0 +1,87 @@
+"""Leaderboard cost per score change: full sort vs. the incremental Leaderboard.
+
+Replays random score increases (the common case: a snake eats food) for N
+alive snakes and checks after every step that both paths agree on the top
+10. The full-sort path rebuilds the top 10 on every change, like
+generate_leaderboard used to; the incremental path re-ranks one entry and
+only rebuilds the top 10 when it changed.
+
+    python benchmarks/bench_leaderboard.py
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from backend.tools.leaderboard import Leaderboard
+
+SIZES = [100, 1000, 10000]
+UPDATES = 5000
+TOP = 10
+
+def full_sort(scores, names):
+    ranked = [{"id": snake_id, "name": names[snake_id], "score": score} for snake_id, score in scores.items()]
+    ranked.sort(key=lambda x: x["score"], reverse=True)
+    return ranked[:TOP]
+
+def run(size):
+    rng = random.Random(size)
+    names = {f"snake-{i}": f"player{i}" for i in range(size)}
+    scores = {snake_id: rng.randint(0, 50) for snake_id in names}
+    changes = [(f"snake-{rng.randrange(size)}", rng.randint(1, 3)) for _ in range(UPDATES)]
+
+    # Full sort on every change
+    current = dict(scores)
+    start = time.perf_counter()
+    for snake_id, gain in changes:
+        current[snake_id] += gain
+        full_sort(current, names)
+    full_seconds = time.perf_counter() - start
+    expected = full_sort(current, names)
+
+    # Incremental
+    board = Leaderboard(TOP)
+    for snake_id, score in scores.items():
+        board.update(snake_id, names[snake_id], score)
+    current = dict(scores)
+    rebuilds = 0
+    start = time.perf_counter()
+    for snake_id, gain in changes:
+        current[snake_id] += gain
+        if board.update(snake_id, names[snake_id], current[snake_id]):
+            board.top()
+            rebuilds += 1
+    incremental_seconds = time.perf_counter() - start
+
+    assert [e["score"] for e in board.top()] == [e["score"] for e in expected]
+    print(f"{size:>7} {full_seconds / UPDATES * 1e6:>13.1f} {incremental_seconds / UPDATES * 1e6:>13.1f} {rebuilds / UPDATES:>15.1%}")
+
+def check_agreement():
+    # Mixed updates and removals, compared against a full sort every step
+    rng = random.Random(7)
+    board = Leaderboard(TOP)
+    scores = {}
+    names = {}
+    last_top = []
+    for _ in range(20000):
+        snake_id = f"snake-{rng.randrange(200)}"
+        if rng.random() < 0.1:
+            scores.pop(snake_id, None)
+            changed = board.remove(snake_id)
+        else:
+            scores[snake_id] = scores.get(snake_id, 0) + rng.randint(0, 3)
+            names[snake_id] = f"player-{snake_id}"
+            changed = board.update(snake_id, names[snake_id], scores[snake_id])
+        top = board.top()
+        assert [e["score"] for e in top] == [e["score"] for e in full_sort(scores, names)]
+        assert changed or top == last_top
+        last_top = top
+
+if __name__ == "__main__":
+    check_agreement()
+    print(f"{UPDATES} score changes")
+    print(f"{'snakes':>7} {'full us/upd':>13} {'incr us/upd':>13} {'top-10 changed':>15}")
+    for size in SIZES:
+        run(size)
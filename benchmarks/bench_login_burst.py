@@ -0,0 +1,147 @@
+"""Game websocket latency during a burst of 200 logins, inline bcrypt vs. the process pool.
+
+Runs the real Flask app on a local port, with an in-process mongomock
+collection holding BURST users. One game client keeps sending `join` on
+/ws/game and times the leaderboard_update it gets back. After a quiet
+second, BURST clients POST /auth/login at once. Reported per mode: probe
+latency while idle and during the burst, how the logins were answered, and
+the pool's queue-wait / hash-time metrics. Each mode runs in its own
+subprocess.
+
+    python benchmarks/bench_login_burst.py
+"""
+import hashlib
+import json
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+BURST = 200
+PASSWORD = "Burst-pass1!"
+PROBE_INTERVAL = 0.02
+IDLE_SECONDS = 1.0
+
+MODES = {
+    "inline": (0, 10000),
+    "pool, no limit": (2, 10000),
+    "pool, limit 32": (2, 32),
+}
+
+def percentile(samples, fraction):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))] * 1000
+
+def start_server(server_module):
+    from werkzeug.serving import make_server
+    http_server = make_server("127.0.0.1", 0, server_module.app, threaded=True)
+    threading.Thread(target=http_server.serve_forever, daemon=True).start()
+    return http_server.server_port
+
+def setup_users(db, bcrypt):
+    import mongomock
+    db.user_collection = mongomock.MongoClient()["potato"]["user"]
+
+    # Every user shares one hash; checkpw still does the full work per login
+    hashed_password = bcrypt.hashpw(PASSWORD.encode("utf-8"), bcrypt.gensalt())
+    for i in range(BURST):
+        db.user_collection.insert_one({"id": f"id-{i}", "username": f"burst{i}", "password": hashed_password, "token": f"t-{i}".encode()})
+
+    probe_token = "probe-token"
+    db.user_collection.insert_one({
+        "id": "probe", "username": "probe", "password": hashed_password,
+        "token": hashlib.sha256(probe_token.encode("utf-8")).hexdigest().encode("utf-8")
+    })
+    return probe_token
+
+def probe(port, token, stop, samples):
+    import simple_websocket
+    ws = simple_websocket.Client.connect(f"ws://127.0.0.1:{port}/ws/game", headers={"Cookie": f"auth_token={token}"})
+    join = json.dumps({"messageType": "join", "snake_color": "#00FF00", "snake_x": 100, "snake_y": 100})
+    while not stop.is_set():
+        sent = time.perf_counter()
+        ws.send(join)
+        while True:
+            message = ws.receive(timeout=30)
+            if message is None or json.loads(message).get("messageType") == "leaderboard_update":
+                break
+        samples.append((sent, time.perf_counter() - sent))
+        time.sleep(PROBE_INTERVAL)
+    ws.close()
+
+def login(port, i, statuses):
+    body = urllib.parse.urlencode({"username": f"burst{i}", "password": PASSWORD}).encode()
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/auth/login", data=body, timeout=300) as response:
+            statuses.append(response.status)
+    except urllib.error.HTTPError as e:
+        statuses.append(e.code)
+
+def measure(mode):
+    os.chdir(tempfile.mkdtemp())
+    import bcrypt
+    import database as db
+    import server
+    from backend.tools.password_pool import PasswordHasher
+
+    server.app.logger.disabled = True
+    server.raw_logger.disabled = True
+    logging.getLogger("werkzeug").disabled = True
+    workers, max_pending = MODES[mode]
+    server.auth.password_hasher = PasswordHasher(workers=workers, max_pending=max_pending)
+    if workers:
+        # Start the worker processes before measuring
+        server.auth.password_hasher.check_password(b"x", bcrypt.hashpw(b"x", bcrypt.gensalt(4)))
+
+    probe_token = setup_users(db, bcrypt)
+    port = start_server(server)
+
+    stop = threading.Event()
+    samples = []
+    probe_thread = threading.Thread(target=probe, args=(port, probe_token, stop, samples))
+    probe_thread.start()
+    time.sleep(IDLE_SECONDS)
+
+    statuses = []
+    burst_start = time.perf_counter()
+    logins = [threading.Thread(target=login, args=(port, i, statuses)) for i in range(BURST)]
+    for thread in logins:
+        thread.start()
+    for thread in logins:
+        thread.join()
+    burst_end = time.perf_counter()
+
+    stop.set()
+    probe_thread.join()
+
+    idle = [latency for sent, latency in samples if sent < burst_start]
+    during = [latency for sent, latency in samples if burst_start <= sent < burst_end]
+    ok = statuses.count(200)
+    busy = statuses.count(503)
+    metrics = server.auth.password_hasher.metrics()
+    print(f"{mode:>15} {percentile(idle, 0.5):>8.1f} {percentile(during, 0.5):>9.1f} {percentile(during, 0.99):>9.1f} "
+          f"{max(during, default=0) * 1000:>9.1f} {burst_end - burst_start:>8.1f} {ok:>5} {busy:>5} "
+          f"{metrics['queueWait']['p95Ms']:>10.0f} {metrics['hashTime']['avgMs']:>10.0f}")
+    server.auth.password_hasher.shutdown()
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        measure(sys.argv[1])
+        sys.exit(0)
+
+    print(f"{BURST} concurrent logins, probe latency in ms")
+    print(f"{'mode':>15} {'idle p50':>8} {'burst p50':>9} {'burst p99':>9} {'burst max':>9} {'burst s':>8} "
+          f"{'200':>5} {'503':>5} {'wait p95':>10} {'hash avg':>10}")
+    sys.stdout.flush()
+    for mode in MODES:
+        subprocess.run([sys.executable, __file__, mode], check=True)
@@ -0,0 +1,144 @@
+"""Repeat profile loads: rebuilt every time vs. the rendered profile cache vs. 304s.
+
+USERS users with stored stats (in mongomock) each open their profile,
+then reload it LOADS times: GET /user/stats and /user/achievements
+through the Flask test client, with every user already in the session
+cache, as on a real profile page.
+
+  rebuild      profile cache size 0: every load renders the JSON again
+  cached       the body rendered for the user's stats version is reused
+  conditional  the browser sends back the ETag it got; 304, no body
+
+Also checks the ETag rules: a saved game changes it, and flushing that
+game to Mongo does not (the stats version carries across the flush),
+including while the write is still in flight.
+
+    python benchmarks/bench_profile_cache.py
+"""
+import hashlib
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+# server.py writes its request logs to the working directory
+os.chdir(tempfile.mkdtemp())
+
+import mongomock
+
+import database as db
+import server
+
+USERS = 100
+LOADS = 20
+PATHS = ["/user/stats", "/user/achievements"]
+
+def token_for(i):
+    return f"bench-token-{i}"
+
+def setup_users():
+    collection = mongomock.MongoClient()["potato"]["user"]
+    # mongomock 4.3's bulk_write does not accept current pymongo operations
+    collection.bulk_write = lambda operations, ordered=True: [
+        collection.update_one(operation._filter, operation._doc) for operation in operations
+    ]
+    db.user_collection = collection
+    for i in range(USERS):
+        hashed = hashlib.sha256(token_for(i).encode("utf-8")).hexdigest().encode("utf-8")
+        db.user_collection.insert_one({
+            "id": f"id-{i}", "username": f"bench{i}", "token": hashed, "statsVersion": i % 7,
+            "stats": {"highScore": i % 40, "avgSurvivalTime": 31.5 + i, "longestSnake": i % 25,
+                      "totalFood": i * 3, "totalKills": i % 12, "gameCount": i % 7}
+        })
+
+def run(label, cache_size, conditional):
+    db.profile_cache.clear()
+    db.profile_cache.max_size = cache_size
+    db.profile_cache.hits = db.profile_cache.misses = db.profile_cache.evictions = 0
+
+    client = server.app.test_client()
+    sent = 0
+    elapsed = 0.0
+    for i in range(USERS):
+        client.set_cookie("auth_token", token_for(i))
+        etags = {}
+        for load in range(LOADS + 1):
+            for path in PATHS:
+                headers = {"If-None-Match": etags[path]} if conditional and path in etags else {}
+                start = time.perf_counter()
+                response = client.get(path, headers=headers)
+                if load > 0:
+                    # The first load of a profile is the same in every mode
+                    elapsed += time.perf_counter() - start
+                    sent += len(response.get_data())
+                assert response.status_code == (304 if headers else 200), response.status_code
+                etags[path] = response.headers["ETag"]
+
+    loads = USERS * LOADS * len(PATHS)
+    print(f"{label:>12} {loads / elapsed:>9.0f} {elapsed / loads * 1e6:>10.1f} {sent / loads:>12.1f} "
+          f"{db.profile_cache.stats()['hitRate']:>9.2f}")
+
+def check_etags():
+    db.profile_cache.clear()
+    db.profile_cache.max_size = 10000
+    client = server.app.test_client()
+    client.set_cookie("auth_token", token_for(0))
+    before = client.get("/user/stats")
+
+    response = client.post("/user/save-stats", json={"score": 45, "length": 22, "survivalTime": 80, "foodEaten": 9, "kills": 2})
+    assert response.status_code == 200
+    saved = client.get("/user/stats")
+    assert saved.headers["ETag"] != before.headers["ETag"]
+    assert saved.get_json()["highScore"] == 45
+    assert client.get("/user/stats", headers={"If-None-Match": before.headers["ETag"]}).status_code == 200
+
+    # Hold the flush inside bulk_write: the game is no longer pending, not yet stored
+    bulk_write = db.user_collection.bulk_write
+    writing = threading.Event()
+    release = threading.Event()
+
+    def held_bulk_write(operations, ordered=True):
+        writing.set()
+        release.wait()
+        return bulk_write(operations, ordered)
+
+    db.user_collection.bulk_write = held_bulk_write
+    closer = threading.Thread(target=db.stats_buffer.close, daemon=True)
+    closer.start()
+    writing.wait()
+    assert not db.stats_buffer.stats()["pendingUsers"]
+    db.profile_cache.clear()
+    in_flight = client.get("/user/stats")
+    assert in_flight.headers["ETag"] == saved.headers["ETag"]
+    assert in_flight.get_data() == saved.get_data()
+    release.set()
+    closer.join()
+    db.user_collection.bulk_write = bulk_write
+    assert not db.stats_buffer.stats()["flushingUsers"]
+    flushed = client.get("/user/stats", headers={"If-None-Match": saved.headers["ETag"]})
+    assert flushed.status_code == 304, flushed.status_code
+    db.profile_cache.clear()
+    rebuilt = client.get("/user/stats")
+    assert rebuilt.headers["ETag"] == saved.headers["ETag"]
+    assert rebuilt.get_data() == saved.get_data()
+    print("ETag changes on save, unchanged during and after the flush")
+
+if __name__ == "__main__":
+    server.app.logger.disabled = True
+    server.raw_logger.disabled = True
+    setup_users()
+    # Every user is cached, as they would be while logged in
+    client = server.app.test_client()
+    for i in range(USERS):
+        client.set_cookie("auth_token", token_for(i))
+        client.get("/user/current")
+
+    print(f"{USERS} users x {LOADS} reloads of {', '.join(PATHS)}")
+    print(f"{'mode':>12} {'req/s':>9} {'us/request':>10} {'bytes/resp':>12} {'hit rate':>9}")
+    run("rebuild", 0, False)
+    run("cached", 10000, False)
+    run("conditional", 10000, True)
+    check_etags()
@@ -0,0 +1,130 @@
+"""/user/stats latency with synchronous vs. queued request logging.
+
+Each mode runs the real app in a subprocess (werkzeug's threaded server)
+against an in-process mongomock user collection, writing its logs to a
+temporary directory. CLIENTS threads call /user/stats for DURATION seconds.
+
+  sync    the previous pipeline: file and console handlers called on the
+          request thread, a start-of-request line on top of the access line,
+          and raw bodies captured for every request
+  queued  the current pipeline: records go through QueueHandler to one
+          writer thread per log file, bodies sampled at RAW_BODY_SAMPLE_RATE
+
+    python benchmarks/bench_request_logging.py
+"""
+import hashlib
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+CLIENTS = 16
+DURATION = 10.0
+USERS = 100
+MODES = ["sync", "queued"]
+
+def token_for(i):
+    return f"bench-token-{i}"
+
+def serve(mode, port):
+    os.chdir(tempfile.mkdtemp())
+    import mongomock
+    import database as db
+
+    db.user_collection = mongomock.MongoClient()["potato"]["user"]
+    for i in range(USERS):
+        hashed = hashlib.sha256(token_for(i).encode("utf-8")).hexdigest().encode("utf-8")
+        db.user_collection.insert_one({
+            "id": f"id-{i}", "username": f"bench{i}", "token": hashed,
+            "stats": {"highScore": i, "avgSurvivalTime": 0, "longestSnake": 0, "totalFood": 0, "totalKills": 0}
+        })
+
+    import server
+    from flask import request
+    from flask.logging import default_handler
+    from werkzeug.serving import make_server
+    logging.getLogger("werkzeug").disabled = True
+
+    if mode == "sync":
+        # Write on the request thread again, as before the queue
+        server.app.logger.removeHandler(server.app_log_queue)
+        server.app.logger.addHandler(server.handler)
+        server.app.logger.addHandler(default_handler)
+        server.raw_logger.removeHandler(server.raw_log_queue)
+        server.raw_logger.addHandler(server.raw_handler)
+        server.RAW_BODY_SAMPLE_RATE = 1.0
+
+        @server.app.before_request
+        def log_request():
+            server.app.logger.info(f"{request.remote_addr} {request.method} {request.path}")
+
+    http_server = make_server("127.0.0.1", port, server.app, threaded=True)
+    http_server.serve_forever()
+
+def wait_for(port):
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/api/auth/status", timeout=1).read()
+            return
+        except Exception:
+            time.sleep(0.2)
+    raise RuntimeError("server did not start")
+
+def hammer(port):
+    stop = time.monotonic() + DURATION
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+
+    def worker(i):
+        request = urllib.request.Request(f"http://127.0.0.1:{port}/user/stats", headers={"Cookie": f"auth_token={token_for(i % USERS)}"})
+        local = []
+        while time.monotonic() < stop:
+            start = time.perf_counter()
+            try:
+                urllib.request.urlopen(request, timeout=10).read()
+                local.append(time.perf_counter() - start)
+            except Exception:
+                with lock:
+                    errors[0] += 1
+        with lock:
+            latencies.extend(local)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(CLIENTS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return sorted(latencies), errors[0]
+
+def measure(mode, port):
+    # stderr is where the console handler writes, so keep it a real pipe
+    process = subprocess.Popen([sys.executable, __file__, "serve", mode, str(port)], stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    drain = threading.Thread(target=process.stderr.read, daemon=True)
+    drain.start()
+    try:
+        wait_for(port)
+        latencies, errors = hammer(port)
+        count = len(latencies)
+        print(f"{mode:>7} {count / DURATION:>7.0f} {latencies[count // 2] * 1000:>8.2f} "
+              f"{latencies[int(count * 0.99)] * 1000:>8.2f} {latencies[-1] * 1000:>8.2f} {errors:>7}", flush=True)
+    finally:
+        process.terminate()
+        process.wait()
+
+if __name__ == "__main__":
+    if len(sys.argv) > 3 and sys.argv[1] == "serve":
+        serve(sys.argv[2], int(sys.argv[3]))
+        sys.exit(0)
+
+    print(f"{CLIENTS} client threads on /user/stats for {DURATION:.0f}s, new connection per request")
+    print(f"{'mode':>7} {'req/s':>7} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8} {'errors':>7}")
+    for offset, mode in enumerate(MODES):
+        measure(mode, 18180 + offset)
@@ -0,0 +1,108 @@
+"""Thread count and memory: a threading.Timer per job vs. the shared Scheduler.
+
+Simulates 500 connected clients with the game's periodic and deferred jobs,
+with time compressed 100x: per-client heartbeats, food respawns after every
+eaten food, the leaderboard refresh, food spawning and heartbeat checks.
+Each mode runs in its own subprocess so the numbers don't mix.
+
+    python benchmarks/bench_scheduler.py
+"""
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from backend.tools.scheduler import Scheduler
+
+CLIENTS = 500
+TIME_SCALE = 100
+HEARTBEAT_INTERVAL = 10 / TIME_SCALE
+FOOD_RESPAWN_DELAY = 1.0 / TIME_SCALE
+PERIODIC_INTERVAL = 5.0 / TIME_SCALE
+# Each client eats about two foods per second of game time
+FOODS_EATEN_PER_SECOND = CLIENTS * 2 * TIME_SCALE
+DURATION = 3.0
+
+def rss_kb():
+    with open("/proc/self/status") as status:
+        for line in status:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])
+    return 0
+
+def noop(*args):
+    pass
+
+def run_timers(stop):
+    def heartbeat():
+        if not stop.is_set():
+            timer = threading.Timer(HEARTBEAT_INTERVAL, heartbeat)
+            timer.daemon = True
+            timer.start()
+
+    def periodic():
+        if not stop.is_set():
+            timer = threading.Timer(PERIODIC_INTERVAL, periodic)
+            timer.daemon = True
+            timer.start()
+
+    for _ in range(CLIENTS):
+        threading.Timer(random.uniform(0, HEARTBEAT_INTERVAL), heartbeat).start()
+    for _ in range(3):
+        threading.Timer(PERIODIC_INTERVAL, periodic).start()
+
+    def eat_food():
+        timer = threading.Timer(FOOD_RESPAWN_DELAY, noop)
+        timer.daemon = True
+        timer.start()
+    return eat_food
+
+def run_scheduler(stop):
+    scheduler = Scheduler()
+    for client in range(CLIENTS):
+        scheduler.call_every(HEARTBEAT_INTERVAL, noop, client, first_delay=random.uniform(0, HEARTBEAT_INTERVAL))
+    for _ in range(3):
+        scheduler.call_every(PERIODIC_INTERVAL, noop)
+
+    def eat_food():
+        scheduler.call_later(FOOD_RESPAWN_DELAY, noop)
+    return eat_food
+
+def measure(mode):
+    random.seed(312)
+    baseline_rss = rss_kb()
+    stop = threading.Event()
+    eat_food = run_timers(stop) if mode == "timer" else run_scheduler(stop)
+
+    peak_threads = 0
+    peak_rss = 0
+    eaten = 0
+    start = time.monotonic()
+    while time.monotonic() - start < DURATION:
+        # Eat foods in small batches at the target rate
+        due = int((time.monotonic() - start) * FOODS_EATEN_PER_SECOND)
+        while eaten < due:
+            eat_food()
+            eaten += 1
+        peak_threads = max(peak_threads, threading.active_count())
+        peak_rss = max(peak_rss, rss_kb())
+        time.sleep(0.001)
+
+    stop.set()
+    achieved = eaten / DURATION / TIME_SCALE
+    print(f"{mode:>9} {peak_threads:>12} {(peak_rss - baseline_rss) / 1024:>14.1f} {achieved:>15.0f}")
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        measure(sys.argv[1])
+        sys.exit(0)
+
+    print(f"{CLIENTS} clients, time compressed {TIME_SCALE}x, {DURATION}s")
+    print(f"{'mode':>9} {'peak threads':>12} {'peak +RSS MiB':>14} {'foods/game-s':>15}")
+    sys.stdout.flush()
+    for mode in ("timer", "scheduler"):
+        subprocess.run([sys.executable, __file__, mode], check=True)
@@ -0,0 +1,77 @@
+"""Requests per second for authenticated endpoints, with and without the session cache.
+
+Creates USERS users, then replays GET /user/current and /user/stats for
+random users through the Flask test client. "no cache" sets the cache size
+to 0 so every request goes to Mongo once (in attach_username_to_g). Needs
+a local mongod, like database.py; pass --mongomock to run against an
+in-process mongomock collection instead (no network round trip, so the
+gap is smaller than against a real server).
+
+    python benchmarks/bench_session_cache.py [--mongomock]
+"""
+import hashlib
+import os
+import random
+import sys
+import tempfile
+import time
+import uuid
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+# server.py writes its request logs to the working directory
+os.chdir(tempfile.mkdtemp())
+
+import database as db
+import server
+
+USERS = 200
+REQUESTS = 5000
+PATHS = ["/user/current", "/user/stats"]
+
+def setup_users():
+    if "--mongomock" in sys.argv:
+        import mongomock
+        db.user_collection = mongomock.MongoClient()["potato"]["user"]
+    else:
+        db.user_collection = db.db["bench_session_cache"]
+        db.user_collection.drop()
+
+    tokens = []
+    for i in range(USERS):
+        token = str(uuid.uuid4())
+        hashed = hashlib.sha256(token.encode("utf-8")).hexdigest().encode("utf-8")
+        db.user_collection.insert_one({"id": str(uuid.uuid4()), "username": f"bench{i}", "token": hashed})
+        tokens.append(token)
+    return tokens
+
+def run(label, tokens, cache_size):
+    db.session_cache.clear()
+    db.session_cache.max_size = cache_size
+    db.session_cache.hits = db.session_cache.misses = db.session_cache.evictions = 0
+
+    client = server.app.test_client()
+    rng = random.Random(1)
+    start = time.perf_counter()
+    for _ in range(REQUESTS):
+        client.set_cookie("auth_token", rng.choice(tokens))
+        response = client.get(rng.choice(PATHS))
+        assert response.status_code == 200, response.status_code
+    elapsed = time.perf_counter() - start
+
+    stats = db.session_cache.stats()
+    print(f"{label:>9} {REQUESTS / elapsed:>10.0f} {stats['hitRate']:>9.1%}")
+
+if __name__ == "__main__":
+    # Only measure request handling, not the file log handlers
+    server.app.logger.disabled = True
+    server.raw_logger.disabled = True
+
+    tokens = setup_users()
+    print(f"{USERS} users, {REQUESTS} requests")
+    print(f"{'mode':>9} {'req/s':>10} {'hit rate':>9}")
+    run("no cache", tokens, 0)
+    run("cache", tokens, 10000)
+
+    if "--mongomock" not in sys.argv:
+        db.user_collection.drop()
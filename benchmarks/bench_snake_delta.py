@@ -0,0 +1,85 @@
+"""Bytes per tick of a world_snapshot entry: full snake vs. delta frame.
+
+Replays a snake moving the way the game client moves one (head overwritten
+every frame, a new segment pushed every segmentSpacing px, tail trimmed to
+the target length) and measures the encoded size of each tick's entry.
+
+    python benchmarks/bench_snake_delta.py
+"""
+import json
+import math
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from backend.tools.snake_delta import apply_segments_delta, build_snake_delta
+
+TICK_RATE = 20
+FRAMES_PER_TICK = 3
+SPEED = 3
+SEGMENT_SPACING = 24
+KEYFRAME_INTERVAL = 3.0
+TICKS = 400
+
+def simulate(length):
+    segments = [{"x": 1200.0, "y": 800.0}]
+    last_pos = segments[0]
+    angle = 0.0
+    while True:
+        for _ in range(FRAMES_PER_TICK):
+            angle += random.uniform(-0.15, 0.15)
+            head = segments[0]
+            new_head = {"x": head["x"] + math.cos(angle) * SPEED, "y": head["y"] + math.sin(angle) * SPEED}
+            if math.hypot(new_head["x"] - last_pos["x"], new_head["y"] - last_pos["y"]) >= SEGMENT_SPACING:
+                segments.insert(0, new_head)
+                last_pos = new_head
+            else:
+                segments[0] = new_head
+            del segments[length:]
+        yield {
+            "id": "snake",
+            "x": segments[0]["x"],
+            "y": segments[0]["y"],
+            "color": "#3FA9F5",
+            "username": "benchmark_player",
+            "segments": list(segments),
+            "length": length,
+            "score": length * 5,
+            "alive": True
+        }
+
+def measure(length):
+    states = simulate(length)
+    # Grow the snake to its full length before measuring
+    for _ in range(length * SEGMENT_SPACING // (SPEED * FRAMES_PER_TICK) + 1):
+        snake = next(states)
+
+    keyframe_ticks = int(KEYFRAME_INTERVAL * TICK_RATE)
+    client_segments = snake["segments"]
+    full_bytes = 0
+    delta_bytes = 0
+    for tick in range(TICKS):
+        previous = snake
+        snake = next(states)
+        full_bytes += len(json.dumps(snake))
+
+        delta = None if tick % keyframe_ticks == 0 else build_snake_delta(snake, previous["segments"])
+        if delta is None:
+            delta_bytes += len(json.dumps(snake))
+            client_segments = snake["segments"]
+        else:
+            delta_bytes += len(json.dumps(delta))
+            client_segments = apply_segments_delta(client_segments, {"x": delta["x"], "y": delta["y"]}, delta["added"], delta["trimmed"])
+        assert client_segments == snake["segments"]
+
+    return full_bytes / TICKS, delta_bytes / TICKS
+
+if __name__ == "__main__":
+    random.seed(312)
+    print(f"{TICK_RATE} Hz ticks, keyframe every {KEYFRAME_INTERVAL}s, {TICKS} ticks")
+    print(f"{'segments':>9} {'full B/tick':>12} {'delta B/tick':>13} {'ratio':>7}")
+    for length in (10, 100, 500):
+        full, delta = measure(length)
+        print(f"{length:>9} {full:>12.0f} {delta:>13.0f} {full / delta:>6.1f}x")
@@ -0,0 +1,80 @@
+"""Server cost per player: client-reported `move` bodies vs. server-simulated snakes.
+
+For each snake length, times the receive path (binary frame decode plus
+apply_game_message) for one `move` carrying the full body and for one
+`input` (heading, boost), and the tick's advance_snakes() step per
+simulated snake, which moves the ring-buffer body and slices out the
+segment list that snapshots carry. Frame sizes are the upstream bytes
+per message.
+
+    python benchmarks/bench_snake_input.py
+"""
+import math
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import game_websocket as websocket
+from backend.tools.game_codec import get_codec
+from backend.tools.snake_body import SnakeBody
+
+LENGTHS = [10, 100, 500]
+MESSAGES = 5000
+TICKS = 2000
+USER = {"username": "bench"}
+
+def move_frame(codec, length):
+    segments = [{"x": 1200.0 - 24 * k, "y": 800.0} for k in range(length)]
+    return codec.encode({
+        "messageType": "move", "snake_x": 1200.0, "snake_y": 800.0, "snake_color": "#3FA9F5",
+        "segments": segments, "length": length, "score": length * 5, "alive": True
+    })
+
+def time_receive(codec, frame):
+    start = time.perf_counter()
+    for _ in range(MESSAGES):
+        websocket.apply_game_message("bench", USER, codec.decode(frame))
+    return (time.perf_counter() - start) / MESSAGES
+
+def time_advance(length):
+    """Seconds per simulated snake per tick once the body has reached `length`"""
+    snake = websocket.snake_positions["bench"]
+    snake.x, snake.y, snake.length, snake.alive = 1200.0, 800.0, length, True
+    websocket.snake_bodies["bench"] = SnakeBody(1200.0, 800.0)
+    # Circle so the snake stays in the world while it grows
+    heading = 0.0
+    for _ in range(length * 3):
+        heading += 0.02
+        websocket.snake_inputs["bench"] = (heading, False)
+        websocket.last_advance = time.monotonic() - websocket.TICK_INTERVAL * 3
+        websocket.advance_snakes()
+
+    start = time.perf_counter()
+    for _ in range(TICKS):
+        heading += 0.02
+        websocket.snake_inputs["bench"] = (heading, False)
+        websocket.advance_snakes()
+    elapsed = (time.perf_counter() - start) / TICKS
+    assert len(websocket.snake_positions["bench"].segments) == length
+    return elapsed
+
+if __name__ == "__main__":
+    codec = get_codec("binary")
+    websocket.apply_game_message("bench", USER, {"messageType": "join", "snake_x": 1200.0, "snake_y": 800.0, "snake_color": "#3FA9F5"})
+    input_frame = codec.encode({"messageType": "input", "heading": 1.0, "boost": False})
+
+    print(f"{'length':>6} {'move bytes':>10} {'move us':>8} {'input bytes':>11} {'input us':>8} {'tick us/snake':>13}")
+    for length in LENGTHS:
+        # Client-reported: a plain snake receiving moves
+        websocket.snake_bodies.pop("bench", None)
+        frame = move_frame(codec, length)
+        move_seconds = time_receive(codec, frame)
+
+        # Server-simulated: inputs, then the tick's share
+        input_seconds = None
+        advance_seconds = time_advance(length)
+        input_seconds = time_receive(codec, input_frame)
+        print(f"{length:>6} {len(frame):>10} {move_seconds * 1e6:>8.1f} {len(input_frame):>11} "
+              f"{input_seconds * 1e6:>8.1f} {advance_seconds * 1e6:>13.1f}")
@@ -0,0 +1,140 @@
+"""Memory and per-move allocation: dict records vs. Snake records and FoodStore.
+
+  snakes  1,000 snakes as the per-snake dicts move used to build vs. Snake
+          records (__slots__). Segment lists are built beforehand and shared
+          by both, so only the record itself is counted.
+  foods   50,000 foods as a dict per food vs. FoodStore's arrays, id map and
+          grid cell buckets
+  move    one `move` applied to a snake that already exists: the previous
+          handler built a new dict and dropped the old one, the current one
+          overwrites the Snake in place. Peak bytes is the most memory the
+          call held above what it started with; the snapshot view is built
+          once per tick either way (a copy then, to_dict now), so it is not
+          part of the move.
+
+    python benchmarks/bench_snake_records.py
+"""
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import game_websocket as websocket
+from backend.tools.food_store import FoodStore, random_colors
+from backend.tools.snake_record import Snake
+
+SNAKES = 1000
+FOODS = 50000
+SEGMENTS = 30
+MOVES = 20000
+USER = {"username": "bench"}
+
+def traced_bytes(build):
+    """Bytes still allocated by what build() returns"""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    kept = build()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del kept
+    return after - before
+
+def snake_dicts(segment_lists):
+    return {
+        str(i): {
+            "id": str(i), "x": 100.0 + i, "y": 200.0, "color": "#3FA9F5", "username": f"player{i}",
+            "segments": segment_lists[i], "length": SEGMENTS, "score": i, "alive": True
+        }
+        for i in range(SNAKES)
+    }
+
+def snake_records(segment_lists):
+    return {
+        str(i): Snake(str(i), 100.0 + i, 200.0, "#3FA9F5", f"player{i}", segment_lists[i], SEGMENTS, i, True)
+        for i in range(SNAKES)
+    }
+
+def food_dicts():
+    return {
+        str(i): {"id": str(i), "x": random.uniform(40, 2360), "y": random.uniform(40, 1560), "color": "#3FA9F5", "active": True}
+        for i in range(FOODS)
+    }
+
+def food_store():
+    rng = np.random.default_rng(7)
+    store = FoodStore()
+    store.add_many(rng.uniform(40, 2360, FOODS), rng.uniform(40, 1560, FOODS), random_colors(rng, FOODS))
+    return store
+
+def dict_move(conn_id, user, data):
+    # The previous move handler: a new dict per message
+    username = data.get("username", user.get("username", "Anonymous"))
+    snake_positions[conn_id] = {
+        "id": conn_id,
+        "x": data.get("snake_x", 0),
+        "y": data.get("snake_y", 0),
+        "color": data.get("snake_color"),
+        "username": username,
+        "segments": data.get("segments", []),
+        "length": data.get("length", 1),
+        "score": data.get("score", 0),
+        "alive": data.get("alive", True)
+    }
+    websocket.snake_grid.update(conn_id, data.get("snake_x", 0), data.get("snake_y", 0))
+    websocket.dirty_snakes.add(conn_id)
+    snake_info = snake_positions[conn_id]
+    websocket.leaderboard.update(conn_id, snake_info.get("username", "Anonymous"), snake_info.get("score", 0))
+
+snake_positions = {}
+
+def measure_moves(apply):
+    messages = []
+    for step in range(MOVES):
+        head = 400.0 + step % 100
+        messages.append({
+            "messageType": "move", "snake_x": head, "snake_y": 400.0, "snake_color": "#3FA9F5",
+            "segments": [{"x": head - 24 * k, "y": 400.0} for k in range(SEGMENTS)],
+            "length": SEGMENTS, "score": step // 10, "alive": True
+        })
+    apply("bench", USER, messages[0])
+    apply("bench", USER, messages[1])
+
+    tracemalloc.start()
+    peaks = []
+    for data in messages[2:1002]:
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        apply("bench", USER, data)
+        peaks.append(tracemalloc.get_traced_memory()[1] - before)
+    tracemalloc.stop()
+
+    start = time.perf_counter()
+    for data in messages[2:]:
+        apply("bench", USER, data)
+    elapsed = (time.perf_counter() - start) / (MOVES - 2)
+    return sum(peaks) / len(peaks), elapsed
+
+if __name__ == "__main__":
+    random.seed(7)
+    segment_lists = [[{"x": 100.0 - 24 * k, "y": 200.0} for k in range(SEGMENTS)] for _ in range(SNAKES)]
+
+    print(f"{'records':>24} {'KiB':>9} {'bytes each':>11}")
+    for label, count, build in (
+        (f"{SNAKES} snake dicts", SNAKES, lambda: snake_dicts(segment_lists)),
+        (f"{SNAKES} Snake", SNAKES, lambda: snake_records(segment_lists)),
+        (f"{FOODS} food dicts", FOODS, food_dicts),
+        (f"{FOODS} FoodStore", FOODS, food_store),
+    ):
+        size = traced_bytes(build)
+        print(f"{label:>24} {size / 1024:>9.1f} {size / count:>11.1f}")
+
+    print()
+    print(f"{'move':>24} {'peak bytes':>11} {'us/move':>8}")
+    for label, apply in (("new dict", dict_move), ("Snake in place", websocket.apply_game_message)):
+        peak, elapsed = measure_moves(apply)
+        print(f"{label:>24} {peak:>11.0f} {elapsed * 1e6:>8.2f}")
@@ -0,0 +1,72 @@
+"""Fan-out cost of broadcast_to_nearby: linear scan vs. SpatialGrid.
+
+Simulates one full tick in which every snake moves once and looks up the
+clients within NEARBY_RADIUS of its head.
+
+    python benchmarks/bench_spatial_grid.py
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from backend.tools.spatial_grid import SpatialGrid
+
+WORLD_WIDTH = 2400
+WORLD_HEIGHT = 1600
+NEARBY_RADIUS = 1200
+GRID_CELL_SIZE = 400
+TICKS = 20
+
+def linear_scan(snake_positions, sender_pos, radius, exclude_id):
+    # The pre-grid implementation of broadcast_to_nearby
+    nearby_clients = []
+    for client_id, snake in snake_positions.items():
+        if client_id != exclude_id:
+            dx = sender_pos["x"] - snake["x"]
+            dy = sender_pos["y"] - snake["y"]
+            dist = (dx**2 + dy**2)**0.5
+            if dist <= radius:
+                nearby_clients.append(client_id)
+    return nearby_clients
+
+def random_ticks(count):
+    return [
+        [(str(i), random.uniform(0, WORLD_WIDTH), random.uniform(0, WORLD_HEIGHT)) for i in range(count)]
+        for _ in range(TICKS)
+    ]
+
+def run_linear(ticks, radius):
+    snake_positions = {}
+    fanout = 0
+    start = time.perf_counter()
+    for moves in ticks:
+        for snake_id, x, y in moves:
+            snake_positions[snake_id] = {"id": snake_id, "x": x, "y": y}
+            fanout += len(linear_scan(snake_positions, {"x": x, "y": y}, radius, snake_id))
+    return time.perf_counter() - start, fanout
+
+def run_grid(ticks, radius):
+    grid = SpatialGrid(GRID_CELL_SIZE)
+    fanout = 0
+    start = time.perf_counter()
+    for moves in ticks:
+        for snake_id, x, y in moves:
+            grid.update(snake_id, x, y)
+            fanout += len(grid.query_radius(x, y, radius, snake_id))
+    return time.perf_counter() - start, fanout
+
+if __name__ == "__main__":
+    random.seed(312)
+    for radius in (NEARBY_RADIUS, 600):
+        print(f"radius={radius}px, {TICKS} ticks")
+        print(f"{'snakes':>8} {'linear ms/tick':>15} {'grid ms/tick':>13} {'speedup':>8} {'avg fan-out':>12}")
+        for count in (50, 200, 1000):
+            ticks = random_ticks(count)
+            linear_time, fanout = run_linear(ticks, radius)
+            grid_time, _ = run_grid(ticks, radius)
+            print(f"{count:>8} {linear_time / TICKS * 1000:>15.2f} {grid_time / TICKS * 1000:>13.2f} "
+                  f"{linear_time / grid_time:>7.1f}x {fanout / (TICKS * count):>12.1f}")
+        print()
@@ -0,0 +1,195 @@
+"""Static bundle: send_from_directory per request vs. the precompressed static manifest.
+
+Serves a frontend/dist tree with the real app, first as before (manifest
+not built, so every file goes through os.path checks and
+send_from_directory), then after static_assets.build(). A browser-like
+client loads the page twice over one keep-alive connection: a cold visit
+with an empty cache, then a warm visit that revalidates with If-None-Match
+and skips anything marked immutable.
+
+Time to first paint is modelled for a single-page app: one round trip for
+index.html, then one for the CSS and entry script fetched in parallel,
+each adding transfer time at the profile's bandwidth, plus the measured
+local server and decompression time. Without --dist a stand-in bundle is
+assembled from the app's own sources (no React), so absolute sizes are
+small; the ratios are what matter.
+
+    python benchmarks/bench_static_assets.py [--dist frontend/dist]
+"""
+import gzip
+import hashlib
+import http.client
+import logging
+import os
+import re
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+import brotli
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+REPEATS = 50
+# name, bandwidth in bytes/s, round trip in seconds
+PROFILES = [("slow 4G", 1_600_000 / 8, 0.150), ("broadband", 20_000_000 / 8, 0.020)]
+ACCEPT_ENCODING = "gzip, deflate, br"
+
+def stand_in_bundle(dist):
+    """A Vite-shaped dist/: index.html, hashed JS and CSS, and the public files"""
+    frontend = os.path.join(os.path.dirname(__file__), "..", "frontend")
+    sources = []
+    for directory, _, files in os.walk(os.path.join(frontend, "app")):
+        for name in sorted(files):
+            with open(os.path.join(directory, name), "rb") as file:
+                sources.append((name, file.read()))
+
+    script = b"\n".join(body for name, body in sources if name.endswith((".ts", ".tsx")))
+    style = b"\n".join(body for name, body in sources if name.endswith(".css"))
+    os.makedirs(os.path.join(dist, "assets"))
+    names = {}
+    for extension, body in (("js", script), ("css", style)):
+        names[extension] = f"assets/index-{hashlib.sha256(body).hexdigest()[:8]}.{extension}"
+        with open(os.path.join(dist, names[extension]), "wb") as file:
+            file.write(body)
+
+    with open(os.path.join(dist, "index.html"), "w") as file:
+        file.write(
+            '<!DOCTYPE html>\n<html lang="en">\n  <head>\n    <meta charset="UTF-8" />\n'
+            '    <title>Wiggle Wars</title>\n'
+            f'    <script type="module" crossorigin src="/{names["js"]}"></script>\n'
+            f'    <link rel="stylesheet" crossorigin href="/{names["css"]}">\n'
+            '  </head>\n  <body>\n    <div id="root"></div>\n  </body>\n</html>\n'
+        )
+    shutil.copytree(os.path.join(frontend, "public"), dist, dirs_exist_ok=True)
+
+def decode(encoding, body):
+    if encoding == "br":
+        return brotli.decompress(body)
+    if encoding == "gzip":
+        return gzip.decompress(body)
+    return body
+
+class Browser:
+    """One keep-alive connection and an HTTP cache keyed by path"""
+
+    def __init__(self, port):
+        self.connection = http.client.HTTPConnection("127.0.0.1", port)
+        self.cache = {}
+
+    def get(self, path):
+        """(wire bytes, seconds, body); cache hits on immutable entries cost nothing"""
+        cached = self.cache.get(path)
+        if cached and "immutable" in cached["cache_control"]:
+            return 0, 0.0, cached["body"]
+
+        headers = {"Accept-Encoding": ACCEPT_ENCODING}
+        if cached and cached["etag"]:
+            headers["If-None-Match"] = cached["etag"]
+
+        start = time.perf_counter()
+        self.connection.request("GET", path, headers=headers)
+        response = self.connection.getresponse()
+        raw = response.read()
+        wire = len(raw) + sum(len(k) + len(v) + 4 for k, v in response.getheaders()) + 17
+        if response.status == 304:
+            body = cached["body"]
+        else:
+            body = decode(response.getheader("Content-Encoding", "identity"), raw)
+            self.cache[path] = {
+                "etag": response.getheader("ETag"),
+                "cache_control": response.getheader("Cache-Control", ""),
+                "body": body
+            }
+        return wire, time.perf_counter() - start, body
+
+def visit(browser):
+    """Load index.html, then its CSS and entry script; returns (requests sent, [(wire bytes, seconds)] per round)"""
+    wire, seconds, html = browser.get("/")
+    rounds = [(wire, seconds)]
+    critical = re.findall(rb'(?:src|href)="(/assets/[^"]+)"', html)
+    round_wire = round_seconds = 0
+    requests = 1
+    for path in critical:
+        wire, seconds, _ = browser.get(path.decode())
+        round_wire += wire
+        round_seconds = max(round_seconds, seconds)
+        requests += 1 if wire else 0
+    rounds.append((round_wire, round_seconds))
+    return requests, rounds
+
+def first_paint(rounds, bandwidth, rtt):
+    return sum((rtt if wire else 0.0) + wire / bandwidth + seconds for wire, seconds in rounds)
+
+def check_bodies(port, dist):
+    """Every manifest file decodes back to the file on disk, for each encoding"""
+    connection = http.client.HTTPConnection("127.0.0.1", port)
+    for directory, _, files in os.walk(dist):
+        for name in files:
+            if name.endswith((".br", ".gz")):
+                continue
+            path = os.path.relpath(os.path.join(directory, name), dist).replace(os.sep, "/")
+            with open(os.path.join(dist, path), "rb") as file:
+                expected = file.read()
+            for encoding in ("br", "gzip", "identity"):
+                connection.request("GET", "/" + path, headers={"Accept-Encoding": encoding})
+                response = connection.getresponse()
+                body = decode(response.getheader("Content-Encoding", "identity"), response.read())
+                assert body == expected, (path, encoding)
+
+def measure(mode, port):
+    for visit_name in ("cold", "warm"):
+        samples = []
+        for _ in range(REPEATS):
+            browser = Browser(port)
+            if visit_name == "warm":
+                visit(browser)
+            samples.append(visit(browser))
+        requests, rounds = samples[0]
+        # Median local time per round, wire bytes are the same every repeat
+        local = [sorted(sample[1][i][1] for sample in samples)[REPEATS // 2] for i in range(len(rounds))]
+        rounds = [(wire, seconds) for (wire, _), seconds in zip(rounds, local)]
+        wire = sum(wire for wire, _ in rounds)
+        paints = "".join(f" {first_paint(rounds, bandwidth, rtt) * 1000:>12.0f}" for _, bandwidth, rtt in PROFILES)
+        print(f"{mode:>7} {visit_name:>5} {requests:>9} {wire:>11} {sum(local) * 1000:>9.2f}{paints}", flush=True)
+
+if __name__ == "__main__":
+    dist = os.path.abspath(sys.argv[sys.argv.index("--dist") + 1]) if "--dist" in sys.argv else None
+    work = tempfile.mkdtemp()
+    bundle = os.path.join(work, "dist")
+    if dist:
+        shutil.copytree(dist, bundle)
+    else:
+        stand_in_bundle(bundle)
+    # Keeps the request logs out of the repository
+    os.chdir(work)
+
+    import server
+    from werkzeug.serving import make_server
+    server.app.static_folder = bundle
+    server.static_assets.root = bundle
+    server.app.logger.disabled = True
+    server.raw_logger.disabled = True
+    logging.getLogger("werkzeug").disabled = True
+
+    http_server = make_server("127.0.0.1", 0, server.app, threaded=True)
+    threading.Thread(target=http_server.serve_forever, daemon=True).start()
+    port = http_server.server_port
+
+    print(f"bundle: {bundle}, median of {REPEATS} page loads")
+    print(f"{'mode':>7} {'visit':>5} {'requests':>9} {'wire bytes':>11} {'local ms':>9}"
+          + "".join(f" {name + ' ms':>12}" for name, _, _ in PROFILES))
+    measure("before", port)
+
+    start = time.perf_counter()
+    server.static_assets.build()
+    build_seconds = time.perf_counter() - start
+    check_bodies(port, server.app.static_folder)
+    measure("after", port)
+
+    stats = server.static_assets.stats()
+    print(f"manifest: {stats['files']} files, {stats['bytes']} bytes, br {stats['compressedBytes']['br']}, "
+          f"gzip {stats['compressedBytes']['gzip']}, built in {build_seconds * 1000:.0f} ms")
+    http_server.shutdown()
@@ -0,0 +1,103 @@
+"""SAVES saves of one user at once: read-then-write vs. the stats_update pipeline.
+
+The user lives in mongomock behind RoundTrips: every Mongo call first sleeps
+RTT_MS, standing in for the network round trip, then runs under one lock.
+
+  read-write  find_one the stored stats, apply_delta in Python, $set them
+              back: two round trips, and saves that overlap overwrite each
+              other's games
+  pipeline    one update_one with stats_update(game_delta(...)), no read
+  buffers     BUFFERS StatsBuffers, as in that many server processes, each
+              given an equal share of the saves and flushing every
+              FLUSH_DELAY seconds; their flushes of the user overlap
+
+Reports save latency, Mongo calls and games lost. The pipeline and the
+buffers must end with the stats of saving the games one at a time.
+
+    python benchmarks/bench_stats_atomic.py
+"""
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import mongomock
+
+from backend.tools.stats_buffer import StatsBuffer, apply_delta, game_delta, stats_update
+from round_trips import RoundTrips
+
+SAVES = 100
+BUFFERS = 4
+FLUSH_DELAY = 0.002
+RTT_MS = 1.0
+TOKEN = b"bench-token"
+
+def game_for(i):
+    return game_delta((i * 7) % 50, i % 30 + 1, 10 + (i * 13) % 90, i % 11, i % 3)
+
+def read_write_save(collection, delta):
+    stored = collection.find_one({"token": TOKEN}, {"stats": 1}).get("stats", {})
+    collection.update_one({"token": TOKEN}, {"$set": {"stats": apply_delta(stored, delta)}})
+
+def pipeline_save(collection, delta):
+    collection.update_one({"token": TOKEN}, stats_update(delta))
+
+def run_saves(save):
+    """Every save on its own thread, released together; returns sorted latencies"""
+    latencies = []
+    lock = threading.Lock()
+    start_line = threading.Barrier(SAVES)
+
+    def worker(i):
+        start_line.wait()
+        start = time.perf_counter()
+        save(i)
+        elapsed = time.perf_counter() - start
+        with lock:
+            latencies.append(elapsed)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(SAVES)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return sorted(latencies)
+
+def measure(mode):
+    collection = RoundTrips(mongomock.MongoClient()["potato"]["user"], RTT_MS)
+    collection.collection.insert_one({"id": "id-0", "username": "bench", "token": TOKEN})
+
+    if mode == "read-write":
+        latencies = run_saves(lambda i: read_write_save(collection, game_for(i)))
+    elif mode == "pipeline":
+        latencies = run_saves(lambda i: pipeline_save(collection, game_for(i)))
+    else:
+        buffers = [StatsBuffer(lambda: collection, max_delay=FLUSH_DELAY) for _ in range(BUFFERS)]
+        latencies = run_saves(lambda i: buffers[i % BUFFERS].add("id-0", game_for(i), TOKEN))
+        for buffer in buffers:
+            while buffer.stats()["pendingUsers"] or buffer.stats()["flushingUsers"]:
+                time.sleep(0.001)
+            buffer.close()
+
+    stats = collection.collection.find_one({"token": TOKEN})["stats"]
+    print(f"{mode:>10} {latencies[len(latencies) // 2] * 1000:>8.2f} {latencies[int(len(latencies) * 0.99)] * 1000:>8.2f} "
+          f"{collection.calls:>11} {stats['gameCount']:>6} {SAVES - stats['gameCount']:>5}")
+    return stats
+
+if __name__ == "__main__":
+    expected = {}
+    for i in range(SAVES):
+        expected = apply_delta(expected, game_for(i))
+
+    print(f"{SAVES} parallel saves of one user, {RTT_MS} ms per Mongo call")
+    print(f"{'mode':>10} {'p50 ms':>8} {'p99 ms':>8} {'mongo calls':>11} {'games':>6} {'lost':>5}")
+    for mode in ("read-write", "pipeline", "buffers"):
+        stats = measure(mode)
+        if mode == "read-write":
+            continue
+        # Saves land in any order, so the average is summed in a different order
+        assert abs(stats.pop("avgSurvivalTime") - expected["avgSurvivalTime"]) < 1e-9, mode
+        assert stats == {key: value for key, value in expected.items() if key != "avgSurvivalTime"}, mode
+    print("pipeline and buffers match saving the games one at a time")
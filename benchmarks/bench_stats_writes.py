@@ -0,0 +1,152 @@
+"""A burst of end-of-game saves: synchronous stats writes vs. the write-behind buffer.
+
+PLAYERS players finish a game at the same moment (a mass death), each
+posting /user/save-stats ROUNDS times from CLIENTS threads through Flask's
+test client. Users live in mongomock behind RoundTrips: every Mongo call
+first sleeps RTT_MS, standing in for the network round trip mongomock does
+not have.
+
+  sync    the previous handler: the stored stats are updated with
+          update_one in the request and the cached user is dropped, so the
+          next request by that user reads it back with find_one
+  buffer  the current handler: the game goes into db.stats_buffer, which
+          writes all pending users with one bulk_write
+
+Reports save latency, the Mongo calls the burst cost (including the reads
+that follow), and for the buffer how long until everything was written.
+Both modes must end with the same stats. Finally checks that a game
+saved just before the player logs in elsewhere (which replaces their
+token) is still written.
+
+    python benchmarks/bench_stats_writes.py
+"""
+import hashlib
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from round_trips import RoundTrips
+
+PLAYERS = 200
+ROUNDS = 3
+CLIENTS = 32
+RTT_MS = 1.0
+
+def token_for(i):
+    return f"bench-token-{i}"
+
+def game_for(i, round_number):
+    return {"score": (i * 7 + round_number * 13) % 50, "length": (i + round_number) % 30 + 1,
+            "survivalTime": 10 + (i * round_number) % 90, "foodEaten": i % 11, "kills": round_number % 3}
+
+def sync_save_stats(server, db):
+    # The previous /user/save-stats: read from the cached user, write in the request
+    from flask import g, jsonify, request
+    user = g.user
+    data = request.json
+    existing_stats = user.get("stats", {})
+    game_count = existing_stats.get("gameCount", 0) + 1
+    total_survival_time = existing_stats.get("avgSurvivalTime", 0) * (game_count - 1) + data.get("survivalTime", 0)
+    updated_stats = {
+        "highScore": max(existing_stats.get("highScore", 0), data.get("score", 0)),
+        "avgSurvivalTime": total_survival_time / game_count,
+        "longestSnake": max(existing_stats.get("longestSnake", 0), data.get("length", 1)),
+        "totalFood": existing_stats.get("totalFood", 0) + data.get("foodEaten", 0),
+        "totalKills": existing_stats.get("totalKills", 0) + data.get("kills", 0),
+        "gameCount": game_count
+    }
+    db.user_collection.update_one({"token": g.hashed_auth}, {"$set": {"stats": updated_stats}})
+    db.session_cache.invalidate(g.hashed_auth)
+    return jsonify({"success": True})
+
+def check_token_rotation(server, db, collection):
+    client = server.app.test_client()
+    client.set_cookie("auth_token", token_for(0))
+    before = collection.find_one({"id": "id-0"})["stats"]["gameCount"]
+    assert client.post("/user/save-stats", json=game_for(0, 0)).status_code == 200
+    # What auth_paths does on login: a new token, the old one forgotten
+    collection.update_one({"id": "id-0"}, {"$set": {"token": b"rotated"}})
+    db.session_cache.invalidate(hashlib.sha256(token_for(0).encode("utf-8")).hexdigest().encode("utf-8"))
+    db.stats_buffer.close()
+    assert collection.find_one({"id": "id-0"})["stats"]["gameCount"] == before + 1
+    print("a game saved before the token changed is still written")
+
+def measure(mode, server, db):
+    import mongomock
+    collection = mongomock.MongoClient()["potato"]["user"]
+    for i in range(PLAYERS):
+        hashed = hashlib.sha256(token_for(i).encode("utf-8")).hexdigest().encode("utf-8")
+        collection.insert_one({"id": f"id-{i}", "username": f"bench{i}", "token": hashed})
+    db.user_collection = RoundTrips(collection, RTT_MS)
+    db.session_cache.clear()
+    server.app.view_functions["save_stats"] = (lambda: sync_save_stats(server, db)) if mode == "sync" else server.save_stats
+
+    # Every player is cached, as they would be mid-game
+    client = server.app.test_client()
+    for i in range(PLAYERS):
+        client.set_cookie("auth_token", token_for(i))
+        client.get("/user/current")
+    db.user_collection.calls = 0
+
+    latencies = []
+    lock = threading.Lock()
+
+    def worker(index):
+        local_client = server.app.test_client()
+        local = []
+        for round_number in range(ROUNDS):
+            for i in range(index, PLAYERS, CLIENTS):
+                local_client.set_cookie("auth_token", token_for(i))
+                start = time.perf_counter()
+                response = local_client.post("/user/save-stats", json=game_for(i, round_number))
+                local.append(time.perf_counter() - start)
+                assert response.status_code == 200
+        with lock:
+            latencies.extend(local)
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(index,)) for index in range(CLIENTS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    answered = time.perf_counter() - started
+    while db.stats_buffer.stats()["pendingUsers"] or db.stats_buffer.stats()["flushingUsers"]:
+        time.sleep(0.005)
+    durable = time.perf_counter() - started
+
+    # Each player opens their profile afterwards
+    for i in range(PLAYERS):
+        client.set_cookie("auth_token", token_for(i))
+        client.get("/user/current")
+
+    latencies.sort()
+    count = len(latencies)
+    print(f"{mode:>7} {count:>6} {latencies[count // 2] * 1000:>8.2f} {latencies[int(count * 0.99)] * 1000:>8.2f} "
+          f"{answered * 1000:>10.0f} {durable * 1000:>10.0f} {db.user_collection.calls:>11}")
+    return collection, {user["username"]: user.get("stats") for user in collection.find({}, {"_id": 0, "username": 1, "stats": 1})}
+
+if __name__ == "__main__":
+    os.chdir(tempfile.mkdtemp())
+    import database as db
+    import server
+    server.app.logger.disabled = True
+    server.raw_logger.disabled = True
+
+    print(f"{PLAYERS} players x {ROUNDS} saves from {CLIENTS} threads, {RTT_MS} ms per Mongo call")
+    print(f"{'mode':>7} {'saves':>6} {'p50 ms':>8} {'p99 ms':>8} {'answered':>10} {'durable':>10} {'mongo calls':>11}")
+    print(f"{'':>7} {'':>6} {'':>8} {'':>8} {'ms':>10} {'ms':>10} {'':>11}")
+    results = [measure(mode, server, db) for mode in ("sync", "buffer")]
+    collection = results[1][0]
+    results = [stats for _, stats in results]
+    for username, stats in results[0].items():
+        other = results[1][username]
+        # The buffer divides once per batch instead of once per game
+        assert abs(stats.pop("avgSurvivalTime") - other.pop("avgSurvivalTime")) < 1e-9, username
+        assert stats == other, username
+    print(f"final stats identical; buffer flush lag {db.stats_buffer.stats()['maxLagMs']:.0f} ms max")
+    check_token_rotation(server, db, collection)
@@ -0,0 +1,121 @@
+"""User lookups on a 1M-user collection, before and after bootstrap_indexes().
+
+Fills a scratch collection in the local mongod with USERS synthetic users,
+times token/username/id lookups with no indexes (collection scans), checks
+that verify_query_plans() rejects that state, then creates the indexes and
+times the same lookups again. Also checks the unique indexes reject a
+duplicate username. The scratch collection is dropped afterwards.
+
+With --mongomock no mongod is needed: the users go into mongomock (default
+MOCK_USERS of them), whose explain() is stubbed to plan like mongod does for
+these equality lookups: IXSCAN on a single-field index of the queried field,
+COLLSCAN otherwise. The plan and duplicate checks are the real ones; the
+lookup times are not, since mongomock scans with or without indexes.
+
+    python benchmarks/bench_user_indexes.py [users] [--mongomock]
+"""
+import hashlib
+import os
+import random
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from pymongo.errors import DuplicateKeyError
+import database as db
+
+MOCK = "--mongomock" in sys.argv
+ARGS = [arg for arg in sys.argv[1:] if arg != "--mongomock"]
+MOCK_USERS = 20_000
+USERS = int(ARGS[0]) if ARGS else MOCK_USERS if MOCK else 1_000_000
+BATCH = 10_000
+SCAN_LOOKUPS = 20
+# mongomock scans either way, so its lookups are all as slow as the unindexed ones
+INDEXED_LOOKUPS = SCAN_LOOKUPS if MOCK else 2000
+
+class ExplainedCursor:
+    """A mongomock cursor whose explain() returns the plan mongod would pick"""
+
+    def __init__(self, cursor, plan):
+        self.cursor = cursor
+        self.plan = plan
+
+    def __getattr__(self, name):
+        return getattr(self.cursor, name)
+
+    def __iter__(self):
+        return iter(self.cursor)
+
+    def explain(self):
+        return {"queryPlanner": {"winningPlan": self.plan}}
+
+class ExplainedCollection:
+    """A mongomock collection with find().explain() stubbed from its index list"""
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    def __getattr__(self, name):
+        return getattr(self.collection, name)
+
+    def find(self, query=None, *args, **kwargs):
+        return ExplainedCursor(self.collection.find(query, *args, **kwargs), self.plan_for(query or {}))
+
+    def plan_for(self, query):
+        for name, index in self.collection.index_information().items():
+            if [field for field, _ in index["key"]] == list(query):
+                return {"stage": "FETCH", "inputStage": {"stage": "IXSCAN", "indexName": name}}
+        return {"stage": "COLLSCAN", "filter": query}
+
+def synthetic_user(i):
+    token = hashlib.sha256(f"token-{i}".encode("utf-8")).hexdigest().encode("utf-8")
+    return {"id": str(uuid.UUID(int=i)), "username": f"user{i}", "password": b"x", "token": token}
+
+def fill(collection):
+    start = time.perf_counter()
+    for first in range(0, USERS, BATCH):
+        collection.insert_many([synthetic_user(i) for i in range(first, min(USERS, first + BATCH))], ordered=False)
+    print(f"inserted {USERS} users in {time.perf_counter() - start:.1f}s")
+
+def time_lookups(collection, count):
+    rng = random.Random(count)
+    print(f"{'query':>16} {'ms/lookup':>10}")
+    for field in db.USER_INDEX_FIELDS:
+        users = [synthetic_user(rng.randrange(USERS)) for _ in range(count)]
+        start = time.perf_counter()
+        for user in users:
+            assert collection.find_one({field: user[field]}) is not None
+        print(f"{field + ' lookup':>16} {(time.perf_counter() - start) / count * 1000:>10.3f}")
+
+if __name__ == "__main__":
+    if MOCK:
+        import mongomock
+        collection = ExplainedCollection(mongomock.MongoClient()["potato"]["bench_user_indexes"])
+    else:
+        collection = db.db["bench_user_indexes"]
+    collection.drop()
+    try:
+        fill(collection)
+
+        print("\nwithout indexes")
+        time_lookups(collection, SCAN_LOOKUPS)
+        try:
+            db.verify_query_plans(collection)
+            raise AssertionError("verify_query_plans accepted collection scans")
+        except db.QueryPlanError as e:
+            print(f"plan check rejected it: {e}")
+
+        start = time.perf_counter()
+        db.bootstrap_indexes(collection)
+        print(f"\nbootstrap_indexes took {time.perf_counter() - start:.1f}s, plans use the indexes")
+        time_lookups(collection, INDEXED_LOOKUPS)
+
+        try:
+            collection.insert_one(synthetic_user(0) | {"id": "dup", "token": b"dup"})
+            raise AssertionError("duplicate username was accepted")
+        except DuplicateKeyError:
+            print("duplicate username rejected")
+    finally:
+        collection.drop()
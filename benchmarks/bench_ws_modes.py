@@ -0,0 +1,163 @@
+"""Game websocket capacity: Flask + flask_sock (thread per socket) vs. the asyncio ASGI app.
+
+Starts the server in a subprocess (werkzeug's threaded server with
+server.app, or uvicorn with asgi.app) against an in-process mongomock user
+collection, then opens game connections in steps from one asyncio client
+process. Every client joins and sends a `move` at MOVE_RATE Hz with a short
+body, and reads everything the server sends. For each step the server
+process's CPU time, thread count and RSS are sampled over WINDOW seconds;
+"conns/core" is connections divided by the cores the server used.
+Clients and server share the machine, so compare modes, not absolutes.
+
+    python benchmarks/bench_ws_modes.py
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+STEPS = [50, 100, 200]
+MOVE_RATE = 10
+WARMUP = 2.0
+WINDOW = 5.0
+CLOCK_TICKS = os.sysconf("SC_CLK_TCK")
+
+def token_for(i):
+    return f"bench-token-{i}"
+
+def serve(mode):
+    os.chdir(tempfile.mkdtemp())
+    import mongomock
+    import database as db
+    import server
+
+    server.app.logger.disabled = True
+    server.raw_logger.disabled = True
+    logging.getLogger("werkzeug").disabled = True
+
+    db.user_collection = mongomock.MongoClient()["potato"]["user"]
+    # mongomock has no explain(), so skip the startup query-plan check
+    db.bootstrap_indexes = lambda collection=None: None
+    for i in range(max(STEPS)):
+        hashed = hashlib.sha256(token_for(i).encode("utf-8")).hexdigest().encode("utf-8")
+        db.user_collection.insert_one({"id": f"id-{i}", "username": f"bench{i}", "token": hashed})
+
+    if mode == "flask":
+        from werkzeug.serving import make_server
+        import game_websocket
+        game_websocket.init_game_system()
+        http_server = make_server("127.0.0.1", 0, server.app, threaded=True)
+        print(f"READY {http_server.server_port}", flush=True)
+        http_server.serve_forever()
+    else:
+        import socket
+        import uvicorn
+        import asgi
+        sock = socket.socket()
+        sock.bind(("127.0.0.1", 0))
+        sock.listen(1024)
+        print(f"READY {sock.getsockname()[1]}", flush=True)
+        config = uvicorn.Config(asgi.app, log_level="warning", ws_max_queue=64)
+        uvicorn.Server(config).run(sockets=[sock])
+
+def process_sample(pid):
+    with open(f"/proc/{pid}/stat") as stat:
+        fields = stat.read().rsplit(")", 1)[1].split()
+    cpu_seconds = (int(fields[11]) + int(fields[12])) / CLOCK_TICKS
+    threads = rss_kb = 0
+    with open(f"/proc/{pid}/status") as status:
+        for line in status:
+            if line.startswith("Threads:"):
+                threads = int(line.split()[1])
+            elif line.startswith("VmRSS:"):
+                rss_kb = int(line.split()[1])
+    return cpu_seconds, threads, rss_kb
+
+async def client(port, i, stop, counters):
+    from websockets.asyncio.client import connect
+    rng = random.Random(i)
+    x, y = rng.uniform(200, 2200), rng.uniform(200, 1400)
+    try:
+        async with connect(f"ws://127.0.0.1:{port}/ws/game", additional_headers={"Cookie": f"auth_token={token_for(i)}"},
+                           max_size=None, compression=None) as ws:
+            counters["open"] += 1
+
+            async def read():
+                async for _ in ws:
+                    counters["received"] += 1
+
+            reader = asyncio.create_task(read())
+            await ws.send(json.dumps({"messageType": "join", "snake_color": "#00FF00", "snake_x": x, "snake_y": y}))
+            segments = [{"x": x - 10 * k, "y": y} for k in range(10)]
+            while not stop.is_set() and not reader.done():
+                x = min(2300, max(100, x + rng.uniform(-8, 8)))
+                y = min(1500, max(100, y + rng.uniform(-8, 8)))
+                segments = [{"x": x, "y": y}] + segments[:-1]
+                await ws.send(json.dumps({
+                    "messageType": "move", "snake_x": x, "snake_y": y, "snake_color": "#00FF00",
+                    "segments": segments, "length": len(segments), "score": 0, "alive": True
+                }))
+                await asyncio.sleep(1 / MOVE_RATE)
+            reader.cancel()
+    except Exception:
+        counters["failed"] += 1
+    finally:
+        counters["open"] -= 1
+
+async def load(mode, port, pid):
+    stop = asyncio.Event()
+    counters = {"open": 0, "failed": 0, "received": 0}
+    tasks = []
+    for connections in STEPS:
+        while len(tasks) < connections:
+            tasks.append(asyncio.create_task(client(port, len(tasks), stop, counters)))
+            await asyncio.sleep(0.002)
+        await asyncio.sleep(WARMUP)
+
+        cpu_before, _, _ = process_sample(pid)
+        received_before = counters["received"]
+        start = time.monotonic()
+        await asyncio.sleep(WINDOW)
+        elapsed = time.monotonic() - start
+        cpu_after, threads, rss_kb = process_sample(pid)
+
+        cores = (cpu_after - cpu_before) / elapsed
+        print(f"{mode:>6} {connections:>6} {counters['open']:>6} {counters['failed']:>6} {cores:>6.2f} "
+              f"{connections / max(cores, 0.01):>10.0f} {threads:>8} {rss_kb / 1024:>8.1f} "
+              f"{(counters['received'] - received_before) / elapsed:>10.0f}", flush=True)
+
+    stop.set()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+def measure(mode):
+    process = subprocess.Popen([sys.executable, __file__, "serve", mode], stdout=subprocess.PIPE, text=True)
+    try:
+        while True:
+            line = process.stdout.readline()
+            if not line:
+                raise RuntimeError("server exited")
+            if line.startswith("READY"):
+                port = int(line.split()[1])
+                break
+        asyncio.run(load(mode, port, process.pid))
+    finally:
+        process.kill()
+        process.wait()
+
+if __name__ == "__main__":
+    if len(sys.argv) > 2 and sys.argv[1] == "serve":
+        serve(sys.argv[2])
+        sys.exit(0)
+
+    print(f"moves at {MOVE_RATE} Hz per client, {WINDOW:.0f}s windows")
+    print(f"{'mode':>6} {'conns':>6} {'open':>6} {'failed':>6} {'cores':>6} {'conns/core':>10} {'threads':>8} {'RSS MiB':>8} {'msgs in/s':>10}")
+    for mode in ("flask", "asgi"):
+        measure(mode)
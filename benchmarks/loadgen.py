@@ -0,0 +1,448 @@
+"""Headless load generator for the /ws/game protocol.
+
+Registers players through /auth/register, then opens websocket clients in
+steps and drives each one the way the browser client does: `join`, then a
+`move` with the full segment list every MOVE_INTERVAL while the snake
+travels at SPEED px/s, and a `heartbeat_response` to every `heartbeat`.
+
+OBSERVERS of the clients also decode every frame. They track food, send
+the legacy `eat_food` claim when their head reaches one, and time
+world_snapshot fan-out: how long after one client sent a position another
+client received it. The remaining clients only answer heartbeats and
+count frames, so the generator stays cheaper than the server it loads.
+
+With --input the snakes are server-simulated: clients join with
+"simulate": true and send only `input` (heading, boost) at the same rate.
+Observers then time how long a heading change takes to show up in their
+own snake's snapshots.
+
+For each step the report shows:
+- server CPU, and the generator's own CPU
+- frames per second in each direction, and upstream KiB/s
+- p50/p99 fan-out latency
+
+The largest step with p99 within --slo-ms and no failed connections is
+reported as the max sustainable player count.
+
+By default the server is started here on localhost. It runs `uvicorn
+asgi:app`, or the Flask app with --server flask, against the local mongod
+that database.py uses; registered users are deleted afterwards. Use
+--mongomock for an in-process stand-in database. Use --url to target a
+server that is already running; CPU is then not reported.
+
+    python benchmarks/loadgen.py --mongomock
+    python benchmarks/loadgen.py --mongomock --server flask --steps 25,50,100
+    python benchmarks/loadgen.py --mongomock --input
+"""
+import argparse
+import asyncio
+import collections
+import json
+import logging
+import math
+import os
+import random
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+import uuid
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from backend.tools.game_codec import COORD_SCALE, get_codec
+
+WORLD_WIDTH = 2400
+WORLD_HEIGHT = 1600
+MARGIN = 100
+# The browser client: 3 px per frame at 60 fps, a move at most every 50 ms
+# and only after 5 px of travel, so one every fourth frame
+SPEED = 180.0
+MOVE_INTERVAL = 4 / 60
+SEGMENT_SPACING = 24.0
+INITIAL_LENGTH = 10
+EAT_RADIUS = 24
+CHASE_RADIUS = 300
+# --input: observers turn this often, by at least TURN radians
+TURN_INTERVAL = 0.5
+TURN = 0.6
+HEADING_TOLERANCE = 0.05
+
+PASSWORD = "Loadgen-123"
+REGISTER_CONCURRENCY = 4
+RAMP_RATE = 50
+WARMUP = 3.0
+WINDOW = 10.0
+SENT_HISTORY = 5.0
+HEARTBEAT = '{"messageType": "heartbeat"}'
+HEARTBEAT_RESPONSE = json.dumps({"messageType": "heartbeat_response"})
+CLOCK_TICKS = os.sysconf("SC_CLK_TCK")
+
+def snap(value):
+    # Positions on the codec's 1/COORD_SCALE grid survive binary frames unchanged
+    return round(value * COORD_SCALE) / COORD_SCALE
+
+def percentile(values, fraction):
+    return values[min(len(values) - 1, int(len(values) * fraction))] if values else float("nan")
+
+class Harness:
+    """Counters shared by every client of a run"""
+
+    def __init__(self, ws_url, codec_name, input_mode):
+        self.ws_url = ws_url
+        self.codec_name = codec_name
+        self.input_mode = input_mode
+        self.codec = get_codec(codec_name)
+        self.clients = {}
+        self.latencies = []
+        self.frames_in = 0
+        self.frames_out = 0
+        self.bytes_out = 0
+        self.open = 0
+        self.failed = 0
+        self.stop = asyncio.Event()
+
+class SnakeClient:
+    def __init__(self, harness, index, token, observer):
+        self.harness = harness
+        # The server uses the auth token as the snake id
+        self.id = token
+        self.token = token
+        self.observer = observer
+        self.rng = random.Random(index)
+        self.heading = self.rng.uniform(0, 2 * math.pi)
+        x = snap(self.rng.uniform(MARGIN * 2, WORLD_WIDTH - MARGIN * 2))
+        y = snap(self.rng.uniform(MARGIN * 2, WORLD_HEIGHT - MARGIN * 2))
+        self.segments = [{"x": snap(x - k * SEGMENT_SPACING), "y": y} for k in range(INITIAL_LENGTH)]
+        self.length = INITIAL_LENGTH
+        self.score = 0
+        self.color = "#%06x" % self.rng.randrange(0xffffff)
+        self.foods = {}
+        self.sent_at = {}
+        self.sent_order = collections.deque()
+        # --input: the heading sent last and when, until our snapshots show it
+        self.turned_at = 0.0
+        self.pending_turn = None
+        self.last_head = None
+
+    async def run(self):
+        from websockets.asyncio.client import connect
+        harness = self.harness
+        try:
+            async with connect(harness.ws_url, additional_headers={"Cookie": f"auth_token={self.token}"},
+                               max_size=None, compression=None) as ws:
+                harness.open += 1
+                try:
+                    reader = asyncio.create_task(self.read(ws))
+                    head = self.segments[0]
+                    await self.send(ws, json.dumps({
+                        "messageType": "join", "snake_x": head["x"], "snake_y": head["y"],
+                        "snake_color": self.color, "alive": True,
+                        "simulate": harness.input_mode, "heading": self.heading
+                    }))
+                    # Spread the clients' move timers over the interval
+                    await asyncio.sleep(self.rng.uniform(0, MOVE_INTERVAL))
+                    while not harness.stop.is_set() and not reader.done():
+                        await (self.steer_input(ws) if harness.input_mode else self.move(ws))
+                        await asyncio.sleep(MOVE_INTERVAL)
+                    if reader.done() and not harness.stop.is_set():
+                        # The server closed on us mid-run
+                        harness.failed += 1
+                    reader.cancel()
+                finally:
+                    harness.open -= 1
+        except Exception:
+            if not harness.stop.is_set():
+                harness.failed += 1
+
+    async def send(self, ws, payload):
+        self.harness.frames_out += 1
+        self.harness.bytes_out += len(payload)
+        await ws.send(payload)
+
+    async def steer_input(self, ws):
+        now = time.perf_counter()
+        if self.observer and now - self.turned_at >= TURN_INTERVAL:
+            self.heading = math.remainder(self.heading + self.rng.choice((-1, 1)) * self.rng.uniform(TURN, 2 * TURN), math.tau)
+            self.turned_at = now
+            self.pending_turn = (self.heading, now)
+        elif not self.observer:
+            self.heading += self.rng.uniform(-0.3, 0.3)
+        await self.send(ws, self.harness.codec.encode({"messageType": "input", "heading": self.heading, "boost": False}))
+
+    def own_snapshot(self, snake, now):
+        # Direction of travel between two of our own snapshots; a match means the turn arrived
+        if self.last_head is not None and self.pending_turn is not None:
+            dx, dy = snake["x"] - self.last_head[0], snake["y"] - self.last_head[1]
+            if dx or dy:
+                heading, sent = self.pending_turn
+                if abs(math.remainder(math.atan2(dy, dx) - heading, math.tau)) <= HEADING_TOLERANCE:
+                    self.harness.latencies.append(now - sent)
+                    self.pending_turn = None
+        self.last_head = (snake["x"], snake["y"])
+
+    def steer(self):
+        head = self.segments[0]
+        target = None
+        if self.observer and self.foods:
+            food_id, (fx, fy) = min(self.foods.items(), key=lambda item: (item[1][0] - head["x"]) ** 2 + (item[1][1] - head["y"]) ** 2)
+            if (fx - head["x"]) ** 2 + (fy - head["y"]) ** 2 <= CHASE_RADIUS ** 2:
+                target = (fx, fy)
+
+        if target is not None:
+            self.heading = math.atan2(target[1] - head["y"], target[0] - head["x"])
+        else:
+            self.heading += self.rng.uniform(-0.3, 0.3)
+
+        step = SPEED * MOVE_INTERVAL
+        x = head["x"] + math.cos(self.heading) * step
+        y = head["y"] + math.sin(self.heading) * step
+        if not MARGIN < x < WORLD_WIDTH - MARGIN:
+            self.heading = math.pi - self.heading
+        if not MARGIN < y < WORLD_HEIGHT - MARGIN:
+            self.heading = -self.heading
+        return snap(min(WORLD_WIDTH - MARGIN, max(MARGIN, x))), snap(min(WORLD_HEIGHT - MARGIN, max(MARGIN, y)))
+
+    async def move(self, ws):
+        x, y = self.steer()
+        head = {"x": x, "y": y}
+        # Same bookkeeping as the browser: overwrite the head, push a new one every SEGMENT_SPACING
+        if math.hypot(x - self.segments[1]["x"], y - self.segments[1]["y"]) >= SEGMENT_SPACING:
+            self.segments.insert(0, head)
+        else:
+            self.segments[0] = head
+        del self.segments[self.length:]
+
+        if self.observer:
+            await self.claim_food(ws, x, y)
+
+        now = time.perf_counter()
+        self.sent_at[(x, y)] = now
+        self.sent_order.append((now, (x, y)))
+        while self.sent_order and self.sent_order[0][0] < now - SENT_HISTORY:
+            _, key = self.sent_order.popleft()
+            if self.sent_at.get(key, now) < now - SENT_HISTORY:
+                del self.sent_at[key]
+
+        await self.send(ws, self.harness.codec.encode({
+            "messageType": "move", "snake_x": x, "snake_y": y, "snake_color": self.color,
+            "segments": self.segments, "length": self.length, "score": self.score, "alive": True
+        }))
+
+    async def claim_food(self, ws, x, y):
+        # What clients before server-side collisions sent
+        for food_id, (fx, fy) in list(self.foods.items()):
+            if (fx - x) ** 2 + (fy - y) ** 2 <= EAT_RADIUS ** 2:
+                del self.foods[food_id]
+                self.score += 1
+                self.length += 1
+                await self.send(ws, json.dumps({"messageType": "eat_food", "food_id": food_id}))
+
+    async def read(self, ws):
+        harness = self.harness
+        async for frame in ws:
+            harness.frames_in += 1
+            if not self.observer:
+                if isinstance(frame, str) and frame.startswith(HEARTBEAT):
+                    await self.send(ws, HEARTBEAT_RESPONSE)
+                continue
+
+            message = harness.codec.decode(frame)
+            message_type = message.get("messageType")
+            if message_type == "heartbeat":
+                await self.send(ws, HEARTBEAT_RESPONSE)
+            elif message_type == "world_snapshot":
+                now = time.perf_counter()
+                for snake in message["snakes"]:
+                    if snake["id"] == self.id:
+                        self.own_snapshot(snake, now)
+                        continue
+                    owner = harness.clients.get(snake["id"])
+                    sent = owner.sent_at.get((snake["x"], snake["y"])) if owner is not None else None
+                    if sent is not None:
+                        harness.latencies.append(now - sent)
+            elif message_type in ("init_location", "new_foods"):
+                for food in message["foods"]:
+                    if food.get("active", True):
+                        self.foods[food["id"]] = (food["x"], food["y"])
+            elif message_type == "player_died":
+                for food in message.get("food_particles", []):
+                    self.foods[food["id"]] = (food["x"], food["y"])
+            elif message_type == "food_update":
+                for update in message.get("updates", []):
+                    if update.get("active") and "x" in update:
+                        self.foods[update["food_id"]] = (update["x"], update["y"])
+                    elif not update.get("active"):
+                        self.foods.pop(update["food_id"], None)
+
+def register(base_url, username):
+    """Auth token of a newly registered user; retries while the password pool is busy"""
+    data = urllib.parse.urlencode({"username": username, "password": PASSWORD}).encode("utf-8")
+    for _ in range(60):
+        try:
+            with urllib.request.urlopen(urllib.request.Request(f"{base_url}/auth/register", data=data), timeout=30) as response:
+                for cookie in response.headers.get_all("Set-Cookie") or []:
+                    if cookie.startswith("auth_token="):
+                        return cookie.split(";", 1)[0].split("=", 1)[1]
+                raise RuntimeError(f"no auth_token cookie registering {username}")
+        except urllib.error.HTTPError as error:
+            if error.code != 503:
+                raise
+        time.sleep(1)
+    raise RuntimeError(f"registration of {username} kept getting 503")
+
+async def register_all(base_url, prefix, count):
+    limit = asyncio.Semaphore(REGISTER_CONCURRENCY)
+
+    async def one(i):
+        async with limit:
+            return await asyncio.to_thread(register, base_url, f"{prefix}{i}")
+
+    return await asyncio.gather(*(one(i) for i in range(count)))
+
+def process_cpu(pid):
+    if pid is None:
+        return None
+    with open(f"/proc/{pid}/stat") as stat:
+        fields = stat.read().rsplit(")", 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / CLOCK_TICKS
+
+async def run_steps(args, base_url, ws_url, pid):
+    steps = [int(step) for step in args.steps.split(",")]
+    prefix = f"lg{uuid.uuid4().hex[:8]}_"
+    start = time.monotonic()
+    tokens = await register_all(base_url, prefix, max(steps))
+    print(f"registered {len(tokens)} players in {time.monotonic() - start:.1f}s", flush=True)
+    print(f"{'players':>7} {'open':>5} {'failed':>6} {'srv cpu':>7} {'gen cpu':>7} {'frames in/s':>11} "
+          f"{'frames out/s':>12} {'KiB out/s':>9} {'samples':>8} {'p50 ms':>7} {'p99 ms':>7} {'ok':>3}", flush=True)
+
+    harness = Harness(ws_url, args.codec, args.input)
+    tasks = []
+    sustainable = 0
+    for players in steps:
+        while len(tasks) < players:
+            index = len(tasks)
+            client = SnakeClient(harness, index, tokens[index], index < args.observers)
+            harness.clients[client.id] = client
+            tasks.append(asyncio.create_task(client.run()))
+            await asyncio.sleep(1 / RAMP_RATE)
+        await asyncio.sleep(WARMUP)
+
+        harness.latencies = []
+        frames_in, frames_out, bytes_out, failed = harness.frames_in, harness.frames_out, harness.bytes_out, harness.failed
+        server_before, own_before, window_start = process_cpu(pid), time.process_time(), time.monotonic()
+        await asyncio.sleep(WINDOW)
+        elapsed = time.monotonic() - window_start
+        server_after, own_after = process_cpu(pid), time.process_time()
+
+        latencies = sorted(harness.latencies)
+        p50, p99 = percentile(latencies, 0.5) * 1000, percentile(latencies, 0.99) * 1000
+        ok = bool(latencies) and p99 <= args.slo_ms and harness.failed == 0 and harness.open == players
+        server_cores = f"{(server_after - server_before) / elapsed:.2f}" if pid is not None else "-"
+        print(f"{players:>7} {harness.open:>5} {harness.failed - failed:>6} {server_cores:>7} "
+              f"{(own_after - own_before) / elapsed:>7.2f} {(harness.frames_in - frames_in) / elapsed:>11.0f} "
+              f"{(harness.frames_out - frames_out) / elapsed:>12.0f} {(harness.bytes_out - bytes_out) / elapsed / 1024:>9.1f} {len(latencies):>8} {p50:>7.1f} {p99:>7.1f} "
+              f"{'yes' if ok else 'no':>3}", flush=True)
+        if not ok:
+            break
+        sustainable = players
+
+    harness.stop.set()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    measured = "turn-to-snapshot" if args.input else "fan-out"
+    print(f"max sustainable players: {sustainable or f'below {steps[0]}'} "
+          f"(p99 {measured} within {args.slo_ms:.0f} ms, no failed connections)")
+    return prefix
+
+def serve(server_kind, mongomock_db):
+    os.chdir(tempfile.mkdtemp())
+    import database as db
+    if mongomock_db:
+        import mongomock
+        db.user_collection = mongomock.MongoClient()["potato"]["user"]
+        # mongomock has no explain(), so skip the startup query-plan check
+        db.bootstrap_indexes = lambda collection=None: None
+
+    import socket
+    import server
+    server.app.logger.disabled = True
+    server.raw_logger.disabled = True
+    logging.getLogger("werkzeug").disabled = True
+
+    if server_kind == "flask":
+        from werkzeug.serving import make_server
+        server.create_app()
+        http_server = make_server("127.0.0.1", 0, server.app, threaded=True)
+        # Exit through atexit on SIGTERM so the bcrypt pool's workers are stopped too
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+        print(f"READY {http_server.server_port}", flush=True)
+        http_server.serve_forever()
+    else:
+        import uvicorn
+        import asgi
+        sock = socket.socket()
+        sock.bind(("127.0.0.1", 0))
+        sock.listen(1024)
+        print(f"READY {sock.getsockname()[1]}", flush=True)
+        # log_config=None: uvicorn's logging setup would re-enable the loggers disabled above
+        uvicorn.Server(uvicorn.Config(asgi.app, log_config=None)).run(sockets=[sock])
+
+def start_server(args):
+    command = [sys.executable, __file__, "serve", args.server] + (["--mongomock"] if args.mongomock else [])
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, text=True)
+    while True:
+        line = process.stdout.readline()
+        if not line:
+            raise RuntimeError("server exited before it was ready")
+        if line.startswith("READY"):
+            return process, int(line.split()[1])
+
+def remove_users(prefix):
+    # Only the local-mongod run leaves users behind
+    import database as db
+    db.user_collection.delete_many({"username": {"$regex": f"^{prefix}"}})
+
+def main():
+    parser = argparse.ArgumentParser(description="Load generator for /ws/game")
+    parser.add_argument("--server", choices=["asgi", "flask"], default="asgi")
+    parser.add_argument("--mongomock", action="store_true", help="in-process stand-in database for the started server")
+    parser.add_argument("--url", help="an already running server, e.g. http://127.0.0.1:8080")
+    parser.add_argument("--steps", default="25,50,100,200", help="comma separated player counts")
+    parser.add_argument("--observers", type=int, default=10, help="clients that decode every frame and time fan-out")
+    parser.add_argument("--codec", choices=["binary", "json"], default="binary")
+    parser.add_argument("--input", action="store_true", help="server-simulated snakes driven by input messages")
+    parser.add_argument("--slo-ms", type=float, default=200.0, help="p99 fan-out latency a step must stay within")
+    args = parser.parse_args()
+
+    process = None
+    if args.url:
+        base_url = args.url.rstrip("/")
+    else:
+        process, port = start_server(args)
+        base_url = f"http://127.0.0.1:{port}"
+    ws_url = base_url.replace("http", "ws", 1) + f"/ws/game?codec={args.codec}"
+
+    try:
+        print(f"{args.url or args.server + (' + mongomock' if args.mongomock else ' + local mongod')}, "
+              f"{args.codec} codec, {'input' if args.input else 'move'} messages, {args.observers} observers, {WINDOW:.0f}s windows", flush=True)
+        prefix = asyncio.run(run_steps(args, base_url, ws_url, process.pid if process else None))
+        if not args.mongomock:
+            remove_users(prefix)
+    finally:
+        if process is not None:
+            process.terminate()
+            try:
+                process.wait(timeout=20)
+            except subprocess.TimeoutExpired:
+                process.kill()
+                process.wait()
+
+if __name__ == "__main__":
+    if len(sys.argv) > 2 and sys.argv[1] == "serve":
+        serve(sys.argv[2], "--mongomock" in sys.argv)
+        sys.exit(0)
+    main()
@@ -0,0 +1,40 @@
+"""Mongo round trips for the benchmarks that keep users in mongomock.
+
+    from round_trips import RoundTrips
+"""
+import threading
+import time
+
+class RoundTrips:
+    """A collection whose calls each wait rtt_ms, then run one at a time, counted.
+
+    The real server applies each single-document write atomically and
+    mongomock by itself does not, hence the lock. mongomock 4.3's
+    bulk_write does not accept current pymongo operations, so bulk_write is
+    replayed as update_one calls behind a single round trip.
+    """
+
+    def __init__(self, collection, rtt_ms):
+        self.collection = collection
+        self.rtt_ms = rtt_ms
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def __getattr__(self, name):
+        method = getattr(self.collection, name)
+        if not callable(method):
+            return method
+
+        def call(*args, **kwargs):
+            time.sleep(self.rtt_ms / 1000)
+            with self.lock:
+                self.calls += 1
+                return method(*args, **kwargs)
+        return call
+
+    def bulk_write(self, operations, ordered=True):
+        time.sleep(self.rtt_ms / 1000)
+        with self.lock:
+            self.calls += 1
+            for operation in operations:
+                self.collection.update_one(operation._filter, operation._doc)
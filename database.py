@@ -1,5 +1,9 @@
+import atexit
 import os
-from pymongo import MongoClient
+from pymongo import MongoClient, ASCENDING
+from backend.tools.profile_cache import ProfileCache
+from backend.tools.session_cache import SessionCache
+from backend.tools.stats_buffer import StatsBuffer
 
 docker_db = os.environ.get('DOCKER_DB', "false")
 
@@ -14,5 +18,77 @@ db = mongo_client["potato"]
 
 user_collection = db["user"]
 
+# Users looked up by hashed auth token, shared by HTTP requests and the game websocket
+session_cache = SessionCache()
+
+# Rendered /user/stats and /user/achievements bodies, by hashed auth token
+profile_cache = ProfileCache()
+
+def forget_sessions(hashed_tokens):
+    for hashed_token in hashed_tokens:
+        session_cache.invalidate(hashed_token)
+
+# End-of-game stats by user id, written behind the request in batches (the
+# auth token changes on every login and logout). Cached users are dropped,
+# by their latest token, once their stats are written.
+stats_buffer = StatsBuffer(lambda: user_collection, on_flushed=forget_sessions)
+atexit.register(stats_buffer.close)
+
+def find_user_by_token(hashed_token):
+    user = session_cache.get(hashed_token)
+    if user is None:
+        user = user_collection.find_one({"token": hashed_token})
+        if user is not None:
+            session_cache.put(hashed_token, user)
+    return user
+
+# Every user lookup goes through one of these fields, so each gets a unique index
+USER_INDEX_FIELDS = ["username", "id", "token"]
+
+# Queries on hot paths (every request, login/registration, stats and avatar
+# updates); none of them may fall back to a collection scan
+HOT_USER_QUERIES = {
+    "token lookup": {"token": b"0" * 64},
+    "username lookup": {"username": ""},
+    "id lookup": {"id": ""},
+}
+
+class QueryPlanError(RuntimeError):
+    pass
+
+def ensure_indexes(collection=None):
+    """Create the user collection indexes; raises if existing data violates a unique index"""
+    if collection is None:
+        collection = user_collection
+    
+    for field in USER_INDEX_FIELDS:
+        collection.create_index([(field, ASCENDING)], unique=True, name=f"{field}_unique")
+
+def plan_stages(plan):
+    """Every stage name in an explain() plan, however deeply nested"""
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            yield plan["stage"]
+        for value in plan.values():
+            yield from plan_stages(value)
+    elif isinstance(plan, list):
+        for value in plan:
+            yield from plan_stages(value)
+
+def verify_query_plans(collection=None):
+    """Raise QueryPlanError if a hot user query would scan the whole collection"""
+    if collection is None:
+        collection = user_collection
+    
+    for name, query in HOT_USER_QUERIES.items():
+        winning_plan = collection.find(query).explain()["queryPlanner"]["winningPlan"]
+        if "COLLSCAN" in plan_stages(winning_plan):
+            raise QueryPlanError(f"{name} {query} uses a collection scan on {collection.full_name}")
+
+def bootstrap_indexes(collection=None):
+    """Startup step: create indexes, then check the hot queries use them"""
+    ensure_indexes(collection)
+    verify_query_plans(collection)
+
 #if __name__ == "__main__":
 #    user_collection.drop()
\ No newline at end of file
@@ -0,0 +1,170 @@
+// Binary wire format for /ws/game?codec=binary, mirroring backend/tools/game_codec.py.
+// Only "move" (sent) and "world_snapshot" (received) are binary frames; every
+// other message is still JSON text.
+
+type Point = { x: number; y: number };
+
+export type MoveMessage = {
+  snake_x: number;
+  snake_y: number;
+  snake_color: string;
+  username: string;
+  segments: Point[];
+  length: number;
+  score: number;
+  alive: boolean;
+};
+
+// Coordinates are int16 in 1/COORD_SCALE px steps
+const COORD_SCALE = 8;
+const COORD_LIMIT = 32767;
+
+const MOVE_FRAME = 1;
+const WORLD_SNAPSHOT_FRAME = 2;
+const SNAKE_DELTA = 1;
+const NULL_STRING = 255;
+
+const textEncoder = new TextEncoder();
+const textDecoder = new TextDecoder();
+
+function quantize(value: number): number {
+  return Math.max(
+    -COORD_LIMIT,
+    Math.min(COORD_LIMIT, Math.round(value * COORD_SCALE))
+  );
+}
+
+function clampUint(value: number, limit: number): number {
+  return Math.max(0, Math.min(limit, Math.floor(value || 0)));
+}
+
+export function encodeMove(message: MoveMessage): ArrayBuffer {
+  const color = textEncoder.encode(message.snake_color ?? "").slice(0, 254);
+  const name = textEncoder.encode(message.username ?? "").slice(0, 254);
+  const count = Math.min(message.segments.length, 65535);
+
+  const buffer = new ArrayBuffer(
+    1 + 11 + 1 + color.length + 1 + name.length + 2 + count * 4
+  );
+  const view = new DataView(buffer);
+  const bytes = new Uint8Array(buffer);
+  let offset = 0;
+
+  view.setUint8(offset, MOVE_FRAME);
+  view.setInt16(offset + 1, quantize(message.snake_x), true);
+  view.setInt16(offset + 3, quantize(message.snake_y), true);
+  view.setUint16(offset + 5, clampUint(message.length, 65535), true);
+  view.setUint32(offset + 7, clampUint(message.score, 4294967295), true);
+  view.setUint8(offset + 11, message.alive ? 1 : 0);
+  offset += 12;
+
+  for (const text of [color, name]) {
+    view.setUint8(offset, text.length);
+    bytes.set(text, offset + 1);
+    offset += 1 + text.length;
+  }
+
+  view.setUint16(offset, count, true);
+  offset += 2;
+  for (let i = 0; i < count; i++) {
+    view.setInt16(offset, quantize(message.segments[i].x), true);
+    view.setInt16(offset + 2, quantize(message.segments[i].y), true);
+    offset += 4;
+  }
+
+  return buffer;
+}
+
+class FrameReader {
+  view: DataView;
+  offset: number;
+
+  constructor(buffer: ArrayBuffer) {
+    this.view = new DataView(buffer);
+    this.offset = 0;
+  }
+
+  uint8(): number {
+    const value = this.view.getUint8(this.offset);
+    this.offset += 1;
+    return value;
+  }
+
+  int16(): number {
+    const value = this.view.getInt16(this.offset, true);
+    this.offset += 2;
+    return value;
+  }
+
+  uint16(): number {
+    const value = this.view.getUint16(this.offset, true);
+    this.offset += 2;
+    return value;
+  }
+
+  uint32(): number {
+    const value = this.view.getUint32(this.offset, true);
+    this.offset += 4;
+    return value;
+  }
+
+  string(): string | null {
+    const length = this.uint8();
+    if (length === NULL_STRING) return null;
+    const value = textDecoder.decode(
+      new Uint8Array(this.view.buffer, this.offset, length)
+    );
+    this.offset += length;
+    return value;
+  }
+
+  points(): Point[] {
+    const count = this.uint16();
+    const points: Point[] = new Array(count);
+    for (let i = 0; i < count; i++) {
+      const x = this.int16() / COORD_SCALE;
+      const y = this.int16() / COORD_SCALE;
+      points[i] = { x, y };
+    }
+    return points;
+  }
+}
+
+function decodeWorldSnapshot(reader: FrameReader) {
+  const count = reader.uint16();
+  const snakes = [];
+
+  for (let i = 0; i < count; i++) {
+    const kind = reader.uint8();
+    const x = reader.int16() / COORD_SCALE;
+    const y = reader.int16() / COORD_SCALE;
+    const length = reader.uint16();
+    const score = reader.uint32();
+    const alive = reader.uint8() === 1;
+    const id = reader.string();
+
+    if (kind === SNAKE_DELTA) {
+      const added = reader.points();
+      const trimmed = reader.uint16();
+      snakes.push({ id, delta: true, x, y, added, trimmed, length, score, alive });
+    } else {
+      const color = reader.string();
+      const username = reader.string();
+      const segments = reader.points();
+      snakes.push({ id, x, y, color, username, segments, length, score, alive });
+    }
+  }
+
+  return { messageType: "world_snapshot", snakes };
+}
+
+// Decode a binary frame into the same shape the JSON message would have
+export function decodeFrame(buffer: ArrayBuffer): any {
+  const reader = new FrameReader(buffer);
+  const frameType = reader.uint8();
+
+  if (frameType === WORLD_SNAPSHOT_FRAME) {
+    return decodeWorldSnapshot(reader);
+  }
+  throw new Error(`Unknown binary frame type ${frameType}`);
+}
@@ -1,5 +1,6 @@
 import React, { useRef, useEffect, useState } from "react";
 import { useNavigate, useLocation } from "react-router-dom";
+import { decodeFrame, encodeMove } from "../gameCodec";
 import "../styles/game.css";
 
 // 2D point in pixels
@@ -18,6 +19,35 @@ type Snake = {
   score: number;
   alive: boolean;
 };
+// Per-tick snake update relative to the last state the server sent us
+type SnakeDelta = {
+  id: string;
+  delta: true;
+  x: number;
+  y: number;
+  added: Point[];
+  trimmed: number;
+  length: number;
+  score: number;
+  alive: boolean;
+};
+
+// Rebuild a snake from its previous state and a delta frame
+function applySnakeDelta(prev: Snake, delta: SnakeDelta): Snake {
+  const body = prev.segments.slice(
+    1,
+    Math.max(1, prev.segments.length - delta.trimmed)
+  );
+  return {
+    ...prev,
+    x: delta.x,
+    y: delta.y,
+    segments: [{ x: delta.x, y: delta.y }, ...delta.added, ...body],
+    length: delta.length,
+    score: delta.score,
+    alive: delta.alive,
+  };
+}
 
 // Game world and viewport configuration
 const WORLD_WIDTH = 2400; // Reduced world width - about 2x screen size
@@ -37,6 +67,24 @@ function randomColor(): string {
   );
 }
 
+// Ask the server which game room to join; without rooms the game is on this host
+async function gameSocketUrl(): Promise<string> {
+  const scheme = window.location.protocol === "https:" ? "wss" : "ws";
+  let host = window.location.host;
+  try {
+    const response = await fetch("/api/game/room", { credentials: "include" });
+    if (response.ok) {
+      const { room } = await response.json();
+      if (room && room.port) {
+        host = `${window.location.hostname}:${room.port}`;
+      }
+    }
+  } catch (error) {
+    console.error("Failed to pick a game room:", error);
+  }
+  return `${scheme}://${host}/ws/game?codec=binary`;
+}
+
 const lastFrameTimeRef = { current: 0 };
 const targetFPS = 60;
 
@@ -161,10 +209,7 @@ export default function Game() {
 
           // Initialize WebSocket connection only after we have the player ID
           if (location.pathname === "/game" && !wsRef.current) {
-            const scheme = window.location.protocol === "https:" ? "wss" : "ws";
-            const socket = new WebSocket(
-              `${scheme}://${window.location.host}/ws/game`
-            );
+            const socket = new WebSocket(await gameSocketUrl());
             wsRef.current = socket;
 
             initializeWebSocketHandlers(socket);
@@ -638,17 +683,10 @@ export default function Game() {
 
         const d = Math.hypot(f.x - newHead.x, f.y - newHead.y);
         if (d < snakeRadius * 1.6) {
+          // the server detects the same collision from our moves and
+          // broadcasts it, so there is nothing to report here
           f.active = false;
 
-          if (wsRef.current?.readyState === WebSocket.OPEN) {
-            wsRef.current.send(
-              JSON.stringify({
-                messageType: "eat_food",
-                food_id: f.id,
-              })
-            );
-          }
-
           // increment eat counter
           eatCountRef.current += 1;
           setScore(eatCountRef.current);
@@ -752,8 +790,7 @@ export default function Game() {
           lastSentPos.current = { x: head.x, y: head.y };
 
           wsRef.current.send(
-            JSON.stringify({
-              messageType: "move",
+            encodeMove({
               snake_x: head.x,
               snake_y: head.y,
               snake_color: snakeColorRef.current,
@@ -905,6 +942,9 @@ export default function Game() {
 
   // WebSocket handler initialization function
   const initializeWebSocketHandlers = (socket: WebSocket) => {
+    // Hot frames (move, world_snapshot) use the binary codec
+    socket.binaryType = "arraybuffer";
+
     socket.onopen = () => {
       console.log("WebSocket connection established");
       // Reset reconnect counter
@@ -931,7 +971,10 @@ export default function Game() {
     };
 
     socket.onmessage = (evt) => {
-      const data = JSON.parse(evt.data);
+      const data =
+        typeof evt.data === "string"
+          ? JSON.parse(evt.data)
+          : decodeFrame(evt.data);
 
       if (data.messageType === "init_location") {
         foodsRef.current = data.foods;
@@ -968,6 +1011,39 @@ export default function Game() {
         } else {
           otherPlayersRef.current.push(snake);
         }
+      } else if (data.messageType === "world_snapshot") {
+        // One batched frame per server tick with every nearby snake that moved
+        if (data.snakes && Array.isArray(data.snakes)) {
+          let needsResync = false;
+
+          data.snakes.forEach((snake: Snake | SnakeDelta) => {
+            if (playerIdRef.current && snake.id === playerIdRef.current) return;
+
+            const idx = otherPlayersRef.current.findIndex(
+              (p) => p.id === snake.id
+            );
+
+            if ("delta" in snake) {
+              // Deltas only apply on top of a snake we already know about
+              if (idx >= 0) {
+                otherPlayersRef.current[idx] = applySnakeDelta(
+                  otherPlayersRef.current[idx],
+                  snake
+                );
+              } else {
+                needsResync = true;
+              }
+            } else if (idx >= 0) {
+              otherPlayersRef.current[idx] = snake;
+            } else {
+              otherPlayersRef.current.push(snake);
+            }
+          });
+
+          if (needsResync) {
+            socket.send(JSON.stringify({ messageType: "resync" }));
+          }
+        }
       } else if (data.messageType === "snake_left") {
         const snake_id = data.snake_id;
         otherPlayersRef.current = otherPlayersRef.current.filter(
@@ -1014,13 +1090,21 @@ export default function Game() {
           foodsRef.current = [...foodsRef.current, ...data.food_particles];
         }
       } else if (data.messageType === "food_update") {
-        const foodId = data.food_id;
-        const isActive = data.active;
-
-        const foodIdx = foodsRef.current.findIndex((f) => f.id === foodId);
-        if (foodIdx >= 0) {
-          foodsRef.current[foodIdx].active = isActive;
-        }
+        // One batch per server tick; respawned foods carry their new position
+        const updates: { food_id: string; active: boolean; x?: number; y?: number }[] =
+          Array.isArray(data.updates)
+            ? data.updates
+            : [{ food_id: data.food_id, active: data.active }];
+
+        updates.forEach((update) => {
+          const food = foodsRef.current.find((f) => f.id === update.food_id);
+          if (!food) return;
+          food.active = update.active;
+          if (update.x !== undefined && update.y !== undefined) {
+            food.x = update.x;
+            food.y = update.y;
+          }
+        });
       } else if (data.messageType === "new_foods") {
         if (data.foods && Array.isArray(data.foods)) {
           foodsRef.current = [...foodsRef.current, ...data.foods];
@@ -1053,12 +1137,9 @@ export default function Game() {
         console.log(`Attempting to reconnect in ${delay}ms...`);
 
         reconnectCount.current += 1;
-        setTimeout(() => {
+        setTimeout(async () => {
           if (location.pathname === "/game") {
-            const scheme = window.location.protocol === "https:" ? "wss" : "ws";
-            const socket = new WebSocket(
-              `${scheme}://${window.location.host}/ws/game`
-            );
+            const socket = new WebSocket(await gameSocketUrl());
             wsRef.current = socket;
 
             initializeWebSocketHandlers(socket);
@@ -1,34 +1,134 @@
 import json
+import logging
+import math
 import threading
 import time
 import random
+import re
 import hashlib
+import collections
+import numpy as np
 import database as db
 from flask import request
+from backend.tools.spatial_grid import SpatialGrid
+from backend.tools.outbound_queue import OutboundQueue
+from backend.tools.snake_delta import build_snake_delta
+from backend.tools.snake_body import SnakeBody
+from backend.tools.snake_record import Snake
+from backend.tools.game_codec import get_codec
+from backend.tools.scheduler import Scheduler
+from backend.tools.food_store import FoodStore, foods_json, random_colors
+from backend.tools.leaderboard import Leaderboard
+from backend.tools.client_inbox import ClientInbox, InboxFull
 
-connections_lock = threading.RLock()
-snake_lock = threading.RLock()
-food_lock = threading.RLock()
+logger = logging.getLogger(__name__)
 
+# All game state below (connections, snakes, food, heartbeats, the
+# leaderboard) is owned by the scheduler thread and only touched from it:
+# the tick and other periodic jobs already run there, and receive loops and
+# send queues hand it their work with scheduler.call_soon instead of locking.
+# Other threads read the published_* snapshots.
 active_connections = {}
+# Snake records by connection id, updated in place
 snake_positions = {}
-food_state = {}
+food_state = FoodStore()
+food_rng = np.random.default_rng()
 last_food_sync = 0
 MAX_FOODS = 300
 WORLD_WIDTH = 2400
 WORLD_HEIGHT = 1600
 BORDER_THICKNESS = 20
-food_id_counter = 0
-food_spawn_thread = None
+food_spawn_job = None
+
+# Every deferred and periodic job (food spawns, heartbeats, ticks) and every
+# client message runs on this one thread
+scheduler = Scheduler("game-scheduler")
+FOOD_SPAWN_INTERVAL = 5.0
+FOOD_RESPAWN_DELAY = 1.0
+
+# Alive snakes ranked by score. The top entries are
+# broadcast at most once per tick, and only when they changed.
+LEADERBOARD_SIZE = 10
+leaderboard = Leaderboard(LEADERBOARD_SIZE)
+leaderboard_changed = False
+last_leaderboard = []
 
 last_heartbeat = {}
 HEARTBEAT_INTERVAL = 10
 HEARTBEAT_TIMEOUT = 30
 
+# Interest management: snake heads indexed by grid cell
+NEARBY_RADIUS = 1200
+GRID_CELL_SIZE = 400
+snake_grid = SpatialGrid(GRID_CELL_SIZE)
+
+# Snake updates are batched and flushed to nearby clients at a fixed rate
+TICK_RATE = 20
+TICK_INTERVAL = 1.0 / TICK_RATE
+dirty_snakes = set()
+tick_job = None
+tick_count = 0
+
+# Snapshots carry segment deltas against the snake's previous tick, with a full
+# keyframe at least every KEYFRAME_INTERVAL seconds
+KEYFRAME_INTERVAL = 3.0
+snake_broadcast_state = {}
+
+# Messages a connection may have waiting for the scheduler thread before it
+# is disconnected. A move or input waiting behind another of its type is
+# replaced rather than queued, since each carries the client's whole state.
+INBOX_LIMIT = 256
+MERGED_MESSAGES = {"move", "input"}
+
+# Every connection is written by its own OutboundQueue writer thread
+SEND_QUEUE_SIZE = 256
+SEND_QUEUE_HARD_LIMIT = 1024
+# Frames that may be shed when a client falls behind; everything else (player_died,
+# food updates, joins/leaves, the leaderboard) is always delivered
+DROPPABLE_MESSAGES = {"world_snapshot", "heartbeat"}
+# Frames where only the most recent queued one matters
+COALESCED_MESSAGES = {"leaderboard_update", "heartbeat"}
+
+# init_game_system runs once per process; shutdown_game_system stops new
+# connections and gives queued frames this long to go out
+game_system_lock = threading.Lock()
+game_system_started = False
+accepting_connections = True
+SHUTDOWN_DRAIN_TIMEOUT = 5.0
+
+# Food collisions are detected on the server each tick, along the path each head
+# moved since the previous tick. Eaten and respawned foods are sent out as one
+# batched food_update per tick.
+EAT_RADIUS = 24  # snakeRadius * 1.6, same as the client
+EAT_CLAIM_SLACK = 30  # eat_food claims from older clients may be this far behind the server's head
+MAX_HEAD_STEP = 200  # longer jumps (joins, respawns) are not swept
+snake_last_heads = {}
+pending_food_updates = []
+pending_respawns = collections.deque()
+
+# Server-simulated snakes (joined with "simulate": true) send only `input`
+# (heading, boost). The tick moves them like the browser client moves its
+# own snake, and their score and length come from the food the server saw
+# them eat.
+SNAKE_SPEED = 180.0  # 3 px per frame at 60 fps
+BOOST_MULTIPLIER = 2.0
+SEGMENT_SPACING = 24.0  # snakeRadius * 1.6
+SNAKE_RADIUS = 15
+FOODS_PER_SEGMENT = 5
+MAX_ADVANCE_STEP = 0.25  # seconds; a stalled tick does not teleport snakes
+MAX_SEGMENTS = 2000  # longest body a client may report in move or player_died
+DEATH_FOOD_COLOR = "#FF0000"
+COLOR_PATTERN = re.compile(r"#[0-9A-Fa-f]{6}")
+snake_bodies = {}
+snake_inputs = {}
+last_advance = None
+
+# Immutable views for other threads, replaced by the scheduler thread
+published_connections = ()
+published_status = {"players": 0, "snakes": 0}
+
 def generate_foods(count=100, min_x=BORDER_THICKNESS+20, max_x=WORLD_WIDTH-BORDER_THICKNESS-20, min_y=BORDER_THICKNESS+20, max_y=WORLD_HEIGHT-BORDER_THICKNESS-20):
-    food_items = {}
-    global food_id_counter
-    
+    """Add count foods to food_state, spread over a grid, and return them"""
     # Divide world into grid for even food distribution
     grid_size = 200  # Grid size
     grid_cols = (max_x - min_x) // grid_size
@@ -37,102 +137,68 @@ def generate_foods(count=100, min_x=BORDER_THICKNESS+20, max_x=WORLD_WIDTH-BORDE
     # Ensure enough grid cells for all food
     total_cells = grid_cols * grid_rows
     if total_cells < count:
-        grid_size = min(100, (max_x - min_x) // int((count)**0.5))
+        grid_size = max(1, min(100, (max_x - min_x) // int((count)**0.5)))
         grid_cols = (max_x - min_x) // grid_size
         grid_rows = (max_y - min_y) // grid_size
-    
-    # Place food randomly, but try to have at least one per grid cell
-    cells_with_food = set()
-    
-    for i in range(count):
-        food_id = str(food_id_counter)
-        food_id_counter += 1
-        
-        # Fill empty grid cells first
-        if len(cells_with_food) < grid_cols * grid_rows and len(cells_with_food) < count:
-            # Find a grid without food
-            while True:
-                grid_x = random.randint(0, grid_cols-1)
-                grid_y = random.randint(0, grid_rows-1)
-                cell_id = grid_y * grid_cols + grid_x
-                
-                if cell_id not in cells_with_food:
-                    cells_with_food.add(cell_id)
-                    break
-            
-            # Place food randomly within the chosen grid
-            x = min_x + grid_x * grid_size + random.uniform(10, grid_size-10)
-            y = min_y + grid_y * grid_size + random.uniform(10, grid_size-10)
-        else:
-            # If all grids have food, place completely randomly
-            x = random.uniform(min_x, max_x)
-            y = random.uniform(min_y, max_y)
-        
-        food_items[food_id] = {
-            "id": food_id,
-            "x": x,
-            "y": y,
-            "color": '#' + ''.join([random.choice('0123456789ABCDEF') for _ in range(6)]),
-            "active": True
-        }
-    return food_items
-
-def generate_food_from_segment(segment, color):
-    """Generate a food item from a snake segment"""
-    global food_id_counter
-    food_id = str(food_id_counter)
-    food_id_counter += 1
-    
-    return {
-        "id": food_id,
-        "x": segment["x"],
-        "y": segment["y"],
-        "color": color,
-        "active": True
-    }
+        total_cells = grid_cols * grid_rows
+    
+    # Fill empty grid cells first, one food per cell, then place the rest completely randomly
+    in_cells = min(count, total_cells)
+    cells = food_rng.choice(total_cells, size=in_cells, replace=False)
+    
+    xs = np.empty(count)
+    ys = np.empty(count)
+    xs[:in_cells] = min_x + (cells % grid_cols) * grid_size + food_rng.uniform(10, grid_size-10, in_cells)
+    ys[:in_cells] = min_y + (cells // grid_cols) * grid_size + food_rng.uniform(10, grid_size-10, in_cells)
+    xs[in_cells:] = food_rng.uniform(min_x, max_x, count - in_cells)
+    ys[in_cells:] = food_rng.uniform(min_y, max_y, count - in_cells)
+    colors = random_colors(food_rng, count)
+    
+    slots = food_state.add_many(xs, ys, colors)
+    return food_state.to_dicts(slots)
 
 def generate_leaderboard():
-    with snake_lock:
-        if not snake_positions:
-            return []
-        
-        leaderboard = []
-        for snake_id, snake_info in snake_positions.items():
-            # Only include alive snakes in the leaderboard
-            if snake_info.get("alive", True):
-                leaderboard.append({
-                    "id": snake_id,
-                    "name": snake_info.get("username", "Anonymous"),
-                    "score": snake_info.get("score", 0)
-                })
-    
-    leaderboard.sort(key=lambda x: x["score"], reverse=True)
-    
-    return leaderboard[:10]
+    return leaderboard.top()
+
+def update_leaderboard_entry(snake_id):
+    """Re-rank one snake after it changed"""
+    global leaderboard_changed
+    snake_info = snake_positions.get(snake_id)
+    
+    # Only include alive snakes in the leaderboard
+    if snake_info is None or not snake_info.alive:
+        changed = leaderboard.remove(snake_id)
+    else:
+        changed = leaderboard.update(snake_id, snake_info.username, snake_info.score)
+    
+    if changed:
+        leaderboard_changed = True
 
 def update_and_broadcast_leaderboard():
-    leaderboard = generate_leaderboard()
-    if not leaderboard:
+    """Broadcast the leaderboard if its visible entries changed since the last broadcast. Runs once per tick."""
+    global leaderboard_changed, last_leaderboard
+    if not leaderboard_changed:
+        return
+    leaderboard_changed = False
+    current_leaderboard = leaderboard.top()
+    
+    if current_leaderboard == last_leaderboard:
         return
+    last_leaderboard = current_leaderboard
     
     broadcast_to_all({
         "messageType": "leaderboard_update",
-        "leaderboard": leaderboard
+        "leaderboard": current_leaderboard
     })
 
 def spawn_new_foods():
     try:
         new_foods_list = []
-        with food_lock:
-            active_food_count = sum(1 for food in food_state.values() if food["active"])
-            
-            if active_food_count < MAX_FOODS * 0.8:
-                new_foods_count = min(30, MAX_FOODS - active_food_count)
-                new_foods = generate_foods(new_foods_count)
-                
-                food_state.update(new_foods)
-                
-                new_foods_list = list(new_foods.values())
+        active_food_count = food_state.active_count()
+        
+        if active_food_count < MAX_FOODS * 0.8:
+            new_foods_count = min(30, MAX_FOODS - active_food_count)
+            new_foods_list = generate_foods(new_foods_count)
         
         if new_foods_list:
             broadcast_to_all({
@@ -141,62 +207,139 @@ def spawn_new_foods():
             })
     except Exception as e:
         pass
-    
-    global food_spawn_thread
-    food_spawn_thread = threading.Timer(5.0, spawn_new_foods)
-    food_spawn_thread.daemon = True
-    food_spawn_thread.start()
 
-def start_food_spawn_thread():
-    global food_spawn_thread
-    if food_spawn_thread is None:
-        food_spawn_thread = threading.Timer(10.0, spawn_new_foods)
-        food_spawn_thread.daemon = True
-        food_spawn_thread.start()
+def start_food_spawner():
+    """Start spawning food if it has not started yet; safe from any thread"""
+    scheduler.call_soon(ensure_food_spawner)
+
+def ensure_food_spawner():
+    global food_spawn_job
+    if food_spawn_job is None:
+        food_spawn_job = scheduler.call_every(FOOD_SPAWN_INTERVAL, spawn_new_foods, first_delay=10.0)
+
+def encode_message(message):
+    return json.dumps(message)
+
+def drop_connection(client_id, client_queue):
+    """Disconnect a client whose queue failed or closed, unless it has already reconnected"""
+    if active_connections.get(client_id) is client_queue:
+        disconnect_client(client_id)
+
+def create_send_queue(client_id, ws, username, codec, queue_class=OutboundQueue, **queue_options):
+    def on_failure(client_queue):
+        # Called from the queue's writer
+        scheduler.call_soon(drop_connection, client_id, client_queue)
+    
+    return queue_class(
+        ws,
+        **queue_options,
+        label=username,
+        max_size=SEND_QUEUE_SIZE,
+        hard_limit=SEND_QUEUE_HARD_LIMIT,
+        droppable=DROPPABLE_MESSAGES,
+        coalesce=COALESCED_MESSAGES,
+        encode=codec.encode,
+        on_error=on_failure,
+        on_overflow=on_failure
+    )
+
+def publish_connections():
+    global published_connections
+    published_connections = tuple(active_connections.items())
+
+def publish_status():
+    global published_status
+    published_status = {"players": len(active_connections), "snakes": len(snake_positions)}
+
+def get_game_status():
+    """Load of this process's game world, polled by the room router"""
+    return {**published_status, "commands": scheduler.backlog()}
+
+def get_send_queue_metrics():
+    """Per-connection queue depth and drop counters, deepest queue first"""
+    metrics = [client_queue.stats() for _, client_queue in published_connections]
+    metrics.sort(key=lambda m: m["depth"], reverse=True)
+    return metrics
+
+def broadcast_payload(payload, message_type, exclude_id=None):
+    """Queue an already encoded message for every connection in one pass over active_connections"""
+    for client_id, client_queue in active_connections.items():
+        if client_id != exclude_id:
+            client_queue.put(payload, message_type)
 
 def broadcast_to_all(message, exclude_id=None):
-    with connections_lock:
-        client_ids = list(active_connections.keys())
-    
-    for client_id in client_ids:
-        if exclude_id is None or client_id != exclude_id:
-            try:
-                with connections_lock:
-                    if client_id in active_connections:
-                        client_ws = active_connections[client_id]
-                        client_ws.send(json.dumps(message))
-            except Exception as e:
-                disconnect_client(client_id)
-
-def broadcast_food_update(food_id, is_active):
-    broadcast_to_all({
-        "messageType": "food_update",
-        "food_id": food_id,
-        "active": is_active
-    })
+    broadcast_payload(encode_message(message), message["messageType"], exclude_id)
+
+def consume_food(food_id):
+    """Mark a food eaten and queue its update and respawn"""
+    if not food_state.deactivate(food_id):
+        return False
+    
+    pending_food_updates.append({"food_id": food_id, "active": False})
+    if food_state.respawns_after_eaten(food_id):
+        pending_respawns.append((time.monotonic() + FOOD_RESPAWN_DELAY, food_id))
+    else:
+        food_state.release(food_id)
+    return True
+
+def respawn_food(food_id):
+    # Randomly select a region to respawn food, increasing the probability in nearby regions
+    possible_regions = []
+    
+    # Add all regions, but give higher weight to border regions
+    for area_x in range(4):
+        for area_y in range(4):
+            weight = 1
+            if area_x == 0 or area_x == 3 or area_y == 0 or area_y == 3:
+                weight = 3  # Higher weight for border regions
+            
+            for _ in range(weight):
+                possible_regions.append((area_x, area_y))
+    
+    # Randomly select a region
+    region = random.choice(possible_regions)
+    region_x, region_y = region
+    
+    # Calculate the boundaries of the selected region
+    region_width = WORLD_WIDTH / 4
+    region_height = WORLD_HEIGHT / 4
+    
+    min_x = BORDER_THICKNESS + 20 + region_x * region_width
+    max_x = min_x + region_width - 40
+    min_y = BORDER_THICKNESS + 20 + region_y * region_height
+    max_y = min_y + region_height - 40
+    
+    # Place food randomly within the selected region
+    x = random.uniform(min_x, max_x)
+    y = random.uniform(min_y, max_y)
+    if food_state.activate(food_id, x, y):
+        pending_food_updates.append({"food_id": food_id, "active": True, "x": x, "y": y})
 
 def handle_player_death(snake_id, segments, color):
     """Handle a player's death, turn segments into food"""
-    with snake_lock:
-        if snake_id not in snake_positions:
-            return
-            
-        # Check if player is already marked as dead to avoid duplicate processing
-        if not snake_positions[snake_id].get("alive", True):
-            return
+    if snake_id not in snake_positions:
+        return
         
-        # Mark snake as dead in snake_positions
-        snake_positions[snake_id]["alive"] = False
+    # Check if player is already marked as dead to avoid duplicate processing
+    if not snake_positions[snake_id].alive:
+        return
+    
+    # Mark snake as dead in snake_positions
+    snake_positions[snake_id].alive = False
+    update_leaderboard_entry(snake_id)
+    if snake_id in snake_bodies:
+        # The server's body, not whatever the client reported
+        segments = snake_positions[snake_id].segments
     
     # Convert some segments to food particles
     food_particles = []
     if segments and len(segments) > 0:
-        # Convert every third segment to a food particle
-        for i in range(0, len(segments), 3):
-            new_food = generate_food_from_segment(segments[i], color)
-            with food_lock:
-                food_state[new_food["id"]] = new_food
-            food_particles.append(new_food)
+        # Convert every third segment to a food particle; these are not respawned once eaten
+        particle_segments = segments[::3]
+        xs = np.array([segment["x"] for segment in particle_segments], dtype=np.float64)
+        ys = np.array([segment["y"] for segment in particle_segments], dtype=np.float64)
+        slots = food_state.add_many(xs, ys, color, respawns=False)
+        food_particles = food_state.to_dicts(slots)
     
     # Notify all clients about the death
     broadcast_to_all({
@@ -204,333 +347,530 @@ def handle_player_death(snake_id, segments, color):
         "snake_id": snake_id,
         "food_particles": food_particles
     })
-    
-    # Update leaderboard since this player is now "dead"
-    update_and_broadcast_leaderboard()
 
-def send_full_state(ws):
-    with snake_lock:
-        snakes_data = []
-        for snake_id, snake_info in snake_positions.items():
-            snakes_data.append(snake_info)
+def encode_init_location(snakes_data, food_fields):
+    """init_location as encode_message would write it, with the foods formatted straight from their arrays"""
+    head = encode_message({"messageType": "init_location", "snakes": snakes_data})
+    return head[:-1] + ', "foods": ' + foods_json(*food_fields) + "}"
+
+def send_full_state(client_id):
+    client_queue = active_connections.get(client_id)
+    if client_queue is None:
+        return
     
-    with food_lock:
-        foods_data = []
-        for food_id, food_info in food_state.items():
-            if food_info["active"]:
-                foods_data.append(food_info)
+    snakes_data = []
+    for snake_id, snake_info in snake_positions.items():
+        snakes_data.append(snake_info.to_dict())
     
-    ws.send(json.dumps({
-        "messageType": "init_location",
-        "snakes": snakes_data,
-        "foods": foods_data
-    }))
+    # With tens of thousands of foods the text takes far longer than the tick,
+    # so only the arrays are copied here and the connection's writer encodes it
+    food_fields = food_state.active_fields()
+    client_queue.put(lambda: encode_init_location(snakes_data, food_fields), "init_location")
     
     leaderboard = generate_leaderboard()
-    ws.send(json.dumps({
+    send_to_client(client_id, {
         "messageType": "leaderboard_update",
         "leaderboard": leaderboard
-    }))
+    })
 
-with food_lock:
-    food_state = generate_foods(MAX_FOODS)
+generate_foods(MAX_FOODS)
 
 def check_heartbeats():
     current_time = time.time()
     disconnected_clients = []
     
-    with connections_lock:
-        for client_id, _ in active_connections.items():
-            if client_id in last_heartbeat:
-                if current_time - last_heartbeat[client_id] > HEARTBEAT_TIMEOUT:
-                    disconnected_clients.append(client_id)
+    for client_id, _ in active_connections.items():
+        if client_id in last_heartbeat:
+            if current_time - last_heartbeat[client_id] > HEARTBEAT_TIMEOUT:
+                disconnected_clients.append(client_id)
     
     for client_id in disconnected_clients:
         disconnect_client(client_id)
-    
-    heartbeat_thread = threading.Timer(HEARTBEAT_INTERVAL, check_heartbeats)
-    heartbeat_thread.daemon = True
-    heartbeat_thread.start()
 
 def disconnect_client(client_id):
     """Clean up resources for a disconnected client"""
-    with connections_lock:
-        if client_id in active_connections:
-            try:
-                active_connections[client_id].close()
-            except:
-                pass
-            del active_connections[client_id]
+    if client_id in active_connections:
+        try:
+            active_connections[client_id].close()
+        except:
+            pass
+        del active_connections[client_id]
+        publish_connections()
     
     # Only clean up snake if long disconnect
     # Check disconnect time
-    with snake_lock:
-        if client_id in snake_positions:
-            broadcast_to_all({
-                "messageType": "snake_left",
-                "snake_id": client_id
-            })
-            del snake_positions[client_id]
+    if client_id in snake_positions:
+        broadcast_to_all({
+            "messageType": "snake_left",
+            "snake_id": client_id
+        })
+        del snake_positions[client_id]
+    update_leaderboard_entry(client_id)
+    snake_grid.remove(client_id)
+    dirty_snakes.discard(client_id)
+    snake_broadcast_state.pop(client_id, None)
+    snake_last_heads.pop(client_id, None)
+    snake_bodies.pop(client_id, None)
+    snake_inputs.pop(client_id, None)
     
     # Remove from heartbeat records
     if client_id in last_heartbeat:
         del last_heartbeat[client_id]
 
-def broadcast_to_nearby(message, sender_pos, radius=1200, exclude_id=None):
-    with snake_lock:
-        nearby_clients = []
-        for client_id, snake in snake_positions.items():
-            if client_id != exclude_id:
-                dx = sender_pos["x"] - snake["x"]
-                dy = sender_pos["y"] - snake["y"]
-                dist = (dx**2 + dy**2)**0.5
-                if dist <= radius:
-                    nearby_clients.append(client_id)
-    
-    for client_id in nearby_clients:
+def send_to_client(client_id, message):
+    client_queue = active_connections.get(client_id)
+    if client_queue is not None:
+        client_queue.put(encode_message(message), message["messageType"])
+
+def collect_world_snapshots():
+    """Group the snakes that changed since the last tick by the clients near them"""
+    global tick_count
+    snapshots = {}
+    current_time = time.time()
+    tick_count += 1
+    for snake_id in dirty_snakes:
+        snake = snake_positions.get(snake_id)
+        if snake is None:
+            continue
+        
+        # One broken snake must not stop the tick for everyone else
         try:
-            with connections_lock:
-                if client_id in active_connections:
-                    client_ws = active_connections[client_id]
-                    client_ws.send(json.dumps(message))
-        except Exception as e:
-            disconnect_client(client_id)
+            # The one wire view of this snake for this tick, shared by every recipient
+            full = snake.to_dict()
+            base_tick, last_segments, keyframe_time = snake_broadcast_state.get(snake_id, (None, None, 0))
+            delta = None
+            if base_tick is not None and current_time - keyframe_time < KEYFRAME_INTERVAL:
+                delta = build_snake_delta(full, last_segments)
+            if delta is None:
+                base_tick = None
+                keyframe_time = current_time
+            snake_broadcast_state[snake_id] = (tick_count, snake.segments, keyframe_time)
+            
+            entry = (snake_id, base_tick, tick_count, full, delta)
+            for client_id in snake_grid.query_radius(snake.x, snake.y, NEARBY_RADIUS, snake_id):
+                snapshots.setdefault(client_id, []).append(entry)
+            if snake_id in snake_bodies:
+                # Only the server knows where a simulated snake is, its owner included
+                snapshots.setdefault(snake_id, []).append(entry)
+        except Exception:
+            logger.exception("Snapshot of snake %s failed", snake_id)
+    
+    dirty_snakes.clear()
+    
+    return snapshots
 
-def handle_game_websocket(ws):
-    start_food_spawn_thread()
-    
-    if "auth_token" not in request.cookies:
-        ws.close(1008, "Not authenticated")
+def detect_food_collisions():
+    """Eat every active food within EAT_RADIUS of the path a head moved along since the last tick"""
+    reached = []
+    for snake_id in dirty_snakes:
+        snake = snake_positions.get(snake_id)
+        if snake is None or not snake.alive:
+            continue
+        
+        head = (snake.x, snake.y)
+        last_head = snake_last_heads.get(snake_id, head)
+        # One broken snake must not stop the tick for everyone else
+        try:
+            if abs(head[0] - last_head[0]) + abs(head[1] - last_head[1]) > MAX_HEAD_STEP:
+                last_head = head
+            food_ids = food_state.ids_near_segment(last_head[0], last_head[1], head[0], head[1], EAT_RADIUS)
+        except Exception:
+            logger.exception("Food collisions of snake %s failed", snake_id)
+            continue
+        snake_last_heads[snake_id] = head
+        reached.append((snake_id, food_ids))
+    
+    if not reached:
         return
     
-    auth_token = request.cookies["auth_token"]
-    hashed_auth = hashlib.sha256(auth_token.encode("utf-8")).hexdigest().encode("utf-8")
-    user = db.user_collection.find_one({"token": hashed_auth})
+    eaten = {}
+    for snake_id, food_ids in reached:
+        for food_id in food_ids:
+            # Two snakes may reach the same food; the first one eats it
+            if consume_food(food_id):
+                eaten[snake_id] = eaten.get(snake_id, 0) + 1
     
-    if not user:
-        ws.close(1008, "User not found")
+    credit_eaten_food(eaten)
+
+def credit_eaten_food(eaten):
+    """Score and grow simulated snakes; clients that send `move` report their own score"""
+    for snake_id, count in eaten.items():
+        snake = snake_positions.get(snake_id)
+        if snake is None or snake_id not in snake_bodies:
+            continue
+        snake.score += count
+        snake.length = 1 + snake.score // FOODS_PER_SEGMENT
+        update_leaderboard_entry(snake_id)
+
+def flush_food_updates():
+    """Respawn foods that are due and broadcast this tick's food changes as one food_update"""
+    now = time.monotonic()
+    while pending_respawns and pending_respawns[0][0] <= now:
+        _, food_id = pending_respawns.popleft()
+        respawn_food(food_id)
+    
+    if not pending_food_updates:
         return
+    updates = pending_food_updates[:]
+    pending_food_updates.clear()
     
-    conn_id = auth_token
+    broadcast_to_all({
+        "messageType": "food_update",
+        "updates": updates
+    })
+
+def advance_snakes():
+    """Move every simulated snake along its input heading for the time since the last tick"""
+    global last_advance
+    now = time.monotonic()
+    elapsed = TICK_INTERVAL if last_advance is None else min(now - last_advance, MAX_ADVANCE_STEP)
+    last_advance = now
+    
+    min_x, max_x = BORDER_THICKNESS + SNAKE_RADIUS, WORLD_WIDTH - BORDER_THICKNESS - SNAKE_RADIUS
+    min_y, max_y = BORDER_THICKNESS + SNAKE_RADIUS, WORLD_HEIGHT - BORDER_THICKNESS - SNAKE_RADIUS
+    for snake_id, body in snake_bodies.items():
+        snake = snake_positions.get(snake_id)
+        if snake is None or not snake.alive:
+            continue
+        
+        try:
+            heading, boost = snake_inputs.get(snake_id, (0.0, False))
+            step = SNAKE_SPEED * (BOOST_MULTIPLIER if boost else 1.0) * elapsed
+            x = min(max_x, max(min_x, snake.x + math.cos(heading) * step))
+            y = min(max_y, max(min_y, snake.y + math.sin(heading) * step))
+            body.move_head(x, y, SEGMENT_SPACING)
+            body.trim(snake.length)
+            
+            snake.x = x
+            snake.y = y
+            # A new list each time: snapshots already queued keep the old one
+            snake.segments = body.points()
+            snake_grid.update(snake_id, x, y)
+            dirty_snakes.add(snake_id)
+        except Exception:
+            logger.exception("Moving snake %s failed", snake_id)
+
+def start_simulation(conn_id, snake, heading):
+    """Make conn_id's snake server-simulated from its current head"""
+    snake_bodies[conn_id] = SnakeBody(snake.x, snake.y)
+    snake_inputs[conn_id] = (heading, False)
+    snake.segments = snake_bodies[conn_id].points()
+
+def read_number(data, key, default):
+    """data[key] (default if missing) when it is a finite number, else None"""
+    value = data.get(key, default)
+    if not isinstance(value, (int, float)):
+        return None
+    try:
+        if not math.isfinite(value):
+            return None
+    except OverflowError:
+        # An int too large for a float
+        return None
+    return value
+
+def read_segments(data):
+    """data["segments"] as a new list of finite {x, y} points, or None if it is not one"""
+    segments = data.get("segments", [])
+    if not isinstance(segments, list) or len(segments) > MAX_SEGMENTS:
+        return None
+    points = []
+    for segment in segments:
+        if not isinstance(segment, dict):
+            return None
+        x = read_number(segment, "x", None)
+        y = read_number(segment, "y", None)
+        if x is None or y is None:
+            return None
+        points.append({"x": x, "y": y})
+    return points
+
+def read_color(data, key, default):
+    """data[key] if it is a '#RRGGBB' color, else default"""
+    color = data.get(key)
+    if isinstance(color, str) and COLOR_PATTERN.fullmatch(color):
+        return color
+    return default
+
+def read_heading(data):
+    """data["heading"] in radians, 0.0 unless it is a finite number"""
+    heading = read_number(data, "heading", 0.0)
+    if heading is None:
+        return 0.0
+    return float(heading)
+
+def run_tick():
+    advance_snakes()
+    detect_food_collisions()
+    flush_food_updates()
+    broadcast_world_snapshots()
+    update_and_broadcast_leaderboard()
+    publish_status()
+
+def broadcast_world_snapshots():
+    snapshots = collect_world_snapshots()
     
+    for client_id, entries in snapshots.items():
+        client_queue = active_connections.get(client_id)
+        if client_queue is not None:
+            client_queue.put_snapshot(entries)
+
+def start_tick_loop():
+    """Start the tick if it is not running yet; safe from any thread"""
+    scheduler.call_soon(ensure_tick_loop)
+
+def ensure_tick_loop():
+    global tick_job
+    if tick_job is None:
+        tick_job = scheduler.call_every(TICK_INTERVAL, run_tick)
+
+def authenticate_game_user(auth_token):
+    """The user owning an auth_token cookie, or None"""
+    if not auth_token:
+        return None
+    hashed_auth = hashlib.sha256(auth_token.encode("utf-8")).hexdigest().encode("utf-8")
+    return db.find_user_by_token(hashed_auth)
+
+def open_game_session(conn_id, client_queue):
+    """Have the scheduler thread register a connection and send it the current world. Returns its heartbeat job."""
+    scheduler.call_soon(register_connection, conn_id, client_queue)
+    return scheduler.call_every(HEARTBEAT_INTERVAL, send_to_client, conn_id, {"messageType": "heartbeat"})
+
+def register_connection(conn_id, client_queue):
     # Check if there's an existing connection for this user, clean it up first
-    with connections_lock:
-        if conn_id in active_connections:
-            old_ws = active_connections[conn_id]
-            try:
-                old_ws.close(1000, "Replaced by new connection")
-            except:
-                pass
-            # Don't remove from active_connections yet, we'll replace it
+    if conn_id in active_connections:
+        old_ws = active_connections[conn_id]
+        try:
+            old_ws.close(1000, "Replaced by new connection")
+        except:
+            pass
+        # Don't remove from active_connections yet, we'll replace it
     
     # Now safely set the new connection
-    with connections_lock:
-        active_connections[conn_id] = ws
+    active_connections[conn_id] = client_queue
+    publish_connections()
     
     # Initialize heartbeat time
     last_heartbeat[conn_id] = time.time()
     
-    global food_state, last_food_sync
-    with food_lock:
-        if not food_state or (time.time() - last_food_sync > 3600):
-            food_state = generate_foods(MAX_FOODS)
-            last_food_sync = time.time()
+    global last_food_sync
+    if len(food_state) == 0 or (time.time() - last_food_sync > 3600):
+        food_state.clear()
+        generate_foods(MAX_FOODS)
+        last_food_sync = time.time()
     
+    send_full_state(conn_id)
+
+def close_game_session(conn_id, client_queue, heartbeat_job=None):
+    if heartbeat_job is not None:
+        heartbeat_job.cancel()
+    # A newer connection for the same user keeps its snake
+    scheduler.call_soon(drop_connection, conn_id, client_queue)
+
+def create_inbox():
+    return ClientInbox(INBOX_LIMIT, MERGED_MESSAGES)
+
+def handle_game_message(conn_id, user, data, inbox):
+    """Queue one decoded client message for the scheduler thread. Shared by the Flask and asyncio websocket servers.
+
+    Returns False if the client has too many messages waiting; the caller closes the connection.
+    """
     try:
-        send_full_state(ws)
+        cell = inbox.add(data.get("messageType"), data)
+    except InboxFull:
+        return False
+    if cell is not None:
+        scheduler.call_soon(apply_inbox_message, conn_id, user, inbox, cell)
+    return True
+
+def apply_inbox_message(conn_id, user, inbox, cell):
+    apply_game_message(conn_id, user, inbox.take(cell))
+
+def apply_game_message(conn_id, user, data):
+    last_heartbeat[conn_id] = time.time()
+    message_type = data.get("messageType")
+    
+    if message_type == "heartbeat_response":
+        return
+    
+    elif message_type == "resync":
+        # Client lost track of a snake; send full keyframes from now on
+        client_queue = active_connections.get(conn_id)
+        if client_queue is not None:
+            client_queue.resync()
+    
+    elif message_type == "join":
+        snake_color = data.get("snake_color")
+        username = data.get("username", user.get("username", "Anonymous"))
+        snake_x = read_number(data, "snake_x", 0)
+        snake_y = read_number(data, "snake_y", 0)
+        alive = data.get("alive", True)
+        heading = read_heading(data)
+        if snake_x is None or snake_y is None:
+            return
+        
+        snake_positions[conn_id] = Snake(conn_id, snake_x, snake_y, snake_color, username, alive=alive)
+        snake_grid.update(conn_id, snake_x, snake_y)
+        snake_broadcast_state.pop(conn_id, None)
+        snake_last_heads.pop(conn_id, None)
+        if data.get("simulate"):
+            start_simulation(conn_id, snake_positions[conn_id], heading)
+        else:
+            snake_bodies.pop(conn_id, None)
+            snake_inputs.pop(conn_id, None)
+        update_leaderboard_entry(conn_id)
+        
+        broadcast_to_all({
+            "messageType": "snake_joined",
+            "snake": snake_positions[conn_id].to_dict()
+        }, conn_id)
         
-        def send_heartbeat():
-            try:
-                if conn_id in active_connections:
-                    ws.send(json.dumps({"messageType": "heartbeat"}))
-                    threading.Timer(HEARTBEAT_INTERVAL, send_heartbeat).start()
-            except:
-                pass
+        send_to_client(conn_id, {
+            "messageType": "leaderboard_update",
+            "leaderboard": generate_leaderboard()
+        })
+    
+    elif message_type == "input":
+        if conn_id in snake_bodies:
+            snake_inputs[conn_id] = (read_heading(data), bool(data.get("boost", False)))
+    
+    elif message_type == "move":
+        if conn_id in snake_bodies:
+            # The server moves simulated snakes; their reported bodies are ignored
+            return
+        snake_color = data.get("snake_color")
+        username = data.get("username", user.get("username", "Anonymous"))
+        snake_x = read_number(data, "snake_x", 0)
+        snake_y = read_number(data, "snake_y", 0)
+        segments = read_segments(data)
+        score = read_number(data, "score", 0)
+        length = read_number(data, "length", 1)
+        alive = data.get("alive", True)
+        # Rejected before anything is stored; a bad head would break the tick's grid and collision
+        # queries, and a bad segment every snapshot frame the snake is in
+        if snake_x is None or snake_y is None or score is None or length is None or segments is None:
+            return
+        
+        snake = snake_positions.get(conn_id)
+        if snake is None:
+            snake_positions[conn_id] = Snake(conn_id, snake_x, snake_y, snake_color, username, segments, length, score, alive)
+        else:
+            snake.move(snake_x, snake_y, snake_color, username, segments, length, score, alive)
+        snake_grid.update(conn_id, snake_x, snake_y)
+        dirty_snakes.add(conn_id)
+        update_leaderboard_entry(conn_id)
+    
+    elif message_type == "player_died":
+        snake_id = data.get("snake_id")
+        segments = read_segments(data)
+        color = read_color(data, "color", DEATH_FOOD_COLOR)
+        if segments is None:
+            return
         
-        # 启动心跳发送
-        send_heartbeat_thread = threading.Timer(HEARTBEAT_INTERVAL, send_heartbeat)
-        send_heartbeat_thread.daemon = True
-        send_heartbeat_thread.start()
+        handle_player_death(snake_id, segments, color)
+    
+    elif message_type == "respawn":
+        snake_color = data.get("snake_color")
+        username = data.get("username", user.get("username", "Anonymous"))
+        snake_x = read_number(data, "snake_x", 0)
+        snake_y = read_number(data, "snake_y", 0)
+        heading = read_heading(data)
+        if snake_x is None or snake_y is None:
+            return
+        
+        # Create or update snake after respawn
+        snake_positions[conn_id] = Snake(conn_id, snake_x, snake_y, snake_color, username)
+        snake_grid.update(conn_id, snake_x, snake_y)
+        snake_broadcast_state.pop(conn_id, None)
+        snake_last_heads.pop(conn_id, None)
+        if conn_id in snake_bodies or data.get("simulate"):
+            start_simulation(conn_id, snake_positions[conn_id], heading)
+        update_leaderboard_entry(conn_id)
+        current_snake = snake_positions[conn_id].to_dict()
+        
+        broadcast_to_all({
+            "messageType": "snake_joined",
+            "snake": current_snake
+        }, conn_id)
+    
+    elif message_type == "eat_food":
+        # Collisions are found by the tick; claims from older clients are
+        # only honoured when the food is actually next to the snake's head
+        food_id = data.get("food_id")
+        snake = snake_positions.get(conn_id)
+        # Simulated snakes are only ever credited by the tick
+        simulated = conn_id in snake_bodies
+        head = (snake.x, snake.y) if snake and snake.alive and not simulated else None
+        
+        if head is not None:
+            position = food_state.position(food_id)
+            if position is not None and (position[0] - head[0]) ** 2 + (position[1] - head[1]) ** 2 <= (EAT_RADIUS + EAT_CLAIM_SLACK) ** 2:
+                consume_food(food_id)
+
+def handle_game_websocket(ws):
+    if not accepting_connections:
+        ws.close(1001, "Server shutting down")
+        return
+    
+    start_food_spawner()
+    start_tick_loop()
+    
+    if "auth_token" not in request.cookies:
+        ws.close(1008, "Not authenticated")
+        return
+    
+    auth_token = request.cookies["auth_token"]
+    user = authenticate_game_user(auth_token)
+    
+    if not user:
+        ws.close(1008, "User not found")
+        return
+    
+    conn_id = auth_token
+    # Wire format is picked by the client in the handshake (/ws/game?codec=binary)
+    codec = get_codec(request.args.get("codec"))
+    
+    client_queue = create_send_queue(conn_id, ws, user.get("username", "Anonymous"), codec)
+    inbox = create_inbox()
+    heartbeat_job = None
+    try:
+        heartbeat_job = open_game_session(conn_id, client_queue)
         
         while True:
             message = ws.receive()
             if message is None:
                 break
-                
-            last_heartbeat[conn_id] = time.time()
-            
-            data = json.loads(message)
-            message_type = data.get("messageType")
-            
-            if message_type == "heartbeat_response":
-                continue
             
-            elif message_type == "join":
-                snake_color = data.get("snake_color")
-                username = data.get("username", user.get("username", "Anonymous"))
-                snake_x = data.get("snake_x", 0)
-                snake_y = data.get("snake_y", 0)
-                alive = data.get("alive", True)
-                
-                with snake_lock:
-                    snake_positions[conn_id] = {
-                        "id": conn_id,
-                        "x": snake_x,
-                        "y": snake_y,
-                        "color": snake_color,
-                        "username": username,
-                        "length": 1,
-                        "segments": [],
-                        "score": 0,
-                        "alive": alive
-                    }
-                
-                broadcast_to_all({
-                    "messageType": "snake_joined",
-                    "snake": snake_positions[conn_id]
-                }, conn_id)
-                
-                update_and_broadcast_leaderboard()
-                
-                leaderboard = generate_leaderboard()
-                ws.send(json.dumps({
-                    "messageType": "leaderboard_update",
-                    "leaderboard": leaderboard
-                }))
-            
-            elif message_type == "move":
-                snake_color = data.get("snake_color")
-                username = data.get("username", user.get("username", "Anonymous"))
-                snake_x = data.get("snake_x", 0)
-                snake_y = data.get("snake_y", 0)
-                segments = data.get("segments", [])
-                score = data.get("score", 0)
-                length = data.get("length", 1)
-                alive = data.get("alive", True)
-                
-                # Check if score changed
-                score_changed = False
-                with snake_lock:
-                    if conn_id in snake_positions:
-                        old_score = snake_positions[conn_id].get("score", 0)
-                        score_changed = score > old_score
-                
-                    snake_positions[conn_id] = {
-                        "id": conn_id,
-                        "x": snake_x,
-                        "y": snake_y,
-                        "color": snake_color,
-                        "username": username,
-                        "segments": segments,
-                        "length": length,
-                        "score": score,
-                        "alive": alive
-                    }
-                    current_snake = snake_positions[conn_id].copy()
-                
-                broadcast_to_nearby({
-                    "messageType": "snake_update",
-                    "snake": current_snake
-                }, {"x": snake_x, "y": snake_y}, radius=1200, exclude_id=conn_id)
-                
-                # Update leaderboard if score changed
-                if score_changed:
-                    update_and_broadcast_leaderboard()
-            
-            elif message_type == "player_died":
-                snake_id = data.get("snake_id")
-                segments = data.get("segments", [])
-                color = data.get("color", "#FF0000")
-                
-                handle_player_death(snake_id, segments, color)
-            
-            elif message_type == "respawn":
-                snake_color = data.get("snake_color")
-                username = data.get("username", user.get("username", "Anonymous"))
-                snake_x = data.get("snake_x", 0)
-                snake_y = data.get("snake_y", 0)
-                
-                with snake_lock:
-                    # Create or update snake after respawn
-                    snake_positions[conn_id] = {
-                        "id": conn_id,
-                        "x": snake_x,
-                        "y": snake_y,
-                        "color": snake_color,
-                        "username": username,
-                        "segments": [],
-                        "length": 1,
-                        "score": 0,
-                        "alive": True
-                    }
-                    current_snake = snake_positions[conn_id].copy()
-                
-                broadcast_to_all({
-                    "messageType": "snake_joined",
-                    "snake": current_snake
-                }, conn_id)
-                
-                update_and_broadcast_leaderboard()
-            
-            elif message_type == "eat_food":
-                food_id = data.get("food_id")
-                with food_lock:
-                    if food_id in food_state and food_state[food_id]["active"]:
-                        food_state[food_id]["active"] = False
-                        broadcast_food_update(food_id, False)
-                        
-                        def respawn_food():
-                            with food_lock:
-                                if food_id in food_state:
-                                    # Randomly select a region to respawn food, increasing the probability in nearby regions
-                                    possible_regions = []
-                                    
-                                    # Add all regions, but give higher weight to border regions
-                                    for area_x in range(4):
-                                        for area_y in range(4):
-                                            weight = 1
-                                            if area_x == 0 or area_x == 3 or area_y == 0 or area_y == 3:
-                                                weight = 3  # Higher weight for border regions
-                                            
-                                            for _ in range(weight):
-                                                possible_regions.append((area_x, area_y))
-                                    
-                                    # Randomly select a region
-                                    region = random.choice(possible_regions)
-                                    region_x, region_y = region
-                                    
-                                    # Calculate the boundaries of the selected region
-                                    region_width = WORLD_WIDTH / 4
-                                    region_height = WORLD_HEIGHT / 4
-                                    
-                                    min_x = BORDER_THICKNESS + 20 + region_x * region_width
-                                    max_x = min_x + region_width - 40
-                                    min_y = BORDER_THICKNESS + 20 + region_y * region_height
-                                    max_y = min_y + region_height - 40
-                                    
-                                    # Place food randomly within the selected region
-                                    food_state[food_id]["x"] = random.uniform(min_x, max_x)
-                                    food_state[food_id]["y"] = random.uniform(min_y, max_y)
-                                    food_state[food_id]["active"] = True
-                            
-                            broadcast_food_update(food_id, True)
-                        
-                        respawn_thread = threading.Timer(1.0, respawn_food)  # Reduced to 1 second
-                        respawn_thread.daemon = True
-                        respawn_thread.start()
+            if not handle_game_message(conn_id, user, codec.decode(message), inbox):
+                client_queue.close(1008, "Too many messages")
+                break
     
     except Exception as e:
         pass
     finally:
-        disconnect_client(conn_id)
+        close_game_session(conn_id, client_queue, heartbeat_job)
 
 def init_game_system():
-    # Set up periodic leaderboard updates
-    def schedule_leaderboard_updates():
-        update_and_broadcast_leaderboard()
-        threading.Timer(5.0, schedule_leaderboard_updates).start()
+    """Start the tick, food spawner and heartbeat checks. Safe to call more than once per process."""
+    global game_system_started
+    with game_system_lock:
+        if game_system_started:
+            return
+        game_system_started = True
+    
+    start_tick_loop()
+    start_food_spawner()
+    
+    scheduler.call_every(HEARTBEAT_INTERVAL, check_heartbeats, first_delay=0)
+
+def shutdown_game_system(timeout=SHUTDOWN_DRAIN_TIMEOUT):
+    """Refuse new game connections, let every queue send what it has, then close them with 1001"""
+    global accepting_connections
+    accepting_connections = False
     
-    threading.Timer(5.0, schedule_leaderboard_updates).start()
-    threading.Timer(5.0, spawn_new_foods).start() 
+    client_queues = published_connections
     
-    check_heartbeats() 
\ No newline at end of file
+    deadline = time.monotonic() + timeout
+    for client_id, client_queue in client_queues:
+        client_queue.flush(max(0, deadline - time.monotonic()))
+        client_queue.close(1001, "Server shutting down") 
\ No newline at end of file
@@ -0,0 +1,36 @@
+"""Gunicorn settings for wsgi:app.
+
+Each game websocket holds a worker thread for its lifetime, so workers use
+threads (gthread) and WEB_THREADS caps concurrent players plus in-flight
+HTTP requests per worker. The game world lives in the worker process: every
+worker runs its own, so raise WEB_WORKERS only behind a proxy that sends
+/ws/game to a single worker, or run the game in rooms (rooms.py) and set
+GAME_ROOM_PORTS so players connect to a room instead. Static files and /user/* are stateless and
+scale with WEB_WORKERS.
+"""
+import os
+import signal
+import threading
+
+bind = os.environ.get("BIND", "0.0.0.0:8080")
+workers = int(os.environ.get("WEB_WORKERS", "1"))
+worker_class = "gthread"
+threads = int(os.environ.get("WEB_THREADS", "256"))
+keepalive = 5
+# Time a worker gets after SIGTERM: websockets are drained well before this
+graceful_timeout = 15
+accesslog = "-"
+
+def post_worker_init(worker):
+    """On SIGTERM, drain and close the game websockets alongside gunicorn's own shutdown.
+
+    Without this, open websockets look like in-flight requests and the worker
+    waits out graceful_timeout before being killed.
+    """
+    import game_websocket
+
+    def drain_then_exit(sig, frame):
+        threading.Thread(target=game_websocket.shutdown_game_system, daemon=True).start()
+        worker.handle_exit(sig, frame)
+
+    signal.signal(signal.SIGTERM, drain_then_exit)
@@ -0,0 +1,57 @@
+"""Run several independent game rooms, one process each.
+
+Every room is the ASGI app (asgi.py) on its own port, so it has its own game
+world, event loop and GIL. Point the HTTP server at the rooms with
+GAME_ROOM_PORTS and /api/game/room sends each new player to the least-loaded
+one; /api/game/rooms lists per-room player counts.
+
+    GAME_ROOMS=4 ROOM_BASE_PORT=8101 python rooms.py
+    GAME_ROOM_PORTS=8101,8102,8103,8104 gunicorn -c gunicorn.conf.py wsgi:app
+
+Rooms that exit are restarted. SIGTERM / Ctrl-C is passed on to every room,
+which drains its websockets before exiting.
+"""
+import os
+import signal
+import subprocess
+import sys
+import time
+
+ROOM_COUNT = int(os.environ.get("GAME_ROOMS", str(os.cpu_count() or 1)))
+ROOM_BASE_PORT = int(os.environ.get("ROOM_BASE_PORT", "8101"))
+ROOM_HOST = os.environ.get("ROOM_HOST", "0.0.0.0")
+RESTART_DELAY = 1.0
+
+def start_room(port):
+    return subprocess.Popen([
+        sys.executable, "-m", "uvicorn", "asgi:app",
+        "--host", ROOM_HOST, "--port", str(port), "--log-level", "warning"
+    ], cwd=os.path.dirname(os.path.abspath(__file__)))
+
+def main():
+    ports = [ROOM_BASE_PORT + i for i in range(ROOM_COUNT)]
+    rooms = {port: start_room(port) for port in ports}
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for room in rooms.values():
+            room.send_signal(signal.SIGTERM)
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    print(f"GAME_ROOM_PORTS={','.join(str(port) for port in ports)}", flush=True)
+
+    while not stopping:
+        time.sleep(RESTART_DELAY)
+        for port, room in rooms.items():
+            if room.poll() is not None and not stopping:
+                print(f"room on port {port} exited with {room.returncode}, restarting", flush=True)
+                rooms[port] = start_room(port)
+
+    for room in rooms.values():
+        room.wait()
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,22 @@
 import backend.paths.auth_paths as auth
+import functools
 from flask import Flask, g, send_from_directory, request, jsonify, make_response, abort, Response
 import os
 import hashlib
 import json
 import logging
+import math
+import random
+import time
+from flask.logging import default_handler
 from flask_sock import Sock
 import database as db
 import threading
 import game_websocket as websocket
+from backend.tools.room_router import room_router_from_env
+from backend.tools.static_assets import StaticManifest
+from backend.tools.request_logging import JsonLinesFormatter, queue_logging
+from backend.tools.stats_buffer import StatsBufferFull, apply_delta, game_delta
 from logging.handlers import RotatingFileHandler
 from werkzeug.middleware.proxy_fix import ProxyFix
 
@@ -34,25 +43,35 @@ app = Flask(__name__,
 app.wsgi_app = ProxyFix(app.wsgi_app, x_for=1, x_proto=1)
 # websocket
 sock = Sock(app)
+# Files of the static folder with precompressed variants; built in create_app()
+static_assets = StaticManifest(app.static_folder)
+# Set when game rooms run as separate processes (rooms.py, GAME_ROOM_PORTS)
+room_router = room_router_from_env()
 
-# set up a rotating file handler on app.logger
+# Request threads only enqueue log records; one listener thread per log file
+# formats them as JSON lines and writes them out
 handler = RotatingFileHandler('requests.log', maxBytes=10_000_000, backupCount=5)
-handler.setFormatter(
-    logging.Formatter('%(asctime)s  %(levelname)s  %(message)s')
-)
+handler.setFormatter(JsonLinesFormatter())
 handler.setLevel(logging.INFO)
 app.logger.setLevel(logging.INFO)
-app.logger.addHandler(handler)
+# Flask's console handler goes behind the queue too
+app.logger.removeHandler(default_handler)
+app_log_queue = queue_logging(app.logger, handler, default_handler)
 
 raw_handler = RotatingFileHandler(
     "requests_raw.log", maxBytes=10_000_000, backupCount=5
 )
 raw_handler.setLevel(logging.INFO)
-raw_handler.setFormatter(logging.Formatter("%(asctime)s  %(message)s"))
+raw_handler.setFormatter(JsonLinesFormatter())
 
 raw_logger = logging.getLogger("raw_logger")
 raw_logger.setLevel(logging.INFO)
-raw_logger.addHandler(raw_handler)
+raw_log_queue = queue_logging(raw_logger, raw_handler)
+
+# Share of requests whose request/response bodies go into the raw log;
+# the rest get headers only
+RAW_BODY_SAMPLE_RATE = float(os.environ.get("RAW_BODY_SAMPLE_RATE", "0.01"))
+RAW_BODY_LIMIT = 2048
 
 def sanitize_headers(headers):
     cleaned = {}
@@ -77,70 +96,42 @@ def nosniff(response):
     response.headers["X-Content-Type-Options"] = "nosniff"
     return response
 
+def is_text_body(ctype):
+    # Only text, JSON or form-urlencoded bodies are worth logging
+    return ctype.startswith("text/") \
+        or "application/json" in ctype \
+        or "application/x-www-form-urlencoded" in ctype
+
+def body_for_log(data):
+    return data[:RAW_BODY_LIMIT].decode("utf-8", errors="replace")
+
 @app.before_request
-def log_raw_request():
-    headers = sanitize_headers(request.headers)
-    path = request.path
-    method = request.method
-
-    # For login/register, only log headers (no body)
-    if path in ("/auth/login", "/auth/register"):
-        raw_logger.info("REQUEST  %s %s\nHeaders: %s",
-                        method, path, headers)
-        return
-
-    ctype = request.content_type or ""
-    # Only log body if it’s text or JSON or form-urlencoded
-    if any(ctype.startswith(t) for t in ("text/",)) \
-       or "application/json" in ctype \
-       or "application/x-www-form-urlencoded" in ctype:
-        data = request.get_data()[:2048]  # truncate at 2 KiB
-        raw_logger.info(
-            "REQUEST  %s %s\nHeaders: %s\nBody: %r",
-            method, path, headers, data
-        )
-    else:
-        raw_logger.info("REQUEST  %s %s\nHeaders: %s",
-                        method, path, headers)
+def start_request_log():
+    g.request_started = time.perf_counter()
+    # Never capture login/register bodies (passwords)
+    g.sample_body = request.path not in ("/auth/login", "/auth/register") \
+        and random.random() < RAW_BODY_SAMPLE_RATE
 
 @app.after_request
 def log_raw_response(response):
-    headers = sanitize_headers(response.headers)
-    method = request.method
-    path = request.path
-    status = response.status_code
-
-    # 1) If it’s a streamed/direct_passthrough response, only log headers
-    if getattr(response, "direct_passthrough", False):
-        raw_logger.info(
-            "RESPONSE %s %s → %s\nHeaders: %s\n[streamed body omitted]",
-            method, path, status, headers
-        )
-        return response
-
-    # 2) Special-case auth endpoints (no bodies)
-    if path in ("/auth/login", "/auth/register"):
-        raw_logger.info(
-            "RESPONSE %s %s → %s\nHeaders: %s",
-            method, path, status, headers
-        )
-        return response
+    # One record per request/response pair; bodies only for sampled requests
+    fields = {
+        "method": request.method,
+        "path": request.path,
+        "status": response.status_code,
+        "requestHeaders": sanitize_headers(request.headers),
+        "responseHeaders": sanitize_headers(response.headers)
+    }
 
-    # 3) Otherwise, for JSON/text responses, truncate at 2 KiB
-    ctype = response.content_type or ""
-    if ("application/json" in ctype) or ctype.startswith("text/"):
-        body = response.get_data()[:2048]
-        raw_logger.info(
-            "RESPONSE %s %s → %s\nHeaders: %s\nBody: %r",
-            method, path, status, headers, body
-        )
-    else:
-        # binary or other unlogged body types
-        raw_logger.info(
-            "RESPONSE %s %s → %s\nHeaders: %s\n[non-text body omitted]",
-            method, path, status, headers
-        )
+    if g.get("sample_body"):
+        if is_text_body(request.content_type or ""):
+            # Whatever the handler already read; form fields are parsed, not cached
+            fields["requestBody"] = body_for_log(request.get_data())
+        # Streamed/direct_passthrough bodies are never buffered for the log
+        if not response.direct_passthrough and is_text_body(response.content_type or ""):
+            fields["responseBody"] = body_for_log(response.get_data())
 
+    raw_logger.info("%s %s → %s", request.method, request.path, response.status_code, extra={"fields": fields})
     return response
 
 
@@ -157,25 +148,34 @@ def _get_current_username():
 def attach_username_to_g():
     #g.username = _get_current_username()
     g.username = None
+    g.user = None
+    g.hashed_auth = None
     token = request.cookies.get("auth_token")
     if token:
         # must match how you store it in Mongo:
         hashed = hashlib.sha256(token.encode("utf-8")).hexdigest().encode("utf-8")
-        user = db.user_collection.find_one({"token": hashed})
+        # The one user lookup per request; handlers read g.user
+        user = db.find_user_by_token(hashed)
+        g.hashed_auth = hashed
         if user:
+            g.user = user
             g.username = user["username"]
 
 
 @app.after_request
 def log_request_and_response(response):
     username = g.get("username") or "anonymous"
+    started = g.get("request_started")
     app.logger.info(
-        "%s  %s  %s %s → %s",
-        request.remote_addr,
-        username,
-        request.method,
-        request.path,
-        response.status_code
+        "%s %s → %s", request.method, request.path, response.status_code,
+        extra={"fields": {
+            "remoteAddr": request.remote_addr,
+            "user": username,
+            "method": request.method,
+            "path": request.path,
+            "status": response.status_code,
+            "durationMs": round((time.perf_counter() - started) * 1000, 2) if started else None
+        }}
     )
     return response
 
@@ -184,27 +184,38 @@ def handle_server_error(e):
     app.logger.error(f"Server error: {str(e)}")
     return jsonify({"error": "Server "}), 500
 
-@app.before_request
-def log_request():
-    app.logger.info(f"{request.remote_addr} {request.method} {request.path}")
+LOOPBACK_ADDRS = {"127.0.0.1", "::1"}
+
+def local_only(view):
+    """Operational metrics (usernames, queue depths) only for requests from this host.
+
+    Both the peer address and the X-Forwarded-For address ProxyFix took on
+    trust must be loopback, so a forged header from outside does not pass.
+    """
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        peer = request.environ.get("werkzeug.proxy_fix.orig", {}).get("REMOTE_ADDR", request.remote_addr)
+        if peer not in LOOPBACK_ADDRS or request.remote_addr not in LOOPBACK_ADDRS:
+            return make_response(jsonify({"error": "Not found"}), 404)
+        return view(*args, **kwargs)
+    return wrapper
 
 @app.route("/")
 def index():
-    websocket.start_food_spawn_thread()
-    log_request()
-    return send_from_directory(app.static_folder, 'index.html')
+    websocket.start_food_spawner()
+    return send_static('index.html')
 
 @app.route("/register")
 def register():
     if("auth_token" in request.cookies):
         abort(400, "You are already logged-in. One must be logged-out before registering.")
-    return send_from_directory(app.static_folder, 'index.html')
+    return send_static('index.html')
 
 @app.route("/login")
 def login():
     if ("auth_token" in request.cookies):
         abort(400, "You are already logged-in. One must be logged-out before logging-in.")
-    return send_from_directory(app.static_folder, 'index.html')
+    return send_static('index.html')
 
 @app.route("/game")
 def game():
@@ -214,7 +225,7 @@ def game():
         res.status_code = 302
         res.headers["Location"] = "/login"
         return res
-    return send_from_directory(app.static_folder, 'index.html')
+    return send_static('index.html')
 
 @app.route("/profile")
 def profile():
@@ -224,7 +235,7 @@ def profile():
         res.status_code = 302
         res.headers["Location"] = "/login"
         return res
-    return send_from_directory(app.static_folder, 'index.html')
+    return send_static('index.html')
 
 @app.route("/logout")
 def logout():
@@ -266,15 +277,51 @@ def auth_status():
         return jsonify({"isAuthenticated": True})
     return jsonify({"isAuthenticated": False})
 
+@app.route("/api/game/send-queues", methods=["GET"])
+@local_only
+def game_send_queues():
+    # Outbound queue depth per game connection, for spotting slow consumers
+    return jsonify(websocket.get_send_queue_metrics())
+
+@app.route("/api/game/status", methods=["GET"])
+def game_status():
+    # Player count of this process's game world
+    return jsonify(websocket.get_game_status())
+
+@app.route("/api/game/room", methods=["GET"])
+def game_room():
+    # Which room a new game connection should use; no port means this server
+    if room_router is None:
+        return jsonify({"room": None})
+    room = room_router.assign()
+    if room is None:
+        return make_response(jsonify({"error": "No game rooms available"}), 503)
+    return jsonify(room)
+
+@app.route("/api/game/rooms", methods=["GET"])
+def game_rooms():
+    if room_router is None:
+        return jsonify([])
+    return jsonify(room_router.rooms())
+
+@app.route("/api/auth/password-pool", methods=["GET"])
+@local_only
+def auth_password_pool():
+    # Queue wait and hash time of the bcrypt worker pool
+    return jsonify(auth.password_hasher.metrics())
+
+@app.route("/api/auth/session-cache", methods=["GET"])
+@local_only
+def auth_session_cache():
+    # Hit rate of the token -> user cache
+    return jsonify(db.session_cache.stats())
+
 @app.route("/user/current", methods=["GET"])
 def user_current():
     if "auth_token" not in request.cookies:
         return make_response(jsonify({"error": "Not authenticated"}), 401)
     
-    auth_token = request.cookies["auth_token"]
-    hashed_auth = hashlib.sha256(auth_token.encode("utf-8")).hexdigest().encode("utf-8")
-    
-    user = db.user_collection.find_one({"token": hashed_auth})
+    user = g.user
     
     if not user:
         return make_response(jsonify({"error": "User not found"}), 404)
@@ -289,48 +336,40 @@ def user_stats():
     if "auth_token" not in request.cookies:
         return make_response(jsonify({"error": "Not authenticated"}), 401)
     
-    auth_token = request.cookies["auth_token"]
-    hashed_auth = hashlib.sha256(auth_token.encode("utf-8")).hexdigest().encode("utf-8")
-    
-    user = db.user_collection.find_one({"token": hashed_auth})
+    user = g.user
     
     if not user:
         return make_response(jsonify({"error": "User not found"}), 404)
     
-    # Get user stats from the database, default to 0 if not found
-    stats = user.get("stats", {
+    # Stats default to 0 if not found
+    return profile_response("stats", {
         "highScore": 0,
         "avgSurvivalTime": 0,
         "longestSnake": 0,
         "totalFood": 0,
         "totalKills": 0
-    })
-    
-    return jsonify(stats)
+    }, jsonify)
 
 @app.route("/user/achievements", methods=["GET"])
 def user_achievements():
     if "auth_token" not in request.cookies:
         return make_response(jsonify({"error": "Not authenticated"}), 401)
     
-    auth_token = request.cookies["auth_token"]
-    hashed_auth = hashlib.sha256(auth_token.encode("utf-8")).hexdigest().encode("utf-8")
-    
-    user = db.user_collection.find_one({"token": hashed_auth})
+    user = g.user
     
     if not user:
         return make_response(jsonify({"error": "User not found"}), 404)
     
-    # Get user stats
-    stats = user.get("stats", {
+    return profile_response("achievements", {
         "highScore": 0,
         "avgSurvivalTime": 0,
         "longestSnake": 0,
         "totalFood": 0, 
         "totalKills": 0,
         "gameCount": 0
-    })
-    
+    }, render_achievements)
+
+def render_achievements(stats):
     # Define achievements with conditions
     achievements = [
         {
@@ -377,61 +416,82 @@ def user_achievements():
     
     return jsonify(achievements)
 
+def profile_response(endpoint, default_stats, render):
+    """The user's stats rendered by render(stats), with a strong ETag.
+
+    Rendered once per stats version: statsVersion counts the games written,
+    plus the games still waiting in the write-behind buffer. A client that
+    sends the current ETag back gets a 304 without a body.
+    """
+    hashed_auth = g.hashed_auth
+    user = g.user
+    pending = db.stats_buffer.pending_delta(user["id"])
+    version = user.get("statsVersion", 0) + (0 if pending is None else pending["games"])
+    
+    cached = db.profile_cache.get(hashed_auth, endpoint, version)
+    if cached is None:
+        stats = user.get("stats", default_stats)
+        if pending is not None:
+            stats = apply_delta(stats, pending)
+        cached = db.profile_cache.put(hashed_auth, endpoint, version, render(stats).get_data())
+    etag, body = cached
+    
+    if request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+    else:
+        response = Response(body, mimetype="application/json")
+    response.set_etag(etag)
+    # Per user, and checked on every load
+    response.headers["Cache-Control"] = "private, no-cache"
+    return response
+
+# Larger counts are not exact as floats and overflow Mongo's int64 once summed
+MAX_STAT_VALUE = 2 ** 53
+
+def read_stat(data, key, default):
+    """data[key] (default if missing) when it is a finite number from 0 to MAX_STAT_VALUE, else None"""
+    value = data.get(key, default)
+    # bool is an int to Python, but not a number to Mongo's $add
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return None
+    try:
+        if not math.isfinite(value) or not 0 <= value <= MAX_STAT_VALUE:
+            return None
+    except OverflowError:
+        return None
+    return value
+
 @app.route("/user/save-stats", methods=["POST"])
 def save_stats():
     if "auth_token" not in request.cookies:
         return make_response(jsonify({"error": "Not authenticated"}), 401)
     
-    auth_token = request.cookies["auth_token"]
-    hashed_auth = hashlib.sha256(auth_token.encode("utf-8")).hexdigest().encode("utf-8")
-    
-    user = db.user_collection.find_one({"token": hashed_auth})
+    hashed_auth = g.hashed_auth
+    user = g.user
     
     if not user:
         return make_response(jsonify({"error": "User not found"}), 404)
     
-    data = request.json
-    current_score = data.get("score", 0)
-    current_length = data.get("length", 1)
-    survival_time = data.get("survivalTime", 0)
-    food_eaten = data.get("foodEaten", 0)
-    kills = data.get("kills", 0)
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return make_response(jsonify({"error": "Invalid stats"}), 400)
+    current_score = read_stat(data, "score", 0)
+    current_length = read_stat(data, "length", 1)
+    survival_time = read_stat(data, "survivalTime", 0)
+    food_eaten = read_stat(data, "foodEaten", 0)
+    kills = read_stat(data, "kills", 0)
+    # A bad value would fail the user's update in every batch it is merged into
+    if None in (current_score, current_length, survival_time, food_eaten, kills):
+        return make_response(jsonify({"error": "Invalid stats"}), 400)
     
-    # Get existing stats
-    existing_stats = user.get("stats", {
-        "highScore": 0,
-        "avgSurvivalTime": 0,
-        "longestSnake": 0,
-        "totalFood": 0,
-        "totalKills": 0,
-        "gameCount": 0
-    })
-    
-    # Update stats
-    game_count = existing_stats.get("gameCount", 0) + 1
-    high_score = max(existing_stats.get("highScore", 0), current_score)
-    longest_snake = max(existing_stats.get("longestSnake", 0), current_length)
-    total_food = existing_stats.get("totalFood", 0) + food_eaten
-    total_kills = existing_stats.get("totalKills", 0) + kills
-    
-    # Calculate new average survival time
-    total_survival_time = existing_stats.get("avgSurvivalTime", 0) * (game_count - 1) + survival_time
-    avg_survival_time = total_survival_time / game_count if game_count > 0 else 0
-    
-    # Update stats in the database
-    updated_stats = {
-        "highScore": high_score,
-        "avgSurvivalTime": avg_survival_time,
-        "longestSnake": longest_snake,
-        "totalFood": total_food,
-        "totalKills": total_kills,
-        "gameCount": game_count
-    }
-    
-    db.user_collection.update_one(
-        {"token": hashed_auth},
-        {"$set": {"stats": updated_stats}}
-    )
+    # Merged with the user's other unsaved games and written in the next batch
+    try:
+        db.stats_buffer.add(user["id"], game_delta(current_score, current_length, survival_time, food_eaten, kills), hashed_auth)
+    except StatsBufferFull:
+        response = make_response(jsonify({"error": "Server busy, try again"}), 503)
+        response.headers["Retry-After"] = "1"
+        return response
+    db.profile_cache.invalidate(hashed_auth)
     
     return jsonify({"success": True})
 
@@ -440,10 +500,8 @@ def user_avatar():
     if "auth_token" not in request.cookies:
         return make_response(jsonify({"error": "Not authenticated"}), 401)
     
-    auth_token = request.cookies["auth_token"]
-    hashed_auth = hashlib.sha256(auth_token.encode("utf-8")).hexdigest().encode("utf-8")
-    
-    user = db.user_collection.find_one({"token": hashed_auth})
+    hashed_auth = g.hashed_auth
+    user = g.user
     
     if not user:
         return make_response(jsonify({"error": "User not found"}), 404)
@@ -479,6 +537,7 @@ def user_avatar():
             {"token": hashed_auth},
             {"$set": {"avatar_url": avatar_url}}
         )
+        db.session_cache.invalidate(hashed_auth)
         
         return jsonify({"success": True, "url": avatar_url})
 
@@ -486,14 +545,69 @@ def user_avatar():
 def serve_static(path):
     if path.startswith('auth/'):
         return make_response(jsonify({"error": "Not found"}), 404)
-        
-    if os.path.exists(os.path.join(app.static_folder, path)):
-        log_request()
+
+    if path in static_assets:
+        return send_static(path)
+
+    # Files added after startup (uploaded avatars) come straight from disk
+    if os.path.isfile(os.path.join(app.static_folder, path)):
         return send_from_directory(app.static_folder, path)
-    
-    log_request()
-    return send_from_directory(app.static_folder, 'index.html')
 
-if __name__ == '__main__':
+    return send_static('index.html')
+
+def send_static(path):
+    # Manifest files: precompressed body, strong ETag, immutable caching for hashed names
+    asset = static_assets.get(path)
+    if asset is None:
+        return send_from_directory(app.static_folder, path)
+
+    encoding, body, etag = asset.select(lambda e: request.accept_encodings[e] > 0)
+    if request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+    else:
+        response = Response(body, mimetype=asset.content_type)
+        # Keeps log_raw_response from copying the body into the raw log
+        response.direct_passthrough = True
+        if encoding != "identity":
+            response.headers["Content-Encoding"] = encoding
+
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = asset.cache_control
+    if len(asset.variants) > 1:
+        response.headers["Vary"] = "Accept-Encoding"
+    return response
+
+@app.route("/api/logging/queues", methods=["GET"])
+@local_only
+def logging_queues():
+    # Backlog and drops of the async log writers
+    return jsonify({"app": app_log_queue.stats(), "raw": raw_log_queue.stats()})
+
+@app.route("/api/stats/profile-cache", methods=["GET"])
+@local_only
+def profile_cache_metrics():
+    # Hit rate of the rendered /user/stats and /user/achievements bodies
+    return jsonify(db.profile_cache.stats())
+
+@app.route("/api/stats/buffer", methods=["GET"])
+@local_only
+def stats_buffer_metrics():
+    # Unwritten end-of-game stats and flush lag
+    return jsonify(db.stats_buffer.stats())
+
+@app.route("/api/static/manifest", methods=["GET"])
+@local_only
+def static_manifest():
+    # File count and identity vs. compressed bytes of the static manifest
+    return jsonify(static_assets.stats())
+
+def create_app():
+    """One-time startup (indexes, game loop) for this process, then the app; see wsgi.py and asgi.py"""
+    static_assets.build()
+    db.bootstrap_indexes()
     websocket.init_game_system()
+    return app
+
+if __name__ == '__main__':
+    create_app()
     app.run(host="0.0.0.0", port=8080, debug=True, threaded=True)
@@ -0,0 +1,143 @@
+import json
+import math
+import struct
+
+import pytest
+
+from backend.tools.game_codec import (
+    COORD_LIMIT, COORD_SCALE, BinaryCodec, JsonCodec, get_codec
+)
+
+codec = BinaryCodec()
+MAX_COORD = COORD_LIMIT / COORD_SCALE
+
+def move_message(**fields):
+    message = {
+        "messageType": "move",
+        "snake_x": 120.5,
+        "snake_y": -64.25,
+        "snake_color": "#33CC99",
+        "username": "potato",
+        "segments": [{"x": 120.5, "y": -64.25}, {"x": 100.0, "y": -60.125}],
+        "length": 12,
+        "score": 340,
+        "alive": True
+    }
+    message.update(fields)
+    return message
+
+def full_snake(**fields):
+    snake = {
+        "id": "conn-1",
+        "x": 10.0,
+        "y": 20.0,
+        "length": 3,
+        "score": 7,
+        "alive": True,
+        "color": "#FF0000",
+        "username": "potato",
+        "segments": [{"x": 10.0, "y": 20.0}, {"x": 0.0, "y": 20.0}]
+    }
+    snake.update(fields)
+    return snake
+
+def test_move_round_trip():
+    message = move_message()
+    frame = codec.encode(message)
+    assert isinstance(frame, bytes)
+    assert codec.decode(frame) == message
+
+def test_world_snapshot_round_trip_full_and_delta():
+    message = {"messageType": "world_snapshot", "snakes": [
+        full_snake(),
+        {"id": "conn-2", "x": -5.5, "y": 7.25, "length": 4, "score": 2, "alive": False,
+         "delta": True, "added": [{"x": -5.5, "y": 7.25}], "trimmed": 1}
+    ]}
+    assert codec.decode(codec.encode(message)) == message
+
+def test_empty_snapshot_round_trip():
+    message = {"messageType": "world_snapshot", "snakes": []}
+    assert codec.decode(codec.encode(message)) == message
+
+def test_off_grid_coordinates_round_to_nearest_step():
+    decoded = codec.decode(codec.encode(move_message(
+        snake_x=1.06, snake_y=-2.3, segments=[{"x": 0.01, "y": 99.99}]
+    )))
+    assert decoded["snake_x"] == 1.0
+    assert decoded["snake_y"] == -2.25
+    assert decoded["segments"] == [{"x": 0.0, "y": 100.0}]
+    # Never off by more than half a step
+    for original, value in ((1.06, decoded["snake_x"]), (-2.3, decoded["snake_y"])):
+        assert abs(original - value) <= 0.5 / COORD_SCALE
+
+def test_out_of_range_coordinates_are_clamped():
+    decoded = codec.decode(codec.encode(move_message(
+        snake_x=1e6, snake_y=-1e6,
+        segments=[{"x": 5000.0, "y": 1.0}, {"x": 2.0, "y": -5000.0}]
+    )))
+    assert decoded["snake_x"] == MAX_COORD
+    assert decoded["snake_y"] == -MAX_COORD
+    assert decoded["segments"] == [{"x": MAX_COORD, "y": 1.0}, {"x": 2.0, "y": -MAX_COORD}]
+
+def test_counts_are_clamped_to_their_fields():
+    decoded = codec.decode(codec.encode(move_message(length=70000, score=-3)))
+    assert decoded["length"] == 65535
+    assert decoded["score"] == 0
+
+def test_null_and_empty_strings():
+    decoded = codec.decode(codec.encode(move_message(snake_color=None, username="")))
+    assert decoded["snake_color"] is None
+    assert decoded["username"] == ""
+
+    # No username is left out of the message rather than sent as None
+    decoded = codec.decode(codec.encode(move_message(username=None)))
+    assert "username" not in decoded
+
+    snapshot = {"messageType": "world_snapshot", "snakes": [full_snake(color=None, username="")]}
+    snake = codec.decode(codec.encode(snapshot))["snakes"][0]
+    assert snake["color"] is None
+    assert snake["username"] == ""
+
+def test_long_strings_are_truncated():
+    decoded = codec.decode(codec.encode(move_message(username="x" * 300)))
+    assert decoded["username"] == "x" * 254
+
+def test_input_round_trip():
+    frame = codec.encode({"messageType": "input", "heading": 1.2345, "boost": True})
+    assert isinstance(frame, bytes)
+    assert codec.decode(frame) == {"messageType": "input", "heading": 1.2345, "boost": True}
+
+    decoded = codec.decode(codec.encode({"messageType": "input", "heading": -0.5}))
+    assert decoded == {"messageType": "input", "heading": -0.5, "boost": False}
+
+def test_input_heading_is_wrapped():
+    decoded = codec.decode(codec.encode({"messageType": "input", "heading": 4.0, "boost": False}))
+    assert decoded["heading"] == pytest.approx(4.0 - math.tau, abs=1e-4)
+    assert -math.pi <= decoded["heading"] <= math.pi
+
+@pytest.mark.parametrize("message", [
+    move_message(),
+    {"messageType": "world_snapshot", "snakes": [full_snake()]},
+    {"messageType": "input", "heading": 0.5, "boost": True}
+])
+def test_truncated_frames_raise(message):
+    frame = codec.encode(message)
+    for end in range(1, len(frame)):
+        with pytest.raises((struct.error, IndexError)):
+            codec.decode(frame[:end])
+
+def test_unknown_frame_type_raises():
+    with pytest.raises(ValueError):
+        codec.decode(b"\x09\x00")
+
+def test_other_messages_stay_json_text():
+    message = {"messageType": "leaderboard_update", "leaderboard": [{"username": "potato", "score": 3}]}
+    frame = codec.encode(message)
+    assert isinstance(frame, str)
+    assert json.loads(frame) == message
+    assert codec.decode(frame) == message
+
+def test_get_codec_falls_back_to_json():
+    assert isinstance(get_codec("binary"), BinaryCodec)
+    assert type(get_codec(None)) is JsonCodec
+    assert type(get_codec("msgpack")) is JsonCodec
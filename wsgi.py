@@ -0,0 +1,7 @@
+"""Production WSGI entry point.
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+"""
+from server import create_app
+
+app = create_app()